@@ -1,13 +1,88 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 from datetime import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from gspread_formatting import format_cell_range, CellFormat, TextFormat, set_column_width, Color, Padding
 import unicodedata
 import time
 import os
+from http_cache import get_cache
+from sheet_writer import SheetWriter
+from html_extract import find_blockquotes, parse_full, post_version, release, split_posts, thread_page_count
+from thread_posts import get_thread_post_cache
+from price_history import record_prices
+from metrics import get_metrics, timed
+from records import FIVEGIAY_COLUMNS, ColumnBuilder, FiveGiayProduct, load_records
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+THREAD_URL = "https://www.5giay.vn/threads/vi-tinh-bao-nhu-case-pc-may-bo-dell-hp-lenovo-gia-re.34567/"
+# Số trang thread tải song song tối đa (cùng một host)
+THREAD_MAX_WORKERS = int(os.environ.get("FIVEGIAY_MAX_WORKERS", "4"))
+
+# Các regex chuẩn hoá được biên dịch một lần khi nạp module thay vì mỗi dòng
+NORMALIZE_CACHE_SIZE = int(os.environ.get("NORMALIZE_CACHE_SIZE", "4096"))
+
+# Thứ tự có ý nghĩa: mỗi phần tên lấy mẫu đầu tiên khớp
+MODEL_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'\bTP\d{2,4}[a-zA-Z]?\b',   # HP Pavilion TP01, ...
+    r'\bS\d{2,4}[a-zA-Z]?\b',    # Lenovo S30, S20, ...
+    r'\bE\d{2,4}[a-zA-Z]?\b',    # E92p, E93, E73, E32, ...
+    r'\bM\d{2,4}[a-zA-Z]?\b',    # M73, M83, M710, M720, ...
+    r'\bP\d{3,4}[a-zA-Z]?\b',    # P320, P330, ...
+    r'\bV\d{3,4}[a-zA-Z]?\b',    # V520, ...
+    r'\bPRECISION\s+\d{3,4}\b',    # PRECISION 3630, ...
+    r'\bTHINKCENTRE\s+\w+\s*G\d{1,2}\b',  # THINKCENTRE M720 G1, ...
+    r'\bP\d{3,4}[A-Z]?\b',         # P520C, P520, P310, P340, ...
+    r'\bE\d{2,4}[A-Z]?\b',         # E93, E73, E32, ...
+    r'\bZ\d{1,4}\s*G\d{1,2}\b',    # Z4 G4, Z240 G2, ...
+    r'\bZ\d{1,4}\b',               # Z420, Z820, ...
+    r'\bT\d{3,4}\b',               # T1700, T3420, T7820, ...
+    r'\b\d{3,4}\s*G\d{1,2}\b',     # 600 G1, 800 G2, ...
+    r'\bG\d{1,2}\b',               # G1, G2, ...
+    r'\bXE2\b',                    # XE2
+    r'\b\d{3,4}\b',                # 3020, 3050, 7050, 600, 800, ...
+)]
+MODEL_SPLIT_RE = re.compile(r'\s*[/-]\s*')
+NUMBER_ONLY_RE = re.compile(r'^\d{3,4}$')
+ALPHA_NUM_RE = re.compile(r'^[A-Z]+\d')
+
+# Các model workstation phổ biến, gộp thành một alternation (chỉ cần biết có khớp hay không)
+WORKSTATION_RE = re.compile('|'.join((
+    r'\bs\d{2,4}\b',         # S30, S20, S40 (Lenovo)
+    r'\bp\d{3,4}c?\b',       # P510, P520, P520c, P720, P920 (Lenovo)
+    r'\bw\d{3,4}\b',         # W530, W540 (Lenovo)
+    r'\bt\d{3,4}\b',         # T5820, T7820 (Dell)
+    r'\bz\d{1,4}\b',         # Z420, Z820 (HP)
+    r'workstation',
+    r'precision',
+)))
+
+PARENS_LAZY_RE = re.compile(r'\(.*?\)')
+PARENS_RE = re.compile(r'\([^)]*\)')
+PSU_RE = re.compile(r'(\d{3,4}w\))', re.IGNORECASE)
+DASH_SEPARATOR_RE = re.compile(r'\s-\s')
+SLASH_SPACES_RE = re.compile(r'\s*/\s*')
+GEN_FACTOR_RE = re.compile(r' (\b[gG][1-8]\b)\s+(sff|mt|dt|mini|tiny)\b', re.IGNORECASE)
+VERSION_RE = re.compile(r'([a-zA-Z0-9])([vV][1-9]\b)')
+BAREBONE_PREFIX_RE = re.compile(r'^(Barebone)(?=[A-Z])')
+PRODESK_RE = re.compile(r'\bProdesk\b', re.IGNORECASE)
+SPACES_RE = re.compile(r'\s+')
+MODEL_FACTOR_RE = re.compile(r'([a-zA-Z0-9 ]+)\s+([a-zA-Z]+)$')
+CPU_RULES = [
+    (re.compile(r'(41\d{2})\s*[xX]\s*2'), r'2 Xeon Silver 4110'),
+    (re.compile(r'(51\d{2})\s*[xX]\s*2'), r'2 Xeon Gold'),
+    (re.compile(r'(26\d{2})\s*[xX]\s*2'), r'2 Xeon E5'),
+    (re.compile(r'(88\d{2})\s*[xX]\s*2'), r'2 Xeon E7'),
+    (re.compile(r'([0-9]{4,5})\s*[xX]\s*2'), r'2 Xeon'),
+]
+
+# Regex dùng khi tách từng dòng trong crawl_5giay
+LINE_PRICE_RE = re.compile(r'^(.*?)\s*[,/\-]*\s*giá\s*([\d\.,kKtrTR]+)', re.IGNORECASE)
+TWO_FANS_LINE_RE = re.compile(r"2\s*(tản|fan|tản nhiệt)", re.IGNORECASE)
+TWO_FANS_NAME_RE = re.compile(r"x\s*2", re.IGNORECASE)
+TWO_XEON_RE = re.compile(r"\+\s*2\s*xeon", re.IGNORECASE)
+CPU_NAME_RE = re.compile(r"\+\s*([A-Za-z0-9\s]+)")
+LEADING_DASH_RE = re.compile(r'^\s*-\s*')
 
 def format_price(raw_price):
     if not raw_price:
@@ -46,6 +121,7 @@ def format_price_str(price):
         return int(price)  # Trả về giá trị số nguyên, không chuyển sang chuỗi
     return 0
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def get_form_factor(name, so_tan=''):
     name_lower = name.lower()
     # Ưu tiên SFF, TINY, MT, DT
@@ -62,19 +138,9 @@ def get_form_factor(name, so_tan=''):
     # Nếu có 2 tản thì chắc chắn là WORK
     if so_tan == '2':
         return 'WORK'
-    # Nhận diện các model workstation phổ biến
-    workstation_patterns = [
-        r'\bs\d{2,4}\b',         # S30, S20, S40 (Lenovo)
-        r'\bp\d{3,4}c?\b',       # P510, P520, P520c, P720, P920 (Lenovo)
-        r'\bw\d{3,4}\b',         # W530, W540 (Lenovo)
-        r'\bt\d{3,4}\b',         # T5820, T7820 (Dell)
-        r'\bz\d{1,4}\b',         # Z420, Z820 (HP)
-        r'workstation',
-        r'precision',
-    ]
-    for pat in workstation_patterns:
-        if re.search(pat, name_lower):
-            return 'WORK'
+    # Nhận diện các model workstation phổ biến (gộp thành một regex, xem WORKSTATION_RE)
+    if WORKSTATION_RE.search(name_lower):
+        return 'WORK'
     return ''
 
 def is_workstation(name):
@@ -86,41 +152,23 @@ def is_workstation(name):
         re.search(r'\\bt\\d{3,4}\\b', name_lower)   # Dell Txxx/Txxxx
     )
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def extract_model(name):
     # Chỉ lấy phần trước dấu +
     name = name.split('+')[0].strip()
     # Loại bỏ phần trong ngoặc ()
-    name = re.sub(r'\(.*?\)', '', name)
+    name = PARENS_LAZY_RE.sub('', name)
     # Tách theo / hoặc - nếu có, nhưng chỉ lấy phần model, không lấy phần là chip
-    parts = re.split(r'\s*[/-]\s*', name)
+    parts = MODEL_SPLIT_RE.split(name)
     models = []
     for part in parts:
-        # Ưu tiên lấy các mẫu model phổ biến, không lấy tên chip, không lấy Optiplex/Precision...
-        patterns = [
-            r'\bTP\d{2,4}[a-zA-Z]?\b',   # HP Pavilion TP01, ...
-            r'\bS\d{2,4}[a-zA-Z]?\b',    # Lenovo S30, S20, ...
-            r'\bE\d{2,4}[a-zA-Z]?\b',    # E92p, E93, E73, E32, ...
-            r'\bM\d{2,4}[a-zA-Z]?\b',    # M73, M83, M710, M720, ...
-            r'\bP\d{3,4}[a-zA-Z]?\b',    # P320, P330, ...
-            r'\bV\d{3,4}[a-zA-Z]?\b',    # V520, ...
-            r'\bPRECISION\s+\d{3,4}\b',    # PRECISION 3630, ...
-            r'\bTHINKCENTRE\s+\w+\s*G\d{1,2}\b',  # THINKCENTRE M720 G1, ...
-            r'\bP\d{3,4}[A-Z]?\b',         # P520C, P520, P310, P340, ...
-            r'\bE\d{2,4}[A-Z]?\b',         # E93, E73, E32, ...
-            r'\bZ\d{1,4}\s*G\d{1,2}\b',    # Z4 G4, Z240 G2, ...
-            r'\bZ\d{1,4}\b',               # Z420, Z820, ...
-            r'\bT\d{3,4}\b',               # T1700, T3420, T7820, ...
-            r'\b\d{3,4}\s*G\d{1,2}\b',     # 600 G1, 800 G2, ...
-            r'\bG\d{1,2}\b',               # G1, G2, ...
-            r'\bXE2\b',                    # XE2
-            r'\b\d{3,4}\b',                # 3020, 3050, 7050, 600, 800, ...
-        ]
-        for pat in patterns:
-            m = re.search(pat, part, re.IGNORECASE)
+        # Ưu tiên lấy các mẫu model phổ biến theo thứ tự trong MODEL_PATTERNS
+        for pat in MODEL_PATTERNS:
+            m = pat.search(part)
             if m:
                 val = m.group(0).upper().strip()
                 # Không lấy model là số đơn lẻ nếu đã có model dạng chữ+số
-                if re.match(r'^\d{3,4}$', val) and any(re.match(r'^[A-Z]+\d', v) for v in models):
+                if NUMBER_ONLY_RE.match(val) and any(ALPHA_NUM_RE.match(v) for v in models):
                     continue
                 models.append(val)
                 break
@@ -128,35 +176,38 @@ def extract_model(name):
     models = list(dict.fromkeys(models))
     return ' | '.join(models)
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def extract_psu(line):
     # Chỉ lấy các trường hợp có dạng số + w)
-    psu_matches = re.findall(r'(\d{3,4}w\))', line, re.IGNORECASE)
+    psu_matches = PSU_RE.findall(line)
     if psu_matches:
         # Loại bỏ dấu ) khi trả về
         return ' / '.join([x.replace(')', '').upper() for x in psu_matches])
     return ''
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def chuan_hoa_ten_sp_da_sua(name):
     # Xoá toàn bộ thông tin trong dấu ngoặc đơn (kể cả dấu ngoặc)
-    name = re.sub(r'\([^)]*\)', '', name)
+    name = PARENS_RE.sub('', name)
     # Xoá mọi dấu ngoặc đơn dư thừa còn sót lại
     name = name.replace('(', '').replace(')', '')
     # Đổi dấu - thành / và xoá khoảng trắng dư thừa quanh dấu này
-    name = re.sub(r'\s-\s', '/', name)
+    name = DASH_SEPARATOR_RE.sub('/', name)
     # Chuẩn hóa lại khoảng trắng quanh /
-    name = re.sub(r'\s*/\s*', '/', name)
+    name = SLASH_SPACES_RE.sub('/', name)
     # Chỉ xóa khoảng trắng trước Gx khi sau nó có form factor
-    name = re.sub(r' (\b[gG][1-8]\b)\s+(sff|mt|dt|mini|tiny)\b', r'\1 \2', name, flags=re.IGNORECASE)
+    name = GEN_FACTOR_RE.sub(r'\1 \2', name)
     # Thêm khoảng trắng trước V1, V2, ... nếu liền với từ trước
-    name = re.sub(r'([a-zA-Z0-9])([vV][1-9]\b)', r'\1 \2', name)
+    name = VERSION_RE.sub(r'\1 \2', name)
     # Tách Barebone dính liền với tên hãng
-    name = re.sub(r'^(Barebone)(?=[A-Z])', r'\1 ', name)
+    name = BAREBONE_PREFIX_RE.sub(r'\1 ', name)
     # Xóa từ Prodesk (không phân biệt hoa thường)
-    name = re.sub(r'\bProdesk\b', '', name, flags=re.IGNORECASE)
+    name = PRODESK_RE.sub('', name)
     # Loại bỏ mọi khoảng trắng dư thừa sau cùng
-    name = re.sub(r'\s+', ' ', name).strip()
+    name = SPACES_RE.sub(' ', name).strip()
     return name
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def add_factor_to_model_pairs(name):
     # Tìm các trường hợp có dạng model/model + factor
     # Ví dụ: 3046/7040 Mt -> 3046 Mt/7040 Mt
@@ -164,171 +215,228 @@ def add_factor_to_model_pairs(name):
         parts = [p.strip() for p in name.split('/')]
         if len(parts) == 2:
             # Kiểm tra phần cuối có factor (ví dụ: "7040 Mt")
-            m = re.match(r'([a-zA-Z0-9 ]+)\s+([a-zA-Z]+)$', parts[1])
+            m = MODEL_FACTOR_RE.match(parts[1])
             if m:
                 model2, factor = m.group(1).strip(), m.group(2).strip()
                 # Kiểm tra phần đầu đã có factor chưa
-                m1 = re.match(r'([a-zA-Z0-9 ]+)\s+([a-zA-Z]+)$', parts[0])
+                m1 = MODEL_FACTOR_RE.match(parts[0])
                 if not m1:
                     # Nếu phần đầu chưa có factor, mới thêm
                     parts[0] = f"{parts[0]} {factor}"
                     return '/'.join(parts)
     return name
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def chuan_hoa_cpu(cpu_str):
-    # Silver
-    cpu_str = re.sub(r'(41\d{2})\s*[xX]\s*2', r'2 Xeon Silver 4110', cpu_str)
-    # Gold
-    cpu_str = re.sub(r'(51\d{2})\s*[xX]\s*2', r'2 Xeon Gold', cpu_str)
-    # E5
-    cpu_str = re.sub(r'(26\d{2})\s*[xX]\s*2', r'2 Xeon E5', cpu_str)
-    # E7
-    cpu_str = re.sub(r'(88\d{2})\s*[xX]\s*2', r'2 Xeon E7', cpu_str)
-    # Nếu không nhận diện được thì để mặc định
-    cpu_str = re.sub(r'([0-9]{4,5})\s*[xX]\s*2', r'2 Xeon', cpu_str)
+    # Silver, Gold, E5, E7, nếu không nhận diện được thì để mặc định (xem CPU_RULES)
+    for pattern, replacement in CPU_RULES:
+        cpu_str = pattern.sub(replacement, cpu_str)
     return cpu_str
 
-def crawl_5giay():
-    url = "https://www.5giay.vn/threads/vi-tinh-bao-nhu-case-pc-may-bo-dell-hp-lenovo-gia-re.34567/"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, "html.parser")
+def parse_5giay_line(line):
+    """Tách một dòng trong bài viết thành FiveGiayProduct, trả về None nếu không phải dòng barebone có giá"""
+    if 'barebone' not in line.lower():
+        return None
+    line_norm = unicodedata.normalize('NFC', line)
+    match = LINE_PRICE_RE.search(line_norm)
+    if not match:
+        return None
+    name = match.group(1).strip()
+    # Chỉ parse khi tên còn thẻ HTML hoặc entity, tên thường thì get_text() trả về y nguyên
+    if '<' in name or '&' in name:
+        name = parse_full(name).get_text()
+
+    barebone_pos = name.lower().find('barebone')
+    if barebone_pos > 0:
+        name = name[barebone_pos:].strip()
+
+    name = SPACES_RE.sub(' ', name)
+    raw_price = match.group(2)
+    price = format_price(raw_price) if raw_price else 0
+
+    if not price:
+        return None
+
+    # Debug các thông tin khác
+    hang = "Dell" if "Dell" in name else ("HP" if "Hp" in name or "HP" in name else "Lenovo")
+    model = extract_model(name)
+    model = model.replace("PRECISION ", "").replace("PRECISION", "")
+
+    # Xác định số tản CPU
+    so_tan = ""
+    if (
+        TWO_FANS_LINE_RE.search(line)
+        or TWO_FANS_NAME_RE.search(name)
+        or TWO_XEON_RE.search(name)
+    ):
+        so_tan = "2"
+
+    form = get_form_factor(name, so_tan)
+    cpu = ""
+    cpu_match = CPU_NAME_RE.search(name)
+    if cpu_match:
+        cpu = cpu_match.group(1).strip()
+        cpu = chuan_hoa_cpu(cpu)
+
+    # PSU
+    psu = extract_psu(line)
+
+    # Tính +VC và Giá bán VC
+    vc_plus = 0
+    if form == 'WORK':
+        if so_tan == '2':
+            vc_plus = 500000
+        else:
+            vc_plus = 400000
+    elif form == 'SFF':
+        vc_plus = 300000
+    elif form == 'MT':
+        vc_plus = 400000
+    elif form == 'TINY':
+        vc_plus = 100000
+    elif form == 'MINI':
+        vc_plus = 100000
+    price_vc = price + vc_plus
+
+    original_name = name
+    name_sua = chuan_hoa_ten_sp_da_sua(original_name)
+    name_sua = add_factor_to_model_pairs(name_sua)
+    name_sua = chuan_hoa_cpu(name_sua)
+
+    return FiveGiayProduct(
+        original_name=clean_barebone_prefix(line),
+        name=name_sua,
+        brand=hang,
+        model=model,
+        form_factor=form,
+        fans=('2 tản' if so_tan == '2' else '1 tản'),
+        psu=psu if psu else "-",
+        price=format_price_str(price),
+        vc_plus=format_price_str(vc_plus) if vc_plus else '',
+        price_vc=format_price_str(price_vc),
+        cpu=cpu if cpu else "-"
+    )
+
+def normalize_cache_stats():
+    """Thống kê cache của các hàm chuẩn hoá: {tên hàm: {hits, misses, hit_rate}}"""
+    stats = {}
+    for func in (get_form_factor, extract_model, extract_psu, chuan_hoa_ten_sp_da_sua,
+                 add_factor_to_model_pairs, chuan_hoa_cpu):
+        info = func.cache_info()
+        total = info.hits + info.misses
+        stats[func.__name__] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": info.hits / total if total else 0.0,
+        }
+    return stats
+
+def normalize_cache_clear():
+    for func in (get_form_factor, extract_model, extract_psu, chuan_hoa_ten_sp_da_sua,
+                 add_factor_to_model_pairs, chuan_hoa_cpu):
+        func.cache_clear()
 
+def thread_page_url(page):
+    return THREAD_URL if page == 1 else f"{THREAD_URL}page-{page}"
+
+def parse_blockquotes(html):
     products = []
-    for block in soup.find_all('blockquote'):
+    blocks = find_blockquotes(html)
+    for block in blocks:
         block_text = block.get_text(separator='\n')
         for line in block_text.splitlines():
-            if 'barebone' in line.lower():
-                line_norm = unicodedata.normalize('NFC', line)
-                match = re.search(r'^(.*?)\s*[,/\-]*\s*giá\s*([\d\.,kKtrTR]+)', line_norm, re.IGNORECASE)
-                
-                if match:
-                    name = match.group(1).strip()
-                    name = BeautifulSoup(name, "html.parser").get_text()
-                    
-                    barebone_pos = name.lower().find('barebone')
-                    if barebone_pos > 0:
-                        name = name[barebone_pos:].strip()
-                    
-                    name = re.sub(r'\s+', ' ', name)
-                    raw_price = match.group(2)
-                    price = format_price(raw_price) if raw_price else 0
-                    
-                    if not price:
-                        continue
-                            
-                    # Debug các thông tin khác
-                    hang = "Dell" if "Dell" in name else ("HP" if "Hp" in name or "HP" in name else "Lenovo")
-                    model = extract_model(name)
-                    model = model.replace("PRECISION ", "").replace("PRECISION", "")
-                    
-                    # Xác định số tản CPU
-                    so_tan = ""
-                    if (
-                        re.search(r"2\s*(tản|fan|tản nhiệt)", line, re.IGNORECASE)
-                        or re.search(r"x\s*2", name, re.IGNORECASE)
-                        or re.search(r"\+\s*2\s*xeon", name, re.IGNORECASE)
-                    ):
-                        so_tan = "2"
-
-                    form = get_form_factor(name, so_tan)
-                    cpu = ""
-                    cpu_match = re.search(r"\+\s*([A-Za-z0-9\s]+)", name)
-                    if cpu_match:
-                        cpu = cpu_match.group(1).strip()
-                        cpu = chuan_hoa_cpu(cpu)
-
-                    # PSU
-                    psu = extract_psu(line)
-
-                    # Tính +VC và Giá bán VC
-                    vc_plus = 0
-                    if form == 'WORK':
-                        if so_tan == '2':
-                            vc_plus = 500000
-                        else:
-                            vc_plus = 400000
-                    elif form == 'SFF':
-                        vc_plus = 300000
-                    elif form == 'MT':
-                        vc_plus = 400000
-                    elif form == 'TINY':
-                        vc_plus = 100000
-                    elif form == 'MINI':
-                        vc_plus = 100000
-                    price_vc = price + vc_plus
-
-                    original_name = name
-                    name_sua = chuan_hoa_ten_sp_da_sua(original_name)
-                    name_sua = add_factor_to_model_pairs(name_sua)
-                    name_sua = chuan_hoa_cpu(name_sua)
-                    
-                    products.append({
-                        "Tên SP Gốc": clean_barebone_prefix(line),
-                        "Tên SP đã sửa": name_sua,
-                        "Hãng": hang,
-                        "Model/Series": model,
-                        "Form Factor": form,
-                        "Số tản CPU": ('2 tản' if so_tan == '2' else '1 tản'),
-                        "PSU": psu if psu else "-",
-                        "Giá bán (VNĐ)": format_price_str(price),
-                        "+ VC": format_price_str(vc_plus) if vc_plus else '',
-                        "Giá bán VC": format_price_str(price_vc),
-                        "CPU đi kèm": cpu if cpu else "-"
-                    })
+            product = parse_5giay_line(line)
+            if product:
+                products.append(product)
+    # Đọc xong thì huỷ cây DOM ngay, không chờ gc
+    if blocks:
+        release(blocks[0])
     return products
 
+def parse_thread_page(html, post_cache=None, url=None):
+    # Chỉ parse bài mới hoặc đã sửa, bài không đổi lấy sản phẩm đã parse từ post_cache
+    # (url: trang chứa các bài, để khi trang trả 304 vẫn biết các bài đó còn)
+    with get_metrics().timer("parse.5giay_thread"):
+        posts = list(split_posts(html)) if post_cache is not None else []
+        if not posts:
+            # Không nhận ra bài viết (giao diện đổi) thì parse cả trang như trước
+            return parse_blockquotes(html)
+        products = []
+        for post_id, post_html in posts:
+            version = post_version(post_html)
+            post_products = post_cache.get(post_id, version, url)
+            if post_products is None:
+                post_products = parse_blockquotes(post_html)
+                post_cache.put(post_id, version, post_products, url)
+            products.extend(post_products)
+        return products
+
+def crawl_thread_page(url, cache, post_cache=None, response=None):
+    """Sản phẩm của một trang thread. Trang không đổi (304) thì dùng lại kết quả parse lần trước;
+    HTML chỉ giữ trong lúc parse trang đó"""
+    if response is None:
+        response = cache.get(url)
+    if response.status_code != 200:
+        print(f"Lỗi khi truy cập {url}: HTTP {response.status_code}")
+        return []
+    cached_products = load_records(FiveGiayProduct, cache.load_parsed(url))
+    if cached_products is not None:
+        if post_cache is not None:
+            post_cache.touch_page(url)
+        return cached_products
+    products = parse_thread_page(response.text, post_cache, url)
+    cache.store_parsed(url, products)
+    return products
+
+def crawl_5giay(max_workers=None, post_cache=None):
+    """Sinh sản phẩm của thread theo thứ tự trang (để remove_duplicates vẫn giữ lần xuất hiện đầu tiên
+    như khi đọc tuần tự); các trang được tải và parse song song"""
+    cache = get_cache()
+    if post_cache is None:
+        post_cache = get_thread_post_cache()
+    parsed_before, reused_before = post_cache.parsed, post_cache.reused
+    # Trang 1 cho biết số trang của thread, các trang còn lại tải song song
+    response = cache.get(THREAD_URL)
+    last_page = thread_page_count(response.text, THREAD_URL) if response.status_code == 200 else 1
+    first_page = crawl_thread_page(THREAD_URL, cache, post_cache, response)
+    del response
+    with ThreadPoolExecutor(max_workers=max_workers or THREAD_MAX_WORKERS) as executor:
+        # Mỗi trang được parse ngay khi tải xong, chỉ giữ lại danh sách sản phẩm tới lượt trang đó được đọc
+        futures = deque(
+            executor.submit(crawl_thread_page, thread_page_url(page), cache, post_cache)
+            for page in range(2, last_page + 1)
+        )
+        yield from first_page
+        del first_page
+        while futures:
+            yield from futures.popleft().result()
+    unchanged = sum(1 for page in range(1, last_page + 1) if thread_page_url(page) in cache.not_modified)
+    print(f"Thread 5giay: {last_page} trang, {unchanged} trang không đổi (dùng lại dữ liệu cache), "
+          f"parse {post_cache.parsed - parsed_before} bài mới/đã sửa, dùng lại {post_cache.reused - reused_before} bài")
+    get_metrics().incr("5giay.posts_parsed", post_cache.parsed - parsed_before)
+    get_metrics().incr("5giay.posts_reused", post_cache.reused - reused_before)
+    post_cache.save()
+
 def write_to_sheet(products):
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    
+    from gspread_formatting import CellFormat, TextFormat, Color, Padding
     # Tạo tên sheet theo ngày crawl
     today = datetime.now().strftime("%d-%m-%Y")
-    sheet_url = os.environ.get("SHEET_URL")
-    if not sheet_url:
-        raise Exception("Biến môi trường SHEET_URL chưa được thiết lập!")
-    sh = client.open_by_url(sheet_url)
-    
-    # Kiểm tra sheet đã tồn tại chưa
-    try:
-        worksheet = sh.worksheet(today)
-        worksheet.clear()
-    except gspread.exceptions.WorksheetNotFound:
-        worksheet = sh.add_worksheet(title=today, rows="300", cols="11")
-    
-    # Ghi header
-    worksheet.append_row([
-        "Tên SP Gốc", "Tên SP đã sửa", "Hãng", "Model/Series", "Form Factor", "Số tản CPU", "PSU", "Giá bán (VNĐ)", "+ VC", "Giá bán VC", "CPU đi kèm"
-    ])
 
-    # Ghi toàn bộ dữ liệu một lần
-    rows = []
-    for p in products:
-        rows.append([
-            p["Tên SP Gốc"],
-            p["Tên SP đã sửa"],
-            p["Hãng"],
-            p["Model/Series"],
-            p["Form Factor"],
-            p["Số tản CPU"],
-            p["PSU"],
-            p["Giá bán (VNĐ)"],
-            p["+ VC"],
-            p["Giá bán VC"],
-            p["CPU đi kèm"]
-        ])
-    if rows:
-        worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+    # Gom ghi dữ liệu + định dạng + độ rộng cột + freeze vào một batchUpdate
+    writer = SheetWriter.open(today, rows=300, cols=11)
+
+    # Header + toàn bộ dữ liệu, ghi một lần (field của record theo đúng thứ tự cột)
+    rows = [FIVEGIAY_COLUMNS]
+    rows.extend(list(p) for p in products)
+    # Chỉ gửi các ô đổi so với lần ghi trước, khác số dòng thì xoá và ghi lại toàn bộ
+    writer.write_grid(rows, value_input_option='USER_ENTERED')
 
     print(f"Số sản phẩm sẽ ghi lên sheet: {len(products)}")
 
-    for p in products[:5]:
+    for p in islice(products, 5):
         print("Sản phẩm mẫu:", p)
 
-    print("Số dòng sẽ ghi:", len(rows))
+    print("Số dòng sẽ ghi:", len(rows) - 1)
 
     # Format header
     header_format = CellFormat(
@@ -336,72 +444,90 @@ def write_to_sheet(products):
         textFormat=TextFormat(bold=True, fontFamily='Arial', fontSize=11, foregroundColor=Color(1,1,1)),  # Chữ trắng, in đậm
         padding=Padding(left=5, top=5, right=5, bottom=5)
     )
-    format_cell_range(worksheet, 'A1:K1', header_format)
+    writer.format('A1:K1', header_format)
 
     number_format = CellFormat(
         numberFormat={'type': 'NUMBER', 'pattern': '#,##0'},
         horizontalAlignment='RIGHT'
     )
 
-    format_cell_range(worksheet, 'H1:H1000', number_format)
-    format_cell_range(worksheet, 'I1:I1000', number_format)
-    format_cell_range(worksheet, 'J1:J1000', number_format)
+    writer.format('H1:H1000', number_format)
+    writer.format('I1:I1000', number_format)
+    writer.format('J1:J1000', number_format)
 
     center_format = CellFormat(
         horizontalAlignment='CENTER',
         verticalAlignment='MIDDLE'
     )
-    format_cell_range(worksheet, 'C1:C1000', center_format)
-    format_cell_range(worksheet, 'D1:D1000', center_format)
-    format_cell_range(worksheet, 'E1:E1000', center_format)
-    format_cell_range(worksheet, 'F1:F1000', center_format)
-    format_cell_range(worksheet, 'G1:G1000', center_format)
-    format_cell_range(worksheet, 'K1:K1000', center_format)
+    writer.format('C1:C1000', center_format)
+    writer.format('D1:D1000', center_format)
+    writer.format('E1:E1000', center_format)
+    writer.format('F1:F1000', center_format)
+    writer.format('G1:G1000', center_format)
+    writer.format('K1:K1000', center_format)
 
     padding_format = CellFormat(
         padding=Padding(left=5, top=5, right=5, bottom=5)
     )
-    format_cell_range(worksheet, 'A2:K1000', padding_format)
-
-    set_column_width(worksheet, 'A', 550)
-    set_column_width(worksheet, 'B', 380)
-    set_column_width(worksheet, 'C', 80)
-    set_column_width(worksheet, 'D', 120)
-    set_column_width(worksheet, 'E', 100)
-    set_column_width(worksheet, 'F', 100)
-    set_column_width(worksheet, 'G', 50)
-    set_column_width(worksheet, 'H', 110)
-    set_column_width(worksheet, 'I', 80)
-    set_column_width(worksheet, 'J', 100)
-    set_column_width(worksheet, 'K', 130)
-
-    worksheet.freeze(rows=1)
+    writer.format('A2:K1000', padding_format)
+
+    writer.set_column_width('A', 550)
+    writer.set_column_width('B', 380)
+    writer.set_column_width('C', 80)
+    writer.set_column_width('D', 120)
+    writer.set_column_width('E', 100)
+    writer.set_column_width('F', 100)
+    writer.set_column_width('G', 50)
+    writer.set_column_width('H', 110)
+    writer.set_column_width('I', 80)
+    writer.set_column_width('J', 100)
+    writer.set_column_width('K', 130)
+
+    writer.freeze(rows=1)
+    writer.execute()
 
 def remove_duplicates(products):
     # Sử dụng set để loại bỏ các sản phẩm trùng lặp dựa trên tên sản phẩm
     seen = set()
-    unique_products = []
     for p in products:
-        if p["Tên SP Gốc"] not in seen:
-            seen.add(p["Tên SP Gốc"])
-            unique_products.append(p)
-    return unique_products
+        if p.original_name not in seen:
+            seen.add(p.original_name)
+            yield p
 
 def clean_barebone_prefix(line):
     # Xóa dấu '-' và khoảng trắng ở đầu trước từ Barebone
-    return re.sub(r'^\s*-\s*', '', line).lstrip()
+    return LEADING_DASH_RE.sub('', line).lstrip()
+
+@timed("5giay.crawl")
+def crawl():
+    print("Bắt đầu crawl dữ liệu...")
+    # Sản phẩm đi thẳng từ parser qua bước loại trùng lặp vào các cột, không dựng list dict trung gian
+    products = ColumnBuilder(FiveGiayProduct, FIVEGIAY_COLUMNS).extend(remove_duplicates(crawl_5giay()))
+    print(f"Đã crawl được {len(products)} sản phẩm (đã loại trùng lặp).")
+    for p in products:
+        print(p)
+    get_metrics().incr("rows.5giay", len(products))
+    return products
+
+@timed("5giay.upload")
+def upload(products):
+    write_to_sheet(products)
+    print("Đã ghi dữ liệu lên Google Sheets.")
+
+def record(products):
+    # Lưu giá vào lịch sử giá cục bộ
+    record_prices("5giay", ((p.name, p.price) for p in products))
+
+def run():
+    # Trả về sản phẩm (ColumnBuilder) để các bước so sánh dùng trực tiếp, không phải đọc lại sheet
+    products = crawl()
+    record(products)
+    upload(products)
+    return products
 
 if __name__ == "__main__":
     try:
-        print("Bắt đầu crawl dữ liệu...")
-        products = crawl_5giay()
-        print(f"Đã crawl được {len(products)} sản phẩm.")
-        # Loại bỏ các sản phẩm trùng lặp
-        products = remove_duplicates(products)
-        print(f"Sau khi loại bỏ trùng lặp, còn {len(products)} sản phẩm.")
-        for p in products:
-            print(p)
-        write_to_sheet(products)
-        print("Đã ghi dữ liệu lên Google Sheets.")
+        run()
     except Exception as e:
         print("Lỗi:", e)
+    get_metrics().finish("5giay")
@@ -1,16 +1,24 @@
 import requests
-from bs4 import BeautifulSoup
 import re
 import time
-import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
+import itertools
 import json
 import urllib.parse
-from gspread_formatting import format_cell_range, CellFormat, TextFormat, set_column_width, Color, Padding
-from tenacity import retry, stop_after_attempt, wait_exponential
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import os
+import http_client
+import sheets_session
+from sheet_writer import SheetWriter
+from sku_match import PriceIndex
+from price_columns import (add_arrow_to_price, add_post_id_column, compute_price_diff,
+                           make_text_fragment_links, to_int_or_na)
+from html_extract import find_config_tables, parse_shortlink_page, release
+from price_history import record_prices
+from metrics import get_metrics, timed
+from post_ids import get_post_id_index, post_id_from_soup
+from records import MKCOM_COLUMNS, ColumnBuilder, MkcomProduct, load_records
 SHEET_URL = os.environ.get("SHEET_URL")
 WC_API_URL = os.environ.get("MK_WC_API_URL")
 WC_CONSUMER_KEY = os.environ.get("MK_WC_CONSUMER_KEY")
@@ -19,284 +27,412 @@ SHEET_5GIAY_URL = SHEET_URL
 
 today_str = datetime.now().strftime("%d-%m-%Y")
 compare_sheet_name = f"Check-Gia-MKCOM-{today_str}"
-
-def get_all_barebone_products():
-    """Lấy tất cả sản phẩm barebone thông qua WooCommerce API"""
-    products = [] # This will accumulate all rows for the DataFrame
-    page = 1
+WC_SNAPSHOT_PATH = os.path.join(os.environ.get("BAREBONE_STATE_DIR", ".cache"), "wc_snapshot.json")
+# Số trang API tải song song tối đa
+WC_MAX_WORKERS = int(os.environ.get("MK_WC_MAX_WORKERS", "4"))
+WC_FIELDS = "id,name,permalink,status,modified_by,description,price,date_modified_gmt"
+# Sau số giờ này thì đồng bộ lại toàn bộ thay vì chỉ lấy phần thay đổi
+WC_FULL_SYNC_HOURS = float(os.environ.get("MK_WC_FULL_SYNC_HOURS", "24"))
+
+def fetch_wc_page(page, params):
+    url = f"{WC_API_URL}/products"
+    params = dict(params, page=page)
+    response = http_client.get(url, params=params)
+    response.raise_for_status()
+    return response
+
+def fetch_wc_page_data(page, params):
+    # JSON được giải mã ngay trong luồng tải, response không được giữ lại
+    return fetch_wc_page(page, params).json()
+
+def fetch_wc_products(extra_params=None, raise_errors=False, max_workers=None):
+    """Sinh (trang, sản phẩm) của mọi trang WooCommerce API theo thứ tự trang.
+    Trang 1 cho biết X-WP-TotalPages, các trang còn lại được tải song song (tối đa max_workers) nhưng chỉ
+    tải trước vài trang: JSON của trang đã dùng xong được bỏ ngay, không giữ cả catalog trong bộ nhớ."""
+    max_workers = max_workers or WC_MAX_WORKERS
     per_page = 100
-    
-    while True:
-        url = f"{WC_API_URL}/products"
-        params = {
-            'consumer_key': WC_CONSUMER_KEY,
-            'consumer_secret': WC_CONSUMER_SECRET,
-            'per_page': per_page,
-            'page': page,
-            'search': 'barebone'
-        }
-        
+    params = {
+        'consumer_key': WC_CONSUMER_KEY,
+        'consumer_secret': WC_CONSUMER_SECRET,
+        'per_page': per_page,
+        # Chỉ lấy các trường cần dùng để giảm kích thước response
+        '_fields': WC_FIELDS,
+    }
+    params.update(extra_params or {})
+
+    try:
+        response = fetch_wc_page(1, params)
+        data = response.json()
+        total_pages = response.headers.get('X-WP-TotalPages')
+        print(f"WooCommerce: {response.headers.get('X-WP-Total', '?')} sản phẩm, {total_pages or '?'} trang")
+        del response
+        yield from ((1, product_api_data) for product_api_data in data)
+
+        if total_pages is not None:
+            pages = iter(range(2, int(total_pages) + 1))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Hàng đợi giữ đúng thứ tự trang, mỗi trang dùng xong thì gửi tiếp một trang
+                futures = deque((page, executor.submit(fetch_wc_page_data, page, params))
+                                for page in itertools.islice(pages, max_workers * 2))
+                while futures:
+                    page, future = futures.popleft()
+                    data = future.result()
+                    for next_page in itertools.islice(pages, 1):
+                        futures.append((next_page, executor.submit(fetch_wc_page_data, next_page, params)))
+                    yield from ((page, product_api_data) for product_api_data in data)
+        else:
+            # Server không trả header phân trang: duyệt tuần tự cho tới trang cuối
+            page = 1
+            while len(data) == per_page:
+                page += 1
+                data = fetch_wc_page_data(page, params)
+                yield from ((page, product_api_data) for product_api_data in data)
+
+    except requests.exceptions.RequestException as e:
+        print(f"Lỗi khi lấy dữ liệu từ API: {str(e)}")
+        if raise_errors:
+            raise
+
+@timed("parse.mkcom_product")
+def product_to_rows(product_api_data, page):
+    """Chuyển một sản phẩm WooCommerce thành các dòng barebone (MkcomProduct)"""
+    rows = []
+    post_title = product_api_data.get('name', '')
+    product_link = product_api_data.get('permalink', '')
+    # id của WooCommerce chính là post ID, ghi lại để khỏi tải trang đọc shortlink
+    get_post_id_index().add(product_link, product_api_data.get('id'))
+    status = product_api_data.get('status', '')
+    modified_by = product_api_data.get('modified_by', '')
+    description = product_api_data.get('description', '')
+
+    status_icon = "-"
+    if status == 'publish':
+        status_icon = '👀'
+    elif status == 'pending':
+        status_icon = '⏰'
+    elif status == 'private':
+        status_icon = '🔒'
+    elif status == 'draft':
+        status_icon = '📝'
+
+    # Biến cờ để kiểm tra xem có sản phẩm barebone nào được trích xuất từ bảng không
+    has_extracted_from_table = False
+
+    if description:
+        # Tìm tất cả các bảng 'notcauhinh' hoặc 'cauhinh' (parse cả description bằng parser nhanh, không lọc SoupStrainer)
+        tables = find_config_tables(description)
+
+        if tables:
+            for table in tables:
+                rows_in_table = table.find_all('tr')
+
+                for row_idx, row in enumerate(rows_in_table):
+                    # Bỏ qua hàng tiêu đề nếu có (kiểm tra <th> hoặc nếu là hàng đầu tiên và không có <td>)
+                    if row.find('th') or (row_idx == 0 and not row.find_all('td')):
+                        continue 
+
+                    tds = row.find_all('td')
+                    if len(tds) > 1: # Đảm bảo có đủ cột cho tên và giá
+                        name_from_table = tds[0].text.strip()
+
+                        # Xóa thông tin trong dấu ngoặc đơn
+                        name_from_table = re.sub(r'\([^)]*\)', '', name_from_table).strip()
+
+                        # Chỉ lấy dòng có chữ 'barebone' (không phân biệt hoa thường)
+                        if 'barebone' not in name_from_table.lower():
+                            continue 
+
+                        # Lấy giá từ bảng (cột thứ 2)
+                        price_from_table = None
+                        price_text = tds[1].text
+                        strong_tag = tds[1].find('strong')
+                        if strong_tag:
+                            price_text = strong_tag.text
+                        price_text = price_text.strip().replace('.', '').replace(',', '').replace('VND', '').replace('đ', '')
+                        try:
+                            price_from_table = int(price_text)
+                        except ValueError:
+                            price_from_table = None
+
+                        # Xác định "Sản phẩm ẩn" từ hàng hiện tại
+                        current_row_is_hidden = "Đang ẩn" if 'admin-only' in row.get('class', []) else ""
+
+                        # Áp dụng logic xóa "Precision" và chuẩn hóa khoảng trắng cho tên sản phẩm từ bảng
+                        cleaned_product_name_mkcom = re.sub(r'\bPrecision\b', '', name_from_table, flags=re.IGNORECASE)
+                        cleaned_product_name_mkcom = re.sub(r'\s+', ' ', cleaned_product_name_mkcom).strip()
+
+                        rows.append(MkcomProduct(
+                            post_title=post_title,
+                            name=cleaned_product_name_mkcom,
+                            price=price_from_table,
+                            link=product_link,
+                            page=page,
+                            status=status_icon,
+                            modified_by=modified_by,
+                            hidden=current_row_is_hidden
+                        ))
+                        has_extracted_from_table = True # Đã trích xuất ít nhất một mục từ bảng
+
+            # Đọc xong các bảng thì huỷ cây DOM của description ngay
+            release(tables[0])
+
+    # Nếu không có sản phẩm barebone nào được trích xuất từ bảng, hoặc không tìm thấy bảng nào,
+    # thì thêm thông tin sản phẩm chính (từ API)
+    if not has_extracted_from_table and 'barebone' in post_title.lower():
+        # Lấy giá sản phẩm chính từ API nếu không có giá cụ thể từ bảng
+        main_product_price = product_api_data.get('price')
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data:
-                break
-                
-            for product_api_data in data: # Renamed to avoid conflict with product variable in inner loop
-                post_title = product_api_data.get('name', '')
-                product_link = product_api_data.get('permalink', '')
-                status = product_api_data.get('status', '')
-                modified_by = product_api_data.get('modified_by', '')
-                description = product_api_data.get('description', '')
-                
-                status_icon = "-"
-                if status == 'publish':
-                    status_icon = '👀'
-                elif status == 'pending':
-                    status_icon = '⏰'
-                elif status == 'private':
-                    status_icon = '🔒'
-                elif status == 'draft':
-                    status_icon = '📝'
-
-                # Biến cờ để kiểm tra xem có sản phẩm barebone nào được trích xuất từ bảng không
-                has_extracted_from_table = False
-                
-                if description:
-                    desc_soup = BeautifulSoup(description, "html.parser")
-                    # Tìm tất cả các bảng 'notcauhinh' hoặc 'cauhinh'
-                    tables = desc_soup.find_all('table', class_=['notcauhinh', 'cauhinh'])
-                    
-                    if tables:
-                        for table in tables:
-                            rows_in_table = table.find_all('tr')
-                            
-                            for row_idx, row in enumerate(rows_in_table):
-                                # Bỏ qua hàng tiêu đề nếu có (kiểm tra <th> hoặc nếu là hàng đầu tiên và không có <td>)
-                                if row.find('th') or (row_idx == 0 and not row.find_all('td')):
-                                    continue 
-
-                                tds = row.find_all('td')
-                                if len(tds) > 1: # Đảm bảo có đủ cột cho tên và giá
-                                    name_from_table = tds[0].text.strip()
-                                    
-                                    # Xóa thông tin trong dấu ngoặc đơn
-                                    name_from_table = re.sub(r'\([^)]*\)', '', name_from_table).strip()
-                                    
-                                    # Chỉ lấy dòng có chữ 'barebone' (không phân biệt hoa thường)
-                                    if 'barebone' not in name_from_table.lower():
-                                        continue 
-                                    
-                                    # Lấy giá từ bảng (cột thứ 2)
-                                    price_from_table = None
-                                    price_text = tds[1].text
-                                    strong_tag = tds[1].find('strong')
-                                    if strong_tag:
-                                        price_text = strong_tag.text
-                                    price_text = price_text.strip().replace('.', '').replace(',', '').replace('VND', '').replace('đ', '')
-                                    try:
-                                        price_from_table = int(price_text)
-                                    except ValueError:
-                                        price_from_table = None
-
-                                    # Xác định "Sản phẩm ẩn" từ hàng hiện tại
-                                    current_row_is_hidden = "Đang ẩn" if 'admin-only' in row.get('class', []) else ""
-
-                                    # Áp dụng logic xóa "Precision" và chuẩn hóa khoảng trắng cho tên sản phẩm từ bảng
-                                    cleaned_product_name_mkcom = re.sub(r'\bPrecision\b', '', name_from_table, flags=re.IGNORECASE)
-                                    cleaned_product_name_mkcom = re.sub(r'\s+', ' ', cleaned_product_name_mkcom).strip()
-
-                                    products.append({
-                                        "Tên Post": post_title,
-                                        "Tên sản phẩm": cleaned_product_name_mkcom,
-                                        "Giá bán (VNĐ)": price_from_table,
-                                        "Link": product_link,
-                                        "Trang": page,
-                                        "Tình trạng": status_icon,
-                                        "Người sửa": modified_by,
-                                        "Sản phẩm ẩn": current_row_is_hidden
-                                    })
-                                    has_extracted_from_table = True # Đã trích xuất ít nhất một mục từ bảng
-                
-                # Nếu không có sản phẩm barebone nào được trích xuất từ bảng, hoặc không tìm thấy bảng nào,
-                # thì thêm thông tin sản phẩm chính (từ API)
-                if not has_extracted_from_table and 'barebone' in post_title.lower():
-                    # Lấy giá sản phẩm chính từ API nếu không có giá cụ thể từ bảng
-                    main_product_price = product_api_data.get('price')
-                    try:
-                        main_product_price = int(float(main_product_price)) if main_product_price else None
-                    except:
-                        main_product_price = None
-
-                    # Áp dụng làm sạch cho tên bài đăng gốc nếu đó là barebone và không tìm thấy mục nào trong bảng
-                    cleaned_post_title_mkcom = re.sub(r'\bPrecision\b', '', post_title, flags=re.IGNORECASE)
-                    cleaned_post_title_mkcom = re.sub(r'\s+', ' ', cleaned_post_title_mkcom).strip()
-
-                    products.append({
-                        "Tên Post": post_title,
-                        "Tên sản phẩm": cleaned_post_title_mkcom, # Tên SP MKCOM sẽ là tên post nếu không có bảng
-                        "Giá bán (VNĐ)": main_product_price,
-                        "Link": product_link,
-                        "Trang": page,
-                        "Tình trạng": status_icon,
-                        "Người sửa": modified_by,
-                        "Sản phẩm ẩn": "" # Không ẩn nếu không phải từ hàng admin-only của bảng
-                    })
-
-            page += 1
-            time.sleep(1)
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Lỗi khi lấy dữ liệu từ API: {str(e)}")
-            break
-            
-    return products
-
-def upload_to_gsheets(df, sheet_url, worksheet_name="Sheet1"):
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
+            main_product_price = int(float(main_product_price)) if main_product_price else None
+        except:
+            main_product_price = None
+
+        # Áp dụng làm sạch cho tên bài đăng gốc nếu đó là barebone và không tìm thấy mục nào trong bảng
+        cleaned_post_title_mkcom = re.sub(r'\bPrecision\b', '', post_title, flags=re.IGNORECASE)
+        cleaned_post_title_mkcom = re.sub(r'\s+', ' ', cleaned_post_title_mkcom).strip()
+
+        rows.append(MkcomProduct(
+            post_title=post_title,
+            name=cleaned_post_title_mkcom, # Tên SP MKCOM sẽ là tên post nếu không có bảng
+            price=main_product_price,
+            link=product_link,
+            page=page,
+            status=status_icon,
+            modified_by=modified_by,
+            hidden="" # Không ẩn nếu không phải từ hàng admin-only của bảng
+        ))
+
+    return rows
+
+def get_all_barebone_products():
+    """Sinh các dòng barebone của mọi sản phẩm thông qua WooCommerce API"""
+    for page, product_api_data in fetch_wc_products({'search': 'barebone'}):
+        yield from product_to_rows(product_api_data, page)
+
+def load_wc_snapshot():
     try:
-        worksheet = sh.worksheet(worksheet_name)
-        worksheet.clear()
-    except:
-        worksheet = sh.add_worksheet(title=worksheet_name, rows="300", cols="10")
+        with open(WC_SNAPSHOT_PATH, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    for entry in snapshot.get("products", {}).values():
+        entry["rows"] = load_records(MkcomProduct, entry["rows"])
+        if entry["rows"] is None:
+            # Snapshot theo định dạng cũ (dòng là dict): đồng bộ lại toàn bộ
+            return None
+    return snapshot
+
+def save_wc_snapshot(snapshot):
+    os.makedirs(os.path.dirname(WC_SNAPSHOT_PATH) or ".", exist_ok=True)
+    tmp_path = WC_SNAPSHOT_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, WC_SNAPSHOT_PATH)
+
+def snapshot_entry(page, product_api_data):
+    return {
+        "date_modified": product_api_data.get('date_modified_gmt') or product_api_data.get('date_modified', ''),
+        "rows": product_to_rows(product_api_data, page),
+    }
+
+def full_sync_barebone_products():
+    """Đồng bộ toàn bộ và tạo snapshot mới (key là id sản phẩm). Lỗi ở bất kỳ trang nào thì ném
+    RequestException: snapshot thiếu trang không bao giờ được tạo. Sản phẩm được chuyển thành dòng ngay khi
+    trang của nó tải xong, snapshot chỉ giữ các dòng chứ không giữ JSON của API"""
+    snapshot = {
+        "full_sync_at": time.time(),
+        "order": [],
+        "products": {},
+    }
+    for page, product_api_data in fetch_wc_products({'search': 'barebone'}, raise_errors=True):
+        product_id = str(product_api_data.get('id'))
+        if product_id in snapshot["products"]:
+            continue
+        snapshot["order"].append(product_id)
+        snapshot["products"][product_id] = snapshot_entry(page, product_api_data)
+    snapshot["synced_at"] = max((p["date_modified"] for p in snapshot["products"].values()), default="")
+    print(f"Đồng bộ toàn bộ: {len(snapshot['order'])} sản phẩm")
+    return snapshot
+
+def incremental_sync_barebone_products(snapshot):
+    """Chỉ lấy các sản phẩm sửa sau lần đồng bộ trước và gộp vào snapshot"""
+    since = snapshot["synced_at"]
+    changed_params = {'modified_after': since, 'dates_are_gmt': 'true'}
+    # Tải hết phần thay đổi rồi mới sửa snapshot: lỗi giữa chừng thì snapshot cũ còn nguyên
+    # Sản phẩm barebone mới/được sửa (thường chỉ 1 request)
+    changed = [(str(product_api_data.get('id')), snapshot_entry(page, product_api_data))
+               for page, product_api_data in fetch_wc_products(dict(changed_params, search='barebone'), raise_errors=True)]
+    # Mọi sản phẩm được sửa, chỉ lấy id: sản phẩm nào có ở đây mà không còn khớp
+    # search=barebone thì bị loại khỏi snapshot
+    touched = {str(p.get('id')) for _, p in fetch_wc_products(dict(changed_params, _fields='id'), raise_errors=True)}
+
+    changed_ids = set()
+    new_ids = []
+    for product_id, entry in changed:
+        changed_ids.add(product_id)
+        if product_id not in snapshot["products"]:
+            new_ids.append(product_id)
+        snapshot["products"][product_id] = entry
+    removed_ids = touched - changed_ids
+    for product_id in removed_ids:
+        snapshot["products"].pop(product_id, None)
+    # Sản phẩm mới nằm đầu danh sách giống thứ tự mặc định của API (mới nhất trước)
+    snapshot["order"] = new_ids + [
+        product_id for product_id in snapshot["order"]
+        if product_id in snapshot["products"] and product_id not in new_ids
+    ]
+    snapshot["synced_at"] = max([since] + [snapshot["products"][i]["date_modified"] for i in changed_ids])
+    print(f"Đồng bộ tăng dần từ {since}: {len(changed_ids)} sản phẩm thay đổi, {len(removed_ids)} sản phẩm bị loại")
+    return snapshot
+
+def sync_wc_snapshot(full=None):
+    """Đồng bộ snapshot cục bộ với WooCommerce, chỉ lấy phần thay đổi. Trả về (snapshot, đầy đủ):
+    đồng bộ lỗi thì dùng snapshot của lần trước (không lưu, đầy đủ = False), chưa có snapshot nào thì ném lỗi.
+    MK_WC_SYNC_MODE=full (hoặc full=True) để đồng bộ lại toàn bộ."""
+    if full is None:
+        full = os.environ.get("MK_WC_SYNC_MODE", "incremental") == "full"
+    snapshot = None if full else load_wc_snapshot()
+    if snapshot and time.time() - snapshot.get("full_sync_at", 0) > WC_FULL_SYNC_HOURS * 3600:
+        # Định kỳ đồng bộ lại toàn bộ để loại các sản phẩm đã xoá/bỏ vào thùng rác
+        snapshot = None
+    if snapshot:
+        try:
+            snapshot = incremental_sync_barebone_products(snapshot)
+        except requests.exceptions.RequestException:
+            # Lỗi khi tải (trước khi sửa snapshot): giữ nguyên snapshot cũ, không lưu để lần sau lấy lại
+            print("Đồng bộ tăng dần thất bại, dùng snapshot của lần trước.")
+            return snapshot, False
+    else:
+        try:
+            snapshot = full_sync_barebone_products()
+        except requests.exceptions.RequestException:
+            # Chỉ đọc lại snapshot cũ khi cần, không giữ nó song song với snapshot đang dựng
+            previous = load_wc_snapshot()
+            if previous is None:
+                raise
+            # full_sync_at của snapshot cũ giữ nguyên nên lần chạy sau lại đồng bộ toàn bộ
+            print("Đồng bộ toàn bộ thất bại, dùng snapshot của lần trước.")
+            return previous, False
+    save_wc_snapshot(snapshot)
+    return snapshot, True
+
+def snapshot_rows(snapshot):
+    """Sinh các dòng barebone của snapshot theo thứ tự của API"""
+    post_ids = get_post_id_index()
+    for product_id in snapshot["order"]:
+        for row in snapshot["products"][product_id]["rows"]:
+            post_ids.add(row.link, product_id)
+            yield row
+
+def upload_to_gsheets(df, sheet_url, worksheet_name="Sheet1", merge_link_col=None):
+    from gspread_formatting import CellFormat, TextFormat, Color, Padding
+    # Gom ghi dữ liệu + định dạng + độ rộng cột + freeze vào một batchUpdate
+    writer = SheetWriter.open(worksheet_name, rows=300, cols=10, sheet_url=sheet_url)
     # Thay thế NaN bằng None hoặc chuỗi rỗng
     df = df.fillna("")  # Hoặc df = df.fillna(None)
-    # Ghi header + data
-    worksheet.update([df.columns.values.tolist()] + df.values.tolist())
-    print(f"Đã upload dữ liệu lên Google Sheets: {worksheet_name}")
+    # Ghi header + data (chỉ gửi các ô đổi so với lần ghi trước nếu sheet giữ nguyên kích thước)
+    writer.write_grid([df.columns.values.tolist()] + df.values.tolist())
+    if merge_link_col:
+        merge_link_cells(df, writer, link_col=merge_link_col)
 
-    # Sau khi đã upload dữ liệu lên sheet và có biến worksheet
     header_format = CellFormat(
         backgroundColor=Color(0.2, 0.6, 0.86),  # Xanh dương nhạt, đổi theo ý bạn
         textFormat=TextFormat(bold=True, fontFamily='Arial', fontSize=11, foregroundColor=Color(1,1,1)),  # Chữ trắng, in đậm
         padding=Padding(left=5, top=5, right=5, bottom=5)
     )
-    format_cell_range(worksheet, 'A1:J1', header_format)
+    writer.format('A1:J1', header_format)
 
     number_format = CellFormat(
         numberFormat={'type': 'NUMBER', 'pattern': '#,##0'},
         horizontalAlignment='RIGHT'
     )
 
-    format_cell_range(worksheet, 'C1:E1000', number_format)
+    writer.format('C1:E1000', number_format)
 
     padding_format = CellFormat(
         padding=Padding(left=5, top=5, right=5, bottom=5)
     )
-    format_cell_range(worksheet, 'A2:J1000', padding_format)
+    writer.format('A2:J1000', padding_format)
 
     left_middle_format = CellFormat(
         horizontalAlignment='LEFT',
         verticalAlignment='MIDDLE'
     )
-    format_cell_range(worksheet, 'A1:A1000', left_middle_format)
+    writer.format('A1:A1000', left_middle_format)
 
     left_format = CellFormat(
         horizontalAlignment='LEFT',
     )
-    format_cell_range(worksheet, 'B1:B1000', left_format)
-    format_cell_range(worksheet, 'F1:G1000', left_format)
-    format_cell_range(worksheet, 'J1:J1000', left_format)
+    writer.format('B1:B1000', left_format)
+    writer.format('F1:G1000', left_format)
+    writer.format('J1:J1000', left_format)
 
     center_format = CellFormat(
         horizontalAlignment='CENTER',
     )
-    format_cell_range(worksheet, 'H1:I1000', center_format)
+    writer.format('H1:I1000', center_format)
 
     middle_format = CellFormat(
         verticalAlignment='MIDDLE'
     )
-    format_cell_range(worksheet, 'A1:J1000', middle_format)
+    writer.format('A1:J1000', middle_format)
 
-    worksheet.freeze(rows=1)
+    writer.freeze(rows=1)
 
     # Điều chỉnh độ rộng cột (Tổng cộng 10 cột)
-    set_column_width(worksheet, 'A', 300)
-    set_column_width(worksheet, 'B', 400)
-    set_column_width(worksheet, 'C', 111)
-    set_column_width(worksheet, 'D', 111)
-    set_column_width(worksheet, 'E', 91)
-    set_column_width(worksheet, 'F', 200)
-    set_column_width(worksheet, 'G', 200)
-    set_column_width(worksheet, 'H', 90)
-    set_column_width(worksheet, 'I', 100)
-    set_column_width(worksheet, 'J', 90)
-
-    return worksheet
-
-def merge_link_cells(sheet_url, worksheet_name="Sheet1", link_col=3):
+    writer.set_column_width('A', 300)
+    writer.set_column_width('B', 400)
+    writer.set_column_width('C', 111)
+    writer.set_column_width('D', 111)
+    writer.set_column_width('E', 91)
+    writer.set_column_width('F', 200)
+    writer.set_column_width('G', 200)
+    writer.set_column_width('H', 90)
+    writer.set_column_width('I', 100)
+    writer.set_column_width('J', 90)
+
+    writer.execute()
+    print(f"Đã upload dữ liệu lên Google Sheets: {worksheet_name}")
+
+    return writer.worksheet
+
+def merge_link_cells(df, writer, link_col=3):
     # link_col: cột Link, mặc định là cột thứ 3 (A=1, B=2, C=3, ...)
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    worksheet = sh.worksheet(worksheet_name)
-    data = worksheet.get_all_values()
-    last_link = None
-    start_row = None
-    for i, row in enumerate(data[1:], start=2):  # Bỏ header, bắt đầu từ dòng 2
-        link = row[link_col-1]
-        if link == last_link:
-            # Đang trong chuỗi giống nhau
-            continue
-        else:
-            # Nếu có chuỗi trước đó dài hơn 1, thì merge
-            if start_row and i-1 > start_row:
-                worksheet.merge_cells(
-                    start_row, link_col, i-1, link_col
-                )
-            last_link = link
-            start_row = i
-    # Merge chuỗi cuối cùng nếu cần
-    if start_row and len(data) > start_row:
-        worksheet.merge_cells(
-            start_row, link_col, len(data), link_col
-        )
-    print("Đã merge các ô link giống nhau.")
+    # Tính vùng merge từ DataFrame trước khi upload, gửi chung batchUpdate với dữ liệu
+    values = df.iloc[:, link_col-1].fillna("").tolist()
+    count = writer.merge_column_runs(values, link_col)
+    print(f"Sẽ merge {count} nhóm ô link giống nhau.")
 
 def has_factor(part):
     # Kiểm tra part có chứa 1 trong các factor không
     return bool(re.search(r'\b(sff|mt|dt|mini|tiny)\b', part, re.IGNORECASE))
 
 def get_all_5giay_prices(sheet_url, sheet_date):
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    worksheet = sh.worksheet(sheet_date)
-    data = worksheet.get_all_records()
+    worksheet = sheets_session.get_worksheet(sheet_date, sheet_url)
+    data = sheets_session.call_api("get_all_records", worksheet.get_all_records)
     
     # In ra tên các cột để kiểm tra
     print("Các cột trong sheet:", list(data[0].keys()) if data else "Không có dữ liệu")
-    
+    return build_5giay_price_dict(data)
+
+def build_5giay_price_dict(data):
+    # data: các dòng 5giay, dict theo tên cột (đọc từ sheet) hoặc FiveGiayProduct (trực tiếp từ crawl_5giay)
     # Thử lấy giá từ các cột có thể chứa giá
     price_dict = {}
     for row in data:
-        name_key = row.get("Tên SP đã sửa") or row.get("Tên sản phẩm")
+        if not isinstance(row, dict):
+            name_key, price = row.name, row.price_vc
+        else:
+            name_key = row.get("Tên SP đã sửa") or row.get("Tên sản phẩm")
+            price = None
+            if "Giá bán VC" in row:
+                price = row["Giá bán VC"]
+            elif "Giá bán (VNĐ)" in row:
+                price = row["Giá bán (VNĐ)"]
+            elif "Giá" in row:
+                price = row["Giá"]
         if not name_key:
             continue
         name_key = name_key.lower().strip()
-        price = None
-        if "Giá bán VC" in row:
-            price = row["Giá bán VC"]
-        elif "Giá bán (VNĐ)" in row:
-            price = row["Giá bán (VNĐ)"]
-        elif "Giá" in row:
-            price = row["Giá"]
         # Lưu cả chuỗi gốc làm key
         price_dict[name_key] = price
 
@@ -308,38 +444,33 @@ def get_all_5giay_prices(sheet_url, sheet_date):
     
     return price_dict
 
-def add_5giay_price_and_diff(df):
+def add_5giay_price_and_diff(df, all_5giay_prices=None):
+    import pandas as pd
     # Đổi tên các cột trước
     df = df.rename(columns={
         "Tên sản phẩm": "Tên SP MKCOM",
         "Giá bán (VNĐ)": "Giá MKCOM"
     })
 
-    prices_5giay = []
-    diffs = []
-    all_5giay_prices = get_all_5giay_prices(SHEET_5GIAY_URL, today_str)
+    if all_5giay_prices is None:
+        all_5giay_prices = get_all_5giay_prices(SHEET_5GIAY_URL, today_str)
     
     # In ra số lượng sản phẩm tìm thấy giá
     found_prices = sum(1 for price in all_5giay_prices.values() if price is not None)
     print(f"Tìm thấy giá cho {found_prices}/{len(all_5giay_prices)} sản phẩm")
     
-    for idx, row in df.iterrows():
-        product_name = row["Tên SP MKCOM"].lower().strip()
-        price_5giay = get_price_from_5giay(product_name, all_5giay_prices)
-        prices_5giay.append(price_5giay)
-        
-        # Tính chênh lệch chỉ khi có giá ở cả 2 bên
-        if price_5giay != "-" and row["Giá MKCOM"] is not None:
-            try:
-                diff = row["Giá MKCOM"] - int(price_5giay)
-                # Nếu chênh lệch = 0 thì gán "-"
-                if diff == 0:
-                    diff = "-"
-            except:
-                diff = ""
-        else:
-            diff = ""
-        diffs.append(diff)
+    # Bảng giá 5giay theo từng tên (không trùng) rồi ghép vào DataFrame, thay cho iterrows
+    price_index = PriceIndex(all_5giay_prices)
+    name_keys = df["Tên SP MKCOM"].str.lower().str.strip()
+    price_table = pd.DataFrame({"name_key": name_keys.unique()})
+    price_table["Giá 5giay"] = [get_price_from_5giay(name, price_index) for name in price_table["name_key"]]
+    price_table["Giá 5giay (số)"] = pd.array([to_int_or_na(price) for price in price_table["Giá 5giay"]], dtype="Int64")
+    matched = pd.DataFrame({"name_key": name_keys}).merge(price_table, on="name_key", how="left")
+    prices_5giay = matched["Giá 5giay"].to_numpy()
+    print(price_index.summary())
+    
+    # Tính chênh lệch chỉ khi có giá ở cả 2 bên; chênh lệch = 0 thì gán "-"
+    diffs = compute_price_diff(df["Giá MKCOM"], matched["Giá 5giay (số)"])
     
     # Xóa cột Trang
     df = df.drop(columns=["Trang"])
@@ -351,7 +482,7 @@ def add_5giay_price_and_diff(df):
     df.insert(price_col_idx + 2, "Chênh lệch", diffs)
     
     # Thêm link và các cột khác
-    df["Link"] = df.apply(lambda row: make_text_fragment_link(row["Link"], row["Tên SP MKCOM"]), axis=1)
+    df["Link"] = make_text_fragment_links(df["Link"], df["Tên SP MKCOM"])
     
     cols = df.columns.tolist()
     cols = ['Tên Post'] + [col for col in cols if col != 'Tên Post']
@@ -372,70 +503,33 @@ def extract_model_part(name):
         return match.group(2).strip()
     return name.strip()
 
-def get_price_from_5giay(name, price_dict):
-    name = name.lower().strip()
-    # So khớp trực tiếp với tên SP đã sửa
-    if name in price_dict:
-        return price_dict[name]
-    return "-"  # Trả về "-" nếu không tìm thấy tên giống nhau
+def get_price_from_5giay(name, price_index):
+    # Khớp trực tiếp với tên SP đã sửa, sau đó theo khoá chuẩn (hãng/model/đời/form factor)
+    return price_index.lookup(name)  # Trả về "-" nếu không tìm thấy
 
 def make_text_fragment_link(base_url, product_name):
     encoded_text = urllib.parse.quote(product_name)
     return f"{base_url}#:~:text={encoded_text}"
 
-def add_arrow_to_price(row):
-    diff = row["Chênh lệch"]
-    price = row["Giá MKCOM"]
-    if diff == "" or price == "":
-        return price
-    try:
-        diff_val = int(diff)
-        if diff_val == 0:
-            return f"{price:,}"
-        elif diff_val < 0:
-            arrow = "🔺"  # Mũi tên lên
-        else:
-            arrow = "🔻"  # Mũi tên xuống
-        return f"{arrow} {price:,}"
-    except:
-        return price
-
 def clear_duplicate_post_title(df):
     df = df.copy()
     df['Tên Post'] = df['Tên Post'].where(df['Tên Post'].ne(df['Tên Post'].shift()))
     return df
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def get_post_id_from_shortlink(product_url):
+    # Thử lại khi lỗi tạm thời đã nằm trong http_client.get
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-        resp = requests.get(product_url, headers=headers, timeout=5)  # Giảm timeout xuống 5s
+        resp = http_client.get(product_url, timeout=5)  # Giảm timeout xuống 5s
         if resp.status_code != 200:
             return ""
-        soup = BeautifulSoup(resp.text, "html.parser")
-        shortlink_tag = soup.find("link", rel="shortlink")
-        if shortlink_tag and "href" in shortlink_tag.attrs:
-            match = re.search(r"p=(\d+)", shortlink_tag["href"])
-            if match:
-                return match.group(1)
-        return ""
+        soup = parse_shortlink_page(resp.text)
+        post_id = post_id_from_soup(soup)
+        release(soup)
+        return post_id
     except Exception as e:
         print(f"Lỗi khi lấy post ID từ {product_url}: {str(e)}")
         return ""
 
-def add_post_id_column(df):
-    # Giả sử cột "Link" chứa link sản phẩm
-    ids = []
-    for url in df["Link"]:
-        post_id = get_post_id_from_shortlink(url)
-        ids.append(post_id)
-    # Thêm cột "ID" sau cột "Chênh lệch"
-    insert_idx = df.columns.get_loc("Chênh lệch") + 1
-    df.insert(insert_idx, "ID", ids)
-    return df
-
 def add_edit_price_column(df):
     # Lấy ID từ cột "ID" và tạo link sửa (KHÔNG thêm text fragment)
     edit_links = []
@@ -452,13 +546,23 @@ def add_edit_price_column(df):
     df = df.drop(columns=["ID"])
     return df
 
-if __name__ == "__main__":
+@timed("mkcom.crawl")
+def crawl():
     # Lấy tất cả sản phẩm barebone
-    all_products = get_all_barebone_products()
+    snapshot, complete = sync_wc_snapshot()
+    # Các dòng đi thẳng từ snapshot vào các cột, DataFrame dựng một lần ở bước so sánh
+    all_products = ColumnBuilder(MkcomProduct, MKCOM_COLUMNS).extend(snapshot_rows(snapshot))
+    # Đồng bộ lỗi: vẫn upload dữ liệu của lần trước nhưng bước không được đánh dấu là đã xong
+    all_products.complete = complete
     print(f"Tổng số sản phẩm barebone: {len(all_products)}")
-    
-    # Chuyển sang DataFrame
-    df = pd.DataFrame(all_products)
+    get_metrics().incr("rows.mkcom", len(all_products))
+    return all_products
+
+@timed("mkcom.compare")
+def compare(all_products, price_dict=None):
+    import pandas as pd
+    # Dựng DataFrame một lần từ các cột đã gom khi crawl
+    df = all_products.to_frame()
     
     # THÊM ĐOẠN CODE NÀY: Bỏ từ "Precision" và loại bỏ tất cả khoảng trắng dư thừa (đầu, cuối, giữa các từ).
     # Sử dụng re.sub để thay thế từ "Precision" và chuẩn hóa khoảng trắng.
@@ -467,16 +571,35 @@ if __name__ == "__main__":
     df['Tên sản phẩm'] = df['Tên sản phẩm'].apply(lambda x: re.sub(r'\s+', ' ', x).strip())
     
     # Xử lý và upload lên Google Sheets
-    df = add_5giay_price_and_diff(df)
-    df["Giá MKCOM"] = df.apply(add_arrow_to_price, axis=1)
+    df = add_5giay_price_and_diff(df, price_dict)
+    df["Giá MKCOM"] = add_arrow_to_price(df, "Giá MKCOM")
     df = clear_duplicate_post_title(df)
     df = df.loc[df['Tên Post'].ne(df['Tên Post'].shift())].reset_index(drop=True)
     total = df['Tên Post'].replace('', pd.NA).dropna().shape[0]
     df = df.rename(columns={"Tên Post": f"Tên Post [{total}]"})
     
     # Thêm post ID và link sửa
-    df = add_post_id_column(df)
+    df = add_post_id_column(df, get_post_id_from_shortlink, "mkcom.post_ids")
     df = add_edit_price_column(df)
-    
+    return df
+
+@timed("mkcom.upload")
+def upload(df):
     # Upload lên Google Sheets
     upload_to_gsheets(df, SHEET_URL, worksheet_name=compare_sheet_name)
+
+def record(all_products):
+    # Lưu giá vào lịch sử giá cục bộ
+    record_prices("mkcom", ((p.name, p.price) for p in all_products))
+
+def run(price_dict=None):
+    # price_dict: bảng giá 5giay trong bộ nhớ (từ build_5giay_price_dict); None thì đọc từ sheet
+    all_products = crawl()
+    record(all_products)
+    df = compare(all_products, price_dict)
+    upload(df)
+    return df
+
+if __name__ == "__main__":
+    run()
+    get_metrics().finish("mkcom")
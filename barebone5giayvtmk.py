@@ -1,302 +1,285 @@
 import requests
-from bs4 import BeautifulSoup
 import re
 import time
-import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 import json
 import urllib.parse
-from gspread_formatting import format_cell_range, CellFormat, TextFormat, set_column_width, Color, Padding
-from tenacity import retry, stop_after_attempt, wait_exponential
-from concurrent.futures import ThreadPoolExecutor
 import os
+import http_client
+import sheets_session
+from sheet_writer import SheetWriter
+from sku_match import PriceIndex
+from price_columns import (add_arrow_to_price, add_post_id_column, compute_price_diff,
+                           make_text_fragment_links, to_int_or_na)
+from html_extract import parse_html, parse_product_page, parse_shortlink_page, release
+from price_history import record_prices
+from metrics import get_metrics, timed
+from post_ids import POST_CLASS_RE, get_post_id_index, post_id_from_classes, post_id_from_html, post_id_from_soup
+from http_cache import get_cache
+from records import VTMK_COLUMNS, ColumnBuilder, VtmkProduct, load_records
 
 SHEET_URL = os.environ.get("SHEET_URL")
 SHEET_5GIAY_URL = SHEET_URL  # Dùng cùng 1 link Google Sheet
 today_str = datetime.now().strftime("%d-%m-%Y")
 compare_sheet_name = f"Check-Gia-VTMK-{today_str}"
+VTMK_CATEGORY_URL = "https://vitinhminhkhoi.vn/product-category/san-pham/barabone-may-bo/"
 
-def get_all_barebone_links():
-    base_url = "https://vitinhminhkhoi.vn/product-category/san-pham/barabone-may-bo/"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
+@timed("vtmk.category_pages")
+def get_all_barebone_links(base_url=VTMK_CATEGORY_URL):
     product_links = dict()
+    post_ids = get_post_id_index()
     page = 1
     while True:
         url = base_url if page == 1 else f"{base_url}page/{page}/"
         print(f"Đang lấy link từ: {url}")
-        resp = requests.get(url, headers=headers)
+        # Nhịp tải các trang danh mục do giới hạn request/giây của http_client quyết định
+        resp = get_cache().get(url)
         if resp.status_code != 200:
             print("  -> LỖI: Không truy cập được trang danh mục này!")
             break
-        soup = BeautifulSoup(resp.text, "html.parser")
+        # Cần thẻ cha của link nên vẫn dựng cả trang, chỉ đổi sang parser nhanh
+        soup = parse_html(resp.text)
         for a in soup.find_all('a', href=True):
             if '/product/' in a['href']:
                 full_link = a['href'] if a['href'].startswith('http') else f"https://vitinhminhkhoi.vn{a['href']}"
                 if full_link not in product_links:
                     product_links[full_link] = page
+                # Thẻ sản phẩm có class "post-NNN": ghi lại post ID, khỏi tải trang để đọc shortlink
+                container = a.find_parent(class_=POST_CLASS_RE)
+                if container:
+                    post_ids.add(full_link, post_id_from_classes(container.get('class')))
         next_btn = soup.find('a', class_='next page-numbers')
+        release(soup)
         if not next_btn:
             break
         page += 1
-        time.sleep(1)
     # Trả về list các tuple (link, page)
     return [(link, product_links[link]) for link in product_links]
 
 def get_barebone_info(url, page):
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-        resp = requests.get(url, headers=headers, timeout=10)
+        cache = get_cache()
+        resp = cache.get(url)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        # Lấy tiêu đề post
-        post_title = ""
-        h2 = soup.find('h2', class_='product-name')
-        if h2:
-            post_title = h2.text.strip()
-        # Lấy bảng thông tin
-        table = soup.find('table', class_=['notcauhinh', 'cauhinh'])
-        results = []
-        if table:
-            rows = table.find_all('tr')
-            for row in rows[1:]:  # bỏ header
-                tds = row.find_all('td')
-                if len(tds) > 1:
-                    name = tds[0].text.strip()
-                    # Xóa thông tin trong dấu ngoặc đơn
-                    name = re.sub(r'\([^)]*\)', '', name).strip()
-                    # Thêm "[Đang Ẩn]" nếu tr có thuộc tính hidden
-                    if row.has_attr('hidden'):
-                        name = f"{name} [Đang Ẩn]"
-                    # Chỉ lấy dòng có chữ 'barebone' (không phân biệt hoa thường)
-                    if 'barebone' not in name.lower():
-                        continue
-                    price_text = tds[1].text
-                    strong = tds[1].find('strong')
-                    if strong:
-                        price_text = strong.text
-                    price = price_text.strip().replace('.', '').replace(',', '').replace('VND', '').replace('đ', '')
-                    try:
-                        price = int(price)
-                    except:
-                        price = None
-                    print(f"Tên: {name} | Giá: {price} | Link: {url} | Trang: {page}")
-                    results.append({
-                        "Tên Post": post_title,
-                        "Tên sản phẩm": name,
-                        "Giá bán (VNĐ)": price,
-                        "Link": url,
-                        "Trang": page
-                    })
-        else:
-            print(f"Không tìm thấy bảng thông tin tại {url}")
-        return results
+        return parse_barebone_info_cached(resp.text, url, page, cache)
     except requests.exceptions.RequestException as e:
         print(f"Lỗi khi truy cập {url}: {str(e)}")
         return []
 
-def upload_to_gsheets(df, sheet_url, worksheet_name="Sheet1"):
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    try:
-        worksheet = sh.worksheet(worksheet_name)
-        worksheet.clear()
-    except:
-        worksheet = sh.add_worksheet(title=worksheet_name, rows="300", cols="7")
+def parse_barebone_info_cached(html, url, page, cache):
+    # Trang trả 304 thì dùng lại kết quả parse của lần chạy trước
+    parsed = load_records(VtmkProduct, cache.load_parsed(url))
+    if parsed is not None:
+        return [item._replace(page=page) for item in parsed]
+    results = parse_barebone_info(html, url, page)
+    cache.store_parsed(url, results)
+    return results
+
+@timed("parse.vtmk_product")
+def parse_barebone_info(html, url, page):
+    soup = parse_product_page(html)
+    get_post_id_index().add(url, post_id_from_html(html))
+    # Lấy tiêu đề post
+    post_title = ""
+    h2 = soup.find('h2', class_='product-name')
+    if h2:
+        post_title = h2.text.strip()
+    # Lấy bảng thông tin
+    table = soup.find('table', class_=['notcauhinh', 'cauhinh'])
+    results = []
+    if table:
+        rows = table.find_all('tr')
+        for row in rows[1:]:  # bỏ header
+            tds = row.find_all('td')
+            if len(tds) > 1:
+                name = tds[0].text.strip()
+                # Xóa thông tin trong dấu ngoặc đơn
+                name = re.sub(r'\([^)]*\)', '', name).strip()
+                # Thêm "[Đang Ẩn]" nếu tr có thuộc tính hidden
+                if row.has_attr('hidden'):
+                    name = f"{name} [Đang Ẩn]"
+                # Chỉ lấy dòng có chữ 'barebone' (không phân biệt hoa thường)
+                if 'barebone' not in name.lower():
+                    continue
+                price_text = tds[1].text
+                strong = tds[1].find('strong')
+                if strong:
+                    price_text = strong.text
+                price = price_text.strip().replace('.', '').replace(',', '').replace('VND', '').replace('đ', '')
+                try:
+                    price = int(price)
+                except:
+                    price = None
+                print(f"Tên: {name} | Giá: {price} | Link: {url} | Trang: {page}")
+                results.append(VtmkProduct(post_title, name, price, url, page))
+    else:
+        print(f"Không tìm thấy bảng thông tin tại {url}")
+    # Chỉ giữ các record, cây DOM của trang được huỷ ngay
+    release(soup)
+    return results
+
+def get_all_barebone_info_sequential(all_links):
+    for idx, (link, page) in enumerate(all_links, 1):
+        print(f"({idx}/{len(all_links)}) Đang lấy: {link} (Trang {page})")
+        yield from get_barebone_info(link, page)
+
+def get_all_barebone_info_async(all_links, per_host=None):
+    # aiohttp chỉ cần khi tải song song
+    from fetch_async import iter_pages
+    # Tải song song các trang sản phẩm, nhận từng trang theo đúng thứ tự all_links: parse xong trang nào
+    # thì bỏ HTML của trang đó, chỉ vài trang đang tải được giữ trong bộ nhớ
+    cache = get_cache()
+    pages = iter_pages([link for link, _ in all_links], per_host=per_host, cache=cache)
+    for (link, page), html in zip(all_links, pages):
+        if html is None:
+            continue
+        yield from parse_barebone_info_cached(html, link, page, cache)
+    print(f"Có {len(cache.not_modified)} trang không đổi (304), dùng lại dữ liệu cache")
+
+@timed("vtmk.product_pages")
+def get_all_barebone_info(all_links):
+    # VTMK_FETCH_MODE=sequential để chạy lại kiểu cũ (từng link một)
+    mode = os.environ.get("VTMK_FETCH_MODE", "async")
+    start = time.perf_counter()
+    if mode == "sequential":
+        rows = get_all_barebone_info_sequential(all_links)
+    else:
+        rows = get_all_barebone_info_async(all_links)
+    all_products = ColumnBuilder(VtmkProduct, VTMK_COLUMNS).extend(rows)
+    print(f"Lấy thông tin {len(all_links)} link ({mode}) mất {time.perf_counter() - start:.2f}s")
+    return all_products
+
+def upload_to_gsheets(df, sheet_url, worksheet_name="Sheet1", merge_link_col=None, merge_post_col=None):
+    from gspread_formatting import CellFormat, TextFormat, Color, Padding
+    # Gom ghi dữ liệu + định dạng + độ rộng cột + freeze vào một batchUpdate
+    writer = SheetWriter.open(worksheet_name, rows=300, cols=7, sheet_url=sheet_url)
     # Thay thế NaN bằng None hoặc chuỗi rỗng
     df = df.fillna("")  # Hoặc df = df.fillna(None)
-    # Ghi header + data
-    worksheet.update([df.columns.values.tolist()] + df.values.tolist())
-    print(f"Đã upload dữ liệu lên Google Sheets: {worksheet_name}")
+    # Ghi header + data (chỉ gửi các ô đổi so với lần ghi trước nếu sheet giữ nguyên kích thước)
+    writer.write_grid([df.columns.values.tolist()] + df.values.tolist())
+    if merge_link_col:
+        merge_link_cells(df, writer, link_col=merge_link_col)
+    if merge_post_col:
+        merge_post_title_cells(df, writer, post_col=merge_post_col)
 
-    # Sau khi đã upload dữ liệu lên sheet và có biến worksheet
     header_format = CellFormat(
         backgroundColor=Color(0.2, 0.6, 0.86),  # Xanh dương nhạt, đổi theo ý bạn
         textFormat=TextFormat(bold=True, fontFamily='Arial', fontSize=11, foregroundColor=Color(1,1,1)),  # Chữ trắng, in đậm
         padding=Padding(left=5, top=5, right=5, bottom=5)
     )
-    format_cell_range(worksheet, 'A1:G1', header_format)
+    writer.format('A1:G1', header_format)
 
     number_format = CellFormat(
         numberFormat={'type': 'NUMBER', 'pattern': '#,##0'},
         horizontalAlignment='RIGHT'
     )
 
-    format_cell_range(worksheet, 'C1:E1000', number_format)
+    writer.format('C1:E1000', number_format)
 
     padding_format = CellFormat(
         padding=Padding(left=5, top=5, right=5, bottom=5)
     )
-    format_cell_range(worksheet, 'A2:F1000', padding_format)
+    writer.format('A2:F1000', padding_format)
 
-    set_column_width(worksheet, 'A', 300)
-    set_column_width(worksheet, 'B', 400)
-    set_column_width(worksheet, 'C', 111)
-    set_column_width(worksheet, 'D', 111)
-    set_column_width(worksheet, 'E', 91)
-    set_column_width(worksheet, 'F', 200)
-    set_column_width(worksheet, 'G', 200)
+    writer.set_column_width('A', 300)
+    writer.set_column_width('B', 400)
+    writer.set_column_width('C', 111)
+    writer.set_column_width('D', 111)
+    writer.set_column_width('E', 91)
+    writer.set_column_width('F', 200)
+    writer.set_column_width('G', 200)
 
     left_middle_format = CellFormat(
         horizontalAlignment='LEFT',
         verticalAlignment='MIDDLE'
     )
-    format_cell_range(worksheet, 'A1:A1000', left_middle_format)
+    writer.format('A1:A1000', left_middle_format)
 
     left_format = CellFormat(
         horizontalAlignment='LEFT',
     )
-    format_cell_range(worksheet, 'B1:B1000', left_format)
-    format_cell_range(worksheet, 'F1:G1000', left_format)
+    writer.format('B1:B1000', left_format)
+    writer.format('F1:G1000', left_format)
 
     middle_format = CellFormat(
         verticalAlignment='MIDDLE'
     )
-    format_cell_range(worksheet, 'A1:G1000', middle_format)
+    writer.format('A1:G1000', middle_format)
 
-    worksheet.freeze(rows=1)
-    # worksheet.freeze(rows=1, cols=1)
+    writer.freeze(rows=1)
+    # writer.freeze(rows=1, cols=1)
+    writer.execute()
+    print(f"Đã upload dữ liệu lên Google Sheets: {worksheet_name}")
 
-def merge_link_cells(sheet_url, worksheet_name="Sheet1", link_col=3):
+def merge_link_cells(df, writer, link_col=3):
     # link_col: cột Link, mặc định là cột thứ 3 (A=1, B=2, C=3, ...)
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    worksheet = sh.worksheet(worksheet_name)
-    data = worksheet.get_all_values()
-    last_link = None
-    start_row = None
-    for i, row in enumerate(data[1:], start=2):  # Bỏ header, bắt đầu từ dòng 2
-        link = row[link_col-1]
-        if link == last_link:
-            # Đang trong chuỗi giống nhau
-            continue
-        else:
-            # Nếu có chuỗi trước đó dài hơn 1, thì merge
-            if start_row and i-1 > start_row:
-                worksheet.merge_cells(
-                    start_row, link_col, i-1, link_col
-                )
-            last_link = link
-            start_row = i
-    # Merge chuỗi cuối cùng nếu cần
-    if start_row and len(data) > start_row:
-        worksheet.merge_cells(
-            start_row, link_col, len(data), link_col
-        )
-    print("Đã merge các ô link giống nhau.")
-
-def merge_post_title_cells(sheet_url, worksheet_name="Sheet1", post_col=1):
+    # Tính vùng merge từ DataFrame trước khi upload, gửi chung batchUpdate với dữ liệu
+    values = df.iloc[:, link_col-1].fillna("").tolist()
+    count = writer.merge_column_runs(values, link_col)
+    print(f"Sẽ merge {count} nhóm ô link giống nhau.")
+
+def merge_post_title_cells(df, writer, post_col=1):
     # post_col: cột Tên Post, mặc định là cột đầu tiên (A=1)
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    worksheet = sh.worksheet(worksheet_name)
-    data = worksheet.get_all_values()
-    last_post = None
-    start_row = None
-    for i, row in enumerate(data[1:], start=2):  # Bỏ header, bắt đầu từ dòng 2
-        post = row[post_col-1]
-        if post == last_post:
-            continue
-        else:
-            if start_row and (i-1 - start_row + 1) >= 2:
-                worksheet.merge_cells(
-                    start_row, post_col, i-1, post_col
-                )
-            last_post = post
-            start_row = i
-    # Merge chuỗi cuối cùng nếu cần
-    if start_row and (len(data) - start_row + 1) >= 2:
-        worksheet.merge_cells(
-            start_row, post_col, len(data), post_col
-        )
-    print("Đã merge các ô Tên Post giống nhau.")
+    values = df.iloc[:, post_col-1].fillna("").tolist()
+    count = writer.merge_column_runs(values, post_col)
+    print(f"Sẽ merge {count} nhóm ô Tên Post giống nhau.")
 
 def has_factor(part):
     # Kiểm tra part có chứa 1 trong các factor không
     return bool(re.search(r'\b(sff|mt|dt|mini|tiny)\b', part, re.IGNORECASE))
 
 def get_all_5giay_prices(sheet_url, sheet_date):
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-    client = gspread.authorize(creds)
-    sh = client.open_by_url(sheet_url)
-    worksheet = sh.worksheet(sheet_date)
-    data = worksheet.get_all_records()
-    
+    worksheet = sheets_session.get_worksheet(sheet_date, sheet_url)
+    data = sheets_session.call_api("get_all_records", worksheet.get_all_records)
+    return build_5giay_price_dict(data)
+
+def build_5giay_price_dict(data):
+    # data: các dòng 5giay, dict theo tên cột (đọc từ sheet) hoặc FiveGiayProduct (trực tiếp từ crawl_5giay)
     # Tạo dictionary với key là tên SP đã sửa và value là giá bán VC
     price_dict = {}
     for row in data:
-        name_key = row.get("Tên SP đã sửa")
+        if isinstance(row, dict):
+            name_key, price = row.get("Tên SP đã sửa"), row.get("Giá bán VC")
+        else:
+            name_key, price = row.name, row.price_vc
         if not name_key:
             continue
         name_key = name_key.lower().strip()
-        price = row.get("Giá bán VC")
         price_dict[name_key] = price
     
     return price_dict
 
-def get_price_from_5giay(name, price_dict):
-    name = name.lower().strip()
-    # So khớp trực tiếp với tên SP đã sửa
-    if name in price_dict:
-        return price_dict[name]
-    return "-"  # Trả về "-" nếu không tìm thấy tên giống nhau
+def get_price_from_5giay(name, price_index):
+    # Khớp trực tiếp với tên SP đã sửa, sau đó theo khoá chuẩn (hãng/model/đời/form factor)
+    return price_index.lookup(name)  # Trả về "-" nếu không tìm thấy
 
-def add_5giay_price_and_diff(df):
+def add_5giay_price_and_diff(df, all_5giay_prices=None):
+    import pandas as pd
     # Đổi tên các cột trước
     df = df.rename(columns={
         "Tên sản phẩm": "Tên SP VTMK",
         "Giá bán (VNĐ)": "Giá VTMK"
     })
 
-    prices_5giay = []
-    diffs = []
-    all_5giay_prices = get_all_5giay_prices(SHEET_5GIAY_URL, today_str)
+    if all_5giay_prices is None:
+        all_5giay_prices = get_all_5giay_prices(SHEET_5GIAY_URL, today_str)
     
     # In ra số lượng sản phẩm tìm thấy giá
     found_prices = sum(1 for price in all_5giay_prices.values() if price is not None)
     print(f"Tìm thấy giá cho {found_prices}/{len(all_5giay_prices)} sản phẩm")
     
-    for idx, row in df.iterrows():
-        product_name = row["Tên SP VTMK"].lower().strip()
-        price_5giay = get_price_from_5giay(product_name, all_5giay_prices)
-        prices_5giay.append(price_5giay)
-        
-        # Tính chênh lệch chỉ khi có giá ở cả 2 bên
-        if price_5giay != "-" and row["Giá VTMK"] is not None:
-            try:
-                diff = row["Giá VTMK"] - int(price_5giay)
-                # Nếu chênh lệch = 0 thì gán "-"
-                if diff == 0:
-                    diff = "-"
-            except:
-                diff = ""
-        else:
-            diff = ""
-        diffs.append(diff)
+    # Bảng giá 5giay theo từng tên (không trùng) rồi ghép vào DataFrame, thay cho iterrows
+    price_index = PriceIndex(all_5giay_prices)
+    name_keys = df["Tên SP VTMK"].str.lower().str.strip()
+    price_table = pd.DataFrame({"name_key": name_keys.unique()})
+    price_table["Giá 5giay"] = [get_price_from_5giay(name, price_index) for name in price_table["name_key"]]
+    price_table["Giá 5giay (số)"] = pd.array([to_int_or_na(price) for price in price_table["Giá 5giay"]], dtype="Int64")
+    matched = pd.DataFrame({"name_key": name_keys}).merge(price_table, on="name_key", how="left")
+    prices_5giay = matched["Giá 5giay"].to_numpy()
+    print(price_index.summary())
+    
+    # Tính chênh lệch chỉ khi có giá ở cả 2 bên; chênh lệch = 0 thì gán "-"
+    diffs = compute_price_diff(df["Giá VTMK"], matched["Giá 5giay (số)"])
     
     # Xóa cột Trang
     df = df.drop(columns=["Trang"])
@@ -308,7 +291,7 @@ def add_5giay_price_and_diff(df):
     df.insert(price_col_idx + 2, "Chênh lệch", diffs)
     
     # Thêm link và các cột khác
-    df["Link"] = df.apply(lambda row: make_text_fragment_link(row["Link"], row["Tên SP VTMK"]), axis=1)
+    df["Link"] = make_text_fragment_links(df["Link"], df["Tên SP VTMK"])
     
     cols = df.columns.tolist()
     cols = ['Tên Post'] + [col for col in cols if col != 'Tên Post']
@@ -333,60 +316,26 @@ def make_text_fragment_link(base_url, product_name):
     encoded_text = urllib.parse.quote(product_name)
     return f"{base_url}#:~:text={encoded_text}"
 
-def add_arrow_to_price(row):
-    diff = row["Chênh lệch"]
-    price = row["Giá VTMK"]
-    if diff == "" or price == "":
-        return price
-    try:
-        diff_val = int(diff)
-        if diff_val == 0:
-            return f"{price:,}"
-        elif diff_val < 0:
-            arrow = "🔺"  # Mũi tên lên
-        else:
-            arrow = "🔻"  # Mũi tên xuống
-        return f"{arrow} {price:,}"
-    except:
-        return price
-
 def clear_duplicate_post_title(df):
     # Nếu "Tên Post" giống dòng trước thì để trống
     df = df.copy()
     df['Tên Post'] = df['Tên Post'].where(df['Tên Post'].ne(df['Tên Post'].shift()))
     return df
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def get_post_id_from_shortlink(product_url):
+    # Thử lại khi lỗi tạm thời đã nằm trong http_client.get
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-        resp = requests.get(product_url, headers=headers, timeout=5)  # Giảm timeout xuống 5s
+        resp = http_client.get(product_url, timeout=5)  # Giảm timeout xuống 5s
         if resp.status_code != 200:
             return ""
-        soup = BeautifulSoup(resp.text, "html.parser")
-        shortlink_tag = soup.find("link", rel="shortlink")
-        if shortlink_tag and "href" in shortlink_tag.attrs:
-            match = re.search(r"p=(\d+)", shortlink_tag["href"])
-            if match:
-                return match.group(1)
-        return ""
+        soup = parse_shortlink_page(resp.text)
+        post_id = post_id_from_soup(soup)
+        release(soup)
+        return post_id
     except Exception as e:
         print(f"Lỗi khi lấy post ID từ {product_url}: {str(e)}")
         return ""
 
-def add_post_id_column(df):
-    # Giả sử cột "Link" chứa link sản phẩm
-    ids = []
-    for url in df["Link"]:
-        post_id = get_post_id_from_shortlink(url)
-        ids.append(post_id)
-    # Thêm cột "ID" sau cột "Chênh lệch"
-    insert_idx = df.columns.get_loc("Chênh lệch") + 1
-    df.insert(insert_idx, "ID", ids)
-    return df
-
 def add_edit_price_column(df):
     # Lấy ID từ cột "ID" và tạo link sửa (KHÔNG thêm text fragment)
     edit_links = []
@@ -403,25 +352,47 @@ def add_edit_price_column(df):
     df = df.drop(columns=["ID"])
     return df
 
-if __name__ == "__main__":
+@timed("vtmk.crawl")
+def crawl():
     all_links = get_all_barebone_links()
     print(f"Tổng số link sản phẩm: {len(all_links)}")
-    all_products = []
-    for idx, (link, page) in enumerate(all_links, 1):
-        print(f"({idx}/{len(all_links)}) Đang lấy: {link} (Trang {page})")
-        infos = get_barebone_info(link, page)
-        all_products.extend(infos)
-        time.sleep(1)
-    # Chuyển sang DataFrame
-    df = pd.DataFrame(all_products)
-    # Upload lên Google Sheets
-    df = add_5giay_price_and_diff(df)
-    df["Giá VTMK"] = df.apply(add_arrow_to_price, axis=1)
+    all_products = get_all_barebone_info(all_links)
+    get_metrics().incr("rows.vtmk", len(all_products))
+    return all_products
+
+@timed("vtmk.compare")
+def compare(all_products, price_dict=None):
+    import pandas as pd
+    # Dựng DataFrame một lần từ các cột đã gom khi crawl
+    df = all_products.to_frame()
+    df = add_5giay_price_and_diff(df, price_dict)
+    df["Giá VTMK"] = add_arrow_to_price(df, "Giá VTMK")
     df = clear_duplicate_post_title(df)
     df = df.loc[df['Tên Post'].ne(df['Tên Post'].shift())].reset_index(drop=True)
     total = df['Tên Post'].replace('', pd.NA).dropna().shape[0]
     df = df.rename(columns={"Tên Post": f"Tên Post [{total}]"})
     # Thêm post ID và link sửa
-    df = add_post_id_column(df)
+    df = add_post_id_column(df, get_post_id_from_shortlink, "vtmk.post_ids")
     df = add_edit_price_column(df)
+    return df
+
+@timed("vtmk.upload")
+def upload(df):
     upload_to_gsheets(df, SHEET_URL, worksheet_name=compare_sheet_name)
+
+def record(all_products):
+    # Lưu giá vào lịch sử giá cục bộ
+    record_prices("vtmk", ((p.name, p.price) for p in all_products))
+
+def run(price_dict=None):
+    # price_dict: bảng giá 5giay trong bộ nhớ (từ build_5giay_price_dict); None thì đọc từ sheet
+    all_products = crawl()
+    record(all_products)
+    df = compare(all_products, price_dict)
+    # Upload lên Google Sheets
+    upload(df)
+    return df
+
+if __name__ == "__main__":
+    run()
+    get_metrics().finish("vtmk")
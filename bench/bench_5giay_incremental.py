@@ -0,0 +1,136 @@
+# Parse thread 5giay theo bài viết: lần chạy sau chỉ parse bài mới/đã sửa, kết quả phải giống parse lại từ đầu
+# Chạy: python bench/bench_5giay_incremental.py --pages 100 --edited 5 --new-posts 3
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["HTTP_CACHE_DIR"] = tempfile.mkdtemp()
+os.environ["BAREBONE_STATE_DIR"] = tempfile.mkdtemp()
+os.environ["HTTP_RATE_PER_HOST"] = "0"
+
+import barebone5giay
+from metrics import get_metrics
+from fixtures import fivegiay_thread_html, fivegiay_thread_lines
+from stub_server import StubServer
+from thread_posts import THREAD_POSTS_KEEP_DAYS, ThreadPostCache
+
+THREAD_PATH = "/threads/may-bo-gia-re.34567/"
+PER_POST = 10
+
+
+class Thread:
+    """Thread giả lập: mỗi trang là danh sách bài (post_id, các dòng), có thể sửa bài và thêm bài mới"""
+
+    def __init__(self, pages, thread_url):
+        self.thread_url = thread_url
+        lines = fivegiay_thread_lines()
+        self.pages = []
+        for page in range(pages):
+            shift = (page * 7) % len(lines)
+            page_lines = lines[shift:] + lines[:shift]
+            self.pages.append([
+                (1000 + page * 100 + i // PER_POST, page_lines[i:i + PER_POST])
+                for i in range(0, len(page_lines), PER_POST)
+            ])
+        self.edit_times = {}
+
+    def edit(self, rng, count, now):
+        posts = [(p, i) for p, page in enumerate(self.pages) for i in range(len(page))]
+        for p, i in rng.sample(posts, count):
+            post_id, lines = self.pages[p][i]
+            # Đổi giá của một dòng: "... 1.500k" -> "... 1.600k"
+            lines = [line.replace("00k", "90k", 1) for line in lines]
+            self.pages[p][i] = (post_id, lines)
+            self.edit_times[post_id] = now
+
+    def add_posts(self, count):
+        last = self.pages[-1]
+        for n in range(count):
+            last.append((last[-1][0] + 1, self.pages[n % len(self.pages)][0][1]))
+
+    def routes(self):
+        routes = {}
+        for page, posts in enumerate(self.pages, start=1):
+            html = fivegiay_thread_html(posts, page, len(self.pages), self.thread_url, self.edit_times)
+            routes[THREAD_PATH if page == 1 else f"{THREAD_PATH}page-{page}"] = (200, {}, html)
+        return routes
+
+
+def conditional(routes):
+    # Handler trả ETag và 304 khi trang không đổi như server thật
+    def handler(path, headers):
+        route = routes.get(path.split('?')[0])
+        if route is None:
+            return None
+        status, _, body = route
+        etag = f'"{hash(body) & 0xffffffff:x}"'
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return status, {"ETag": etag}, body
+    return handler
+
+
+def parse_seconds():
+    return get_metrics().timers.get("parse.5giay_thread", {}).get("total", 0.0)
+
+
+def crawl(post_cache):
+    # Trả về (sản phẩm, thời gian cả lượt, thời gian parse, số bài phải parse)
+    barebone5giay.normalize_cache_clear()
+    start = time.perf_counter()
+    parse_before = parse_seconds()
+    parsed_before = post_cache.parsed
+    with contextlib.redirect_stdout(io.StringIO()):
+        products = list(barebone5giay.crawl_5giay(post_cache=post_cache))
+    return (products, time.perf_counter() - start, parse_seconds() - parse_before,
+            post_cache.parsed - parsed_before)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--edited", type=int, default=5, help="số bài bị sửa giữa hai lần chạy")
+    parser.add_argument("--new-posts", type=int, default=3, help="số bài mới giữa hai lần chạy")
+    args = parser.parse_args()
+
+    state_path = os.path.join(tempfile.mkdtemp(), "posts.json")
+    with StubServer() as stub:
+        barebone5giay.THREAD_URL = stub.base_url + THREAD_PATH
+        thread = Thread(args.pages, barebone5giay.THREAD_URL)
+        stub.routes.update(thread.routes())
+        _, t_first, p_first, parsed_first = crawl(ThreadPostCache(state_path))
+
+        thread.edit(random.Random(1), args.edited, int(time.time()))
+        thread.add_posts(args.new_posts)
+        stub.routes.update(thread.routes())
+        incremental, t_next, p_next, parsed_next = crawl(ThreadPostCache(state_path))
+        full, t_full, p_full, _ = crawl(ThreadPostCache(os.path.join(tempfile.mkdtemp(), "posts.json")))
+
+        # Trang trả 304 không được parse lại: bài trên đó vẫn phải được giữ sau thời hạn lưu
+        stub.handler = conditional(stub.routes)
+        post_cache = ThreadPostCache(os.path.join(tempfile.mkdtemp(), "posts.json"))
+        crawl(post_cache)
+        posts_before = len(post_cache.posts)
+        for entry in post_cache.posts.values():
+            entry["seen_at"] -= (THREAD_POSTS_KEEP_DAYS + 1) * 86400
+        crawl(post_cache)
+        kept = len(ThreadPostCache(post_cache.path).posts)
+
+    assert incremental == full, "Kết quả parse theo bài khác parse lại toàn bộ!"
+    assert kept == posts_before, f"Bài trên trang 304 bị xoá khỏi cache: còn {kept}/{posts_before}"
+    print(f"Thread {args.pages} trang, {len(full)} dòng sản phẩm")
+    # Thời gian parse cộng dồn của các luồng (các trang parse song song)
+    print(f"Lần đầu       : {t_first:6.2f}s, parse {p_first:6.2f}s ({parsed_first} bài)")
+    print(f"Lần sau       : {t_next:6.2f}s, parse {p_next:6.2f}s ({parsed_next} bài: {args.edited} sửa, {args.new_posts} mới)")
+    print(f"Parse lại hết : {t_full:6.2f}s, parse {p_full:6.2f}s -> parse theo bài nhanh hơn {p_full / p_next:.1f}x")
+    print(f"Sau {THREAD_POSTS_KEEP_DAYS} ngày, trang không đổi (304): giữ {kept}/{posts_before} bài trong cache")
+
+
+if __name__ == "__main__":
+    main()
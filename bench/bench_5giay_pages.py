@@ -0,0 +1,82 @@
+# Thread 5giay nhiều trang: tải tuần tự (1 luồng) và song song, kết quả sau remove_duplicates phải giống hệt,
+# bộ nhớ đỉnh không tăng theo số trang vì HTML mỗi trang được bỏ ngay sau khi parse
+# Chạy: python bench/bench_5giay_pages.py --pages 300 --latency 0.1 --workers 8
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["HTTP_CACHE_DIR"] = tempfile.mkdtemp()
+os.environ["BAREBONE_STATE_DIR"] = tempfile.mkdtemp()
+os.environ["HTTP_RATE_PER_HOST"] = "0"
+
+import barebone5giay
+from thread_posts import ThreadPostCache
+from fixtures import fivegiay_thread_lines, fivegiay_thread_page
+from stub_server import StubServer
+
+THREAD_PATH = "/threads/may-bo-gia-re.34567/"
+
+
+def build_routes(pages, thread_url):
+    lines = fivegiay_thread_lines()
+    routes = {}
+    for page in range(1, pages + 1):
+        # Mỗi trang lệch đi vài dòng: có dòng trùng giữa các trang để kiểm tra thứ tự loại trùng
+        shift = (page * 7) % len(lines)
+        page_lines = lines[shift:] + lines[:shift]
+        path = THREAD_PATH if page == 1 else f"{THREAD_PATH}page-{page}"
+        html = fivegiay_thread_page(page_lines, first_post_id=1000 + page * 100, page=page,
+                                    last_page=pages, thread_url=thread_url)
+        routes[path] = (200, {}, html)
+    return routes
+
+
+def crawl(workers):
+    barebone5giay.normalize_cache_clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Cache bài viết trống: mỗi lượt parse lại toàn bộ thread
+        post_cache = ThreadPostCache(os.path.join(tempfile.mkdtemp(), "posts.json"))
+        return list(barebone5giay.remove_duplicates(barebone5giay.crawl_5giay(max_workers=workers, post_cache=post_cache)))
+
+
+def measure(workers):
+    # Đo thời gian và bộ nhớ ở hai lượt riêng: tracemalloc làm chậm parse đáng kể
+    start = time.perf_counter()
+    products = crawl(workers)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    crawl(workers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return products, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.1, help="độ trễ giả lập mỗi request (giây)")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    stub = StubServer(latency=args.latency)
+    with stub:
+        barebone5giay.THREAD_URL = stub.base_url + THREAD_PATH
+        stub.routes.update(build_routes(args.pages, barebone5giay.THREAD_URL))
+        seq, t_seq, peak_seq = measure(1)
+        par, t_par, peak_par = measure(args.workers)
+
+    assert seq == par, "Kết quả song song khác tuần tự!"
+    print(f"Thread {args.pages} trang, độ trễ {args.latency}s, {len(seq)} sản phẩm sau loại trùng, {stub.request_count} request")
+    print(f"Tuần tự  : {t_seq:6.2f}s, bộ nhớ đỉnh {peak_seq / 1024 / 1024:.1f} MB")
+    print(f"Song song: {t_par:6.2f}s, bộ nhớ đỉnh {peak_par / 1024 / 1024:.1f} MB "
+          f"({args.workers} luồng) -> nhanh hơn {t_seq / t_par:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Đo bước so giá (add_5giay_price_and_diff + mũi tên + link) trên DataFrame lớn
+# và kiểm tra dữ liệu ghi lên sheet giống hệt bản của một commit khác
+# Chạy: python bench/bench_compare.py --rows 100000 [--against HEAD~1]
+import argparse
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+import barebone5giaymkcom as mkcom
+import barebone5giayvtmk as vtmk
+from sheet_writer import to_cell_data
+
+SCRIPTS = {"vtmk": (vtmk, "VTMK"), "mkcom": (mkcom, "MKCOM")}
+
+
+def synthetic_frame(rows, rng, with_missing):
+    # Tên lặp lại như dữ liệu thật (nhiều dòng cùng một barebone), một phần không có giá 5giay
+    names = [f"Barebone Dell Optiplex {3000 + i} SFF" for i in range(500)]
+    prices_5giay = {name.lower(): rng.randrange(10, 90) * 100_000 for name in names[:400]}
+    prices_5giay[names[0].lower()] = ""  # ô giá trống trong sheet 5giay
+    data = []
+    for i in range(rows):
+        name = rng.choice(names)
+        price = prices_5giay.get(name.lower()) if rng.random() < 0.2 else rng.randrange(10, 90) * 100_000
+        if price == "" or (with_missing and rng.random() < 0.05):
+            price = None
+        data.append({
+            "Tên Post": f"Post {i // 5}",
+            "Tên sản phẩm": name,
+            "Giá bán (VNĐ)": price,
+            "Link": f"https://example.com/p/{i // 5}",
+            "Trang": 1 + i // 1000,
+        })
+    return pd.DataFrame(data), prices_5giay
+
+
+def load_module_at(ref, filename):
+    source = subprocess.check_output(["git", "show", f"{ref}:{filename}"], cwd=ROOT, text=True)
+    module = types.ModuleType(f"{filename[:-3]}_{ref}")
+    module.__file__ = os.path.join(ROOT, filename)
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def compare_stage(module, col, df, prices_5giay):
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = module.add_5giay_price_and_diff(df, prices_5giay)
+        # Bản cũ: add_arrow_to_price(row) chạy qua df.apply(axis=1)
+        if module.add_arrow_to_price.__code__.co_varnames[0] == "row":
+            df[f"Giá {col}"] = df.apply(module.add_arrow_to_price, axis=1)
+        else:
+            df[f"Giá {col}"] = module.add_arrow_to_price(df, f"Giá {col}")
+    return df
+
+
+def sheet_cells(df):
+    # Giống upload_to_gsheets: fillna("") rồi chuyển từng ô thành CellData
+    df = df.fillna("")
+    return [[to_cell_data(v) for v in row] for row in [df.columns.values.tolist()] + df.values.tolist()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--against", help="git ref của bản cũ để so sánh thời gian và kết quả")
+    args = parser.parse_args()
+
+    for script, (module, col) in SCRIPTS.items():
+        for with_missing in (False, True):
+            df, prices_5giay = synthetic_frame(args.rows, random.Random(1), with_missing)
+            start = time.perf_counter()
+            result = compare_stage(module, col, df, prices_5giay)
+            elapsed = time.perf_counter() - start
+            label = f"{script}{' (có ô trống)' if with_missing else ''}"
+            line = f"{label:22} {args.rows} dòng: {elapsed:.2f}s"
+            if args.against:
+                old = load_module_at(args.against, module.__name__ + ".py")
+                start = time.perf_counter()
+                expected = compare_stage(old, col, df, prices_5giay)
+                old_elapsed = time.perf_counter() - start
+                assert sheet_cells(result) == sheet_cells(expected), f"{label}: dữ liệu sheet khác bản {args.against}!"
+                line += f", {args.against}: {old_elapsed:.2f}s -> nhanh hơn {old_elapsed / elapsed:.0f}x (sheet giống hệt)"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Benchmark toàn bộ pipeline (5giay -> VTMK -> MKCOM -> dọn sheet) không cần mạng, báo thời gian từng bước
+#   python bench/bench_e2e.py                       # dữ liệu giả lập từ fixtures
+#   python bench/bench_e2e.py --save /tmp/cassette  # như trên và lưu lại cassette
+#   python bench/bench_e2e.py --cassette /tmp/cassette --latency 0.05   # phát lại cassette đã ghi
+#   python bench/bench_e2e.py --latency 0.05 --dag     # các bước chạy song song theo phụ thuộc
+#   python bench/bench_e2e.py --record /tmp/cassette  # chạy thật (cần mạng + credentials), ghi cassette
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+WC_API_URL = "https://minhkhoicomputer.com/wp-json/wc/v3"
+FAKE_SHEET_URL = "https://docs.google.com/spreadsheets/d/replay/edit"
+VTMK_PRODUCT_URL = "https://vitinhminhkhoi.vn/product/sp-{}/"
+
+
+def isolate_state(replaying, rate=0.0):
+    # Trạng thái (cache HTTP, snapshot, post ID, lịch sử giá...) để trong thư mục tạm: mỗi lần chạy như lần đầu.
+    # Phải đặt biến môi trường trước khi import các module crawl
+    state_dir = tempfile.mkdtemp()
+    os.environ["BAREBONE_STATE_DIR"] = state_dir
+    os.environ["HTTP_CACHE_DIR"] = os.path.join(state_dir, "http")
+    if replaying:
+        os.environ["SHEET_URL"] = FAKE_SHEET_URL
+        os.environ["MK_WC_API_URL"] = WC_API_URL
+        # Phát lại thì đo tốc độ của code, mặc định bỏ giới hạn request/giây
+        os.environ["HTTP_RATE_PER_HOST"] = str(rate)
+
+
+def synthetic_source(vtmk_products, wc_products, per_category_page=20):
+    """Hàm fallback(url, headers) của ReplayServer trả trang dựng từ fixtures theo url gốc"""
+    import barebone5giay
+    import barebone5giayvtmk
+    from fixtures import (fivegiay_thread_lines, fivegiay_thread_page, vtmk_category_page,
+                          vtmk_product_page, wc_product)
+    from wc_stub import WooCommerceStub
+
+    base = barebone5giayvtmk.VTMK_CATEGORY_URL
+    links = [(VTMK_PRODUCT_URL.format(i), 1000 + i) for i in range(vtmk_products)]
+    chunks = [links[i:i + per_category_page] for i in range(0, len(links), per_category_page)] or [[]]
+    pages = {barebone5giay.THREAD_URL: fivegiay_thread_page(fivegiay_thread_lines())}
+    for n, chunk in enumerate(chunks, start=1):
+        url = base if n == 1 else f"{base}page/{n}/"
+        pages[url] = vtmk_category_page(chunk, n, len(chunks), base_url=base)
+    for i in range(vtmk_products):
+        pages[VTMK_PRODUCT_URL.format(i)] = vtmk_product_page(i)
+    woocommerce = WooCommerceStub([wc_product(i) for i in range(wc_products)])
+
+    def fallback(url, headers):
+        if url.startswith(WC_API_URL):
+            parts = urlsplit(url)
+            return woocommerce(f"{parts.path}?{parts.query}", headers)
+        if url in pages:
+            return 200, {"ETag": f'"{hash(pages[url]) & 0xffffffff:x}"'}, pages[url]
+        return None
+
+    return fallback
+
+
+class StageTimer:
+    def __init__(self, http_counter, sheets_calls):
+        self.http_counter = http_counter
+        self.sheets_calls = sheets_calls
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name, quiet=True):
+        http_before = self.http_counter["requests"]
+        sheets_before = len(self.sheets_calls())
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            yield
+        self.stages.append((
+            name,
+            time.perf_counter() - start,
+            self.http_counter["requests"] - http_before,
+            len(self.sheets_calls()) - sheets_before,
+        ))
+
+    def report(self):
+        total = sum(elapsed for _, elapsed, _, _ in self.stages)
+        print(f"{'Bước':22} {'Thời gian':>10} {'%':>6} {'HTTP':>6} {'Sheets':>7}")
+        for name, elapsed, http, sheets in self.stages:
+            print(f"{name:22} {elapsed:9.2f}s {elapsed / total:6.1%} {http:6} {sheets:7}")
+        print(f"{'Tổng':22} {total:9.2f}s")
+
+
+def run_pipeline(timer):
+    import barebone5giay
+    import barebone5giaymkcom
+    import barebone5giayvtmk
+    import runallbarebone
+
+    with timer.stage("5giay crawl"):
+        products_5giay = barebone5giay.crawl()
+    with timer.stage("5giay upload"):
+        barebone5giay.upload(products_5giay)
+    for name, module in (("VTMK", barebone5giayvtmk), ("MKCOM", barebone5giaymkcom)):
+        with timer.stage(f"{name} crawl"):
+            products = module.crawl()
+        with timer.stage(f"{name} compare"):
+            df = module.compare(products, module.build_5giay_price_dict(products_5giay))
+        with timer.stage(f"{name} upload"):
+            module.upload(df)
+    with timer.stage("Dọn sheet cũ"):
+        runallbarebone.SHEET_URL = os.environ.get("SHEET_URL")
+        runallbarebone.cleanup_old_sheets(keep_days=1, dry_run=False)
+
+
+def run_dag(timer):
+    # Cùng các bước nhưng qua bộ lập lịch của runallbarebone: crawl ba nguồn song song
+    import runallbarebone
+
+    runallbarebone.SHEET_URL = os.environ.get("SHEET_URL")
+    pipeline = runallbarebone.build_pipeline(keep_days=1, dry_run=False)
+    with timer.stage("Pipeline (DAG)"):
+        pipeline.run()
+    print(pipeline.report())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--cassette", help="phát lại cassette đã ghi")
+    mode.add_argument("--record", help="chạy thật với mạng + Google Sheets và ghi cassette vào thư mục này")
+    parser.add_argument("--save", help="(dữ liệu giả lập) lưu cassette của lần chạy vào thư mục này")
+    parser.add_argument("--latency", type=float, default=0.0, help="độ trễ giả lập mỗi request HTTP (giây)")
+    parser.add_argument("--rate", type=float, default=0.0, help="(phát lại) giới hạn request/giây mỗi host, 0: không giới hạn")
+    parser.add_argument("--dag", action="store_true", help="chạy các bước song song theo phụ thuộc thay vì tuần tự")
+    parser.add_argument("--vtmk-products", type=int, default=60)
+    parser.add_argument("--wc-products", type=int, default=300)
+    args = parser.parse_args()
+
+    isolate_state(replaying=not args.record, rate=args.rate)
+    import replay
+
+    if args.record:
+        cassette = replay.Cassette(args.record)
+        with replay.patch_http(cassette=cassette) as counter, replay.SheetsRecorder(cassette.sheets):
+            timer = StageTimer(counter, lambda: cassette.sheets)
+            run_pipeline(timer)
+        cassette.save()
+        timer.report()
+        print(f"Đã ghi {len(cassette.http)} response HTTP và {len(cassette.sheets)} lệnh Sheets vào {args.record}")
+        return
+
+    source = replay.Cassette(args.cassette) if args.cassette else None
+    fallback = None if args.cassette else synthetic_source(args.vtmk_products, args.wc_products)
+    recording = replay.Cassette(args.save) if args.save else None
+    client = replay.install_fake_sheets()
+    with replay.ReplayServer(source, fallback, latency=args.latency) as server:
+        with replay.patch_http(redirect_base=server.base_url, cassette=recording) as counter:
+            timer = StageTimer(counter, lambda: client.calls)
+            (run_dag if args.dag else run_pipeline)(timer)
+
+    timer.report()
+    from metrics import get_metrics
+    print(get_metrics().summary())
+    if server.misses:
+        print(f"Cảnh báo: {len(server.misses)} url không có trong cassette, vd. {server.misses[0]}")
+    if source is not None and source.sheets:
+        same = [c["method"] for c in source.sheets] == [c["method"] for c in client.calls]
+        print(f"Lệnh Sheets khi phát lại {'khớp' if same else 'KHÁC'} với lúc ghi "
+              f"({len(client.calls)} / {len(source.sheets)} lệnh)")
+    if recording is not None:
+        recording.sheets = client.calls
+        recording.save()
+        print(f"Đã lưu cassette ({len(recording.http)} response) vào {args.save}")
+    sheet = next(iter(client.spreadsheets.values()))
+    print("Sheet sau khi chạy:", ", ".join(f"{title} ({len(rows)} dòng)" for title, rows in sheet.snapshot().items()))
+
+
+if __name__ == "__main__":
+    main()
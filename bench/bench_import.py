@@ -0,0 +1,68 @@
+# Thời gian khởi động: đo bằng python -X importtime, mỗi script phải import xong trong ngân sách và không
+# kéo theo các thư viện nặng (pandas, gspread, bs4, ...) trước khi thật sự tới bước dùng chúng.
+# Chạy: python bench/bench_import.py [--budget-ms 300] [--repeat 5]
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Các script được đo. runallbarebone là thời gian chờ của một lần chạy bị bỏ qua hoặc --cleanup-only
+# trước khi làm việc thật: chỉ còn requests + tenacity cho preflight
+SCRIPTS = ["runallbarebone", "preflight", "barebone5giay", "barebone5giayvtmk", "barebone5giaymkcom"]
+DEFAULT_BUDGET_MS = 300
+# Chỉ được import trong bước dùng tới chúng
+HEAVY = ["pandas", "numpy", "bs4", "gspread", "oauth2client", "gspread_formatting", "aiohttp"]
+
+
+def import_time(modules, repeat):
+    """(thời gian import nhỏ nhất qua các lần chạy (ms), các module nặng đã bị import, 5 import con tốn nhất)"""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        # Dòng: "import time: self [us] | cumulative | tên module" (thụt lề theo độ sâu)
+        rows = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((name.rstrip(), int(cumulative)))
+        total = sum(cumulative for name, cumulative in rows if name.strip() in modules)
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+    loaded = sorted({name.strip().split(".")[0] for name, _ in rows} & set(HEAVY))
+    # Import con trực tiếp của module (thụt lề 2 khoảng trắng so với module)
+    children = sorted(((name.strip(), us) for name, us in rows if name.startswith("   ") and not name.startswith("    ")),
+                      key=lambda row: -row[1])
+    return total / 1000, loaded, children[:5]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS)))
+    parser.add_argument("--repeat", type=int, default=5, help="lấy lần nhanh nhất trong N lần (bỏ nhiễu của cache đĩa)")
+    args = parser.parse_args()
+
+    heavy_ms, _, _ = import_time(HEAVY, args.repeat)
+    print(f"Import trước toàn bộ thư viện nặng ({', '.join(HEAVY)}): {heavy_ms:.0f} ms")
+    failures = []
+    for script in SCRIPTS:
+        ms, loaded, children = import_time([script], args.repeat)
+        ok = ms <= args.budget_ms and not loaded
+        print(f"{script:22} {ms:7.0f} ms  {'OK' if ok else 'VƯỢT'}"
+              + (f"  (đã import: {', '.join(loaded)})" if loaded else ""))
+        print("    tốn nhất: " + ", ".join(f"{name} {us / 1000:.0f} ms" for name, us in children))
+        if not ok:
+            failures.append(script)
+    print(f"Ngân sách: {args.budget_ms:.0f} ms mỗi script, không import sẵn thư viện nặng")
+    if failures:
+        sys.exit(f"Vượt ngân sách khởi động: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
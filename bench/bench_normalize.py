@@ -0,0 +1,109 @@
+# Đo tốc độ chuỗi chuẩn hoá tên sản phẩm 5giay (regex biên dịch sẵn + lru_cache)
+# và kiểm tra kết quả crawl_5giay vẫn giống hệt file golden
+# Chạy: python bench/bench_normalize.py --repeat 200 [--against HEAD~1]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("HTTP_CACHE_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BAREBONE_STATE_DIR", tempfile.mkdtemp())
+
+import requests
+
+from fixtures import FIXTURE_DIR, fivegiay_thread_lines, fivegiay_thread_page
+from records import FIVEGIAY_COLUMNS
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode("utf-8")
+
+    def raise_for_status(self):
+        pass
+
+
+def check_golden(module, lines):
+    page = fivegiay_thread_page(lines)
+    # Vá Session.request: bắt được cả requests.get (bản cũ) lẫn Session dùng chung của http_client
+    original_request = requests.Session.request
+    requests.Session.request = lambda *a, **k: FakeResponse(page)
+    try:
+        # File golden lưu theo tên cột
+        products = [dict(zip(FIVEGIAY_COLUMNS, p)) for p in module.crawl_5giay()]
+    finally:
+        requests.Session.request = original_request
+    with open(os.path.join(FIXTURE_DIR, "5giay_golden.json"), encoding="utf-8") as f:
+        golden = json.load(f)
+    assert products == golden, "Kết quả crawl_5giay khác file golden!"
+    return len(products)
+
+
+def load_module_at(ref):
+    # Nạp barebone5giay.py của một commit khác để đo "trước khi tối ưu"
+    source = subprocess.check_output(["git", "show", f"{ref}:barebone5giay.py"], cwd=ROOT, text=True)
+    module = types.ModuleType(f"barebone5giay_{ref}")
+    module.__file__ = os.path.join(ROOT, "barebone5giay.py")
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def normalize_line(module, line):
+    # Chuỗi hàm chuẩn hoá crawl_5giay gọi cho mỗi dòng
+    name = module.clean_barebone_prefix(line)
+    module.get_form_factor(name, "")
+    module.extract_model(name)
+    module.extract_psu(line)
+    name_sua = module.chuan_hoa_ten_sp_da_sua(name)
+    name_sua = module.add_factor_to_model_pairs(name_sua)
+    module.chuan_hoa_cpu(name_sua)
+
+
+def lines_per_second(module, lines, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            normalize_line(module, line)
+    return repeat * len(lines) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200, help="số lần lặp lại toàn bộ các dòng")
+    parser.add_argument("--against", help="git ref của bản barebone5giay.py cũ để so sánh")
+    args = parser.parse_args()
+
+    import barebone5giay
+
+    lines = fivegiay_thread_lines()
+    count = check_golden(barebone5giay, lines)
+    print(f"Golden: {count} sản phẩm khớp")
+
+    barebone5giay.normalize_cache_clear()
+    cold = lines_per_second(barebone5giay, lines, 1)
+    warm = lines_per_second(barebone5giay, lines, args.repeat)
+    print(f"Cache lạnh : {cold:,.0f} dòng/s")
+    print(f"Cache nóng : {warm:,.0f} dòng/s ({args.repeat} lượt x {len(lines)} dòng)")
+
+    if args.against:
+        old = load_module_at(args.against)
+        before = lines_per_second(old, lines, args.repeat)
+        print(f"{args.against:11}: {before:,.0f} dòng/s -> nhanh hơn {warm / before:.1f}x")
+
+    print("Tỉ lệ trúng cache:")
+    for name, stats in barebone5giay.normalize_cache_stats().items():
+        print(f"  {name:28} {stats['hits']:>8} trúng / {stats['misses']:>5} trượt ({stats['hit_rate']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Đo thời gian parse mỗi trang trên fixture: cách cũ (cả trang bằng html.parser)
+# so với lớp trích xuất mới (SoupStrainer + lxml nếu có), kiểm tra kết quả giống nhau
+# Chạy: python bench/bench_parse.py --pages 50
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BAREBONE_STATE_DIR", tempfile.mkdtemp())
+
+import barebone5giaymkcom as mkcom
+import barebone5giayvtmk as vtmk
+import html_extract
+import post_ids
+from fixtures import fivegiay_thread_lines, fivegiay_thread_page, vtmk_product_page, wc_product
+
+
+def per_page_ms(func, pages):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        results = [func(page) for page in pages]
+        elapsed = time.perf_counter() - start
+    return results, elapsed * 1000 / len(pages)
+
+
+def old_config_tables(description):
+    return html_extract.parse_full(description).find_all('table', class_=html_extract.CONFIG_TABLE_CLASSES)
+
+
+def run_case(name, pages, old, new):
+    old_results, old_ms = per_page_ms(old, pages)
+    new_results, new_ms = per_page_ms(new, pages)
+    assert old_results == new_results, f"{name}: kết quả khác cách parse cũ!"
+    print(f"{name:20} cũ {old_ms:7.2f} ms/trang, mới {new_ms:7.2f} ms/trang -> nhanh hơn {old_ms / new_ms:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+    print(f"Parser: {html_extract.PARSER}")
+
+    vtmk_pages = [(vtmk_product_page(i), f"https://vitinhminhkhoi.vn/product/sp-{i}/") for i in range(args.pages)]
+
+    def vtmk_parse(parse):
+        def run(page):
+            html, url = page
+            vtmk.parse_product_page = parse
+            try:
+                return vtmk.parse_barebone_info(html, url, 1)
+            finally:
+                vtmk.parse_product_page = html_extract.parse_product_page
+        return run
+
+    run_case("VTMK sản phẩm", vtmk_pages, vtmk_parse(html_extract.parse_full),
+             vtmk_parse(html_extract.parse_product_page))
+    # Trang không có shortlink: post ID lấy từ class của <body>
+    no_shortlink = [(re.sub(r'<link rel="shortlink"[^>]*>', '', html), url) for html, url in vtmk_pages]
+    run_case("VTMK không shortlink", no_shortlink, vtmk_parse(html_extract.parse_full),
+             vtmk_parse(html_extract.parse_product_page))
+    run_case("Post ID", vtmk_pages + no_shortlink, lambda page: post_ids.post_id_from_soup(html_extract.parse_full(page[0])),
+             lambda page: post_ids.post_id_from_html(page[0]))
+
+    lines = fivegiay_thread_lines()
+    threads = [fivegiay_thread_page(lines * 3, first_post_id=1000 + i) for i in range(max(1, args.pages // 10))]
+    run_case("5giay thread", threads,
+             lambda html: [b.get_text(separator='\n') for b in html_extract.parse_full(html).find_all('blockquote')],
+             lambda html: [b.get_text(separator='\n') for b in html_extract.find_blockquotes(html)])
+
+    products = [wc_product(i) for i in range(args.pages)]
+
+    def mkcom_rows(find_tables):
+        def run(product):
+            mkcom.find_config_tables = find_tables
+            try:
+                return mkcom.product_to_rows(product, 1)
+            finally:
+                mkcom.find_config_tables = html_extract.find_config_tables
+        return run
+
+    run_case("MKCOM description", products, mkcom_rows(old_config_tables),
+             mkcom_rows(html_extract.find_config_tables))
+
+
+if __name__ == "__main__":
+    main()
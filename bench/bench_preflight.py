@@ -0,0 +1,81 @@
+# Kiểm tra bước preflight: chỉ các bước có nguồn thay đổi được chạy, và chi phí kiểm tra (số request, dung lượng)
+# so với một lần crawl đầy đủ. Chạy offline với dữ liệu giả lập: python bench/bench_preflight.py
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_e2e import isolate_state
+
+isolate_state(replaying=True)
+
+import barebone5giay
+import preflight
+import replay
+from fixtures import wc_product
+from metrics import get_metrics
+from wc_stub import WooCommerceStub
+
+
+class Sources:
+    """Ba nguồn giả lập có thể thay đổi giữa các lần kiểm tra"""
+
+    def __init__(self, products=300):
+        self.latest_post = 1000
+        self.lastmods = [f"2026-01-01T00:00:{i % 60:02d}+00:00" for i in range(60)]
+        self.woocommerce = WooCommerceStub([wc_product(i) for i in range(products)])
+
+    def __call__(self, url, headers):
+        if url == f"{barebone5giay.THREAD_URL}latest":
+            return 302, {"Location": f"{barebone5giay.THREAD_URL}page-3#post-{self.latest_post}"}, ""
+        if url == preflight.VTMK_SITEMAP_URL:
+            urls = "".join(f"<url><loc>https://vitinhminhkhoi.vn/product/sp-{i}/</loc><lastmod>{lastmod}</lastmod></url>"
+                           for i, lastmod in enumerate(self.lastmods))
+            return 200, {"Content-Type": "application/xml"}, f'<?xml version="1.0"?><urlset>{urls}</urlset>'
+        if url.startswith(os.environ["MK_WC_API_URL"]):
+            return self.woocommerce(url[url.index("/products"):], headers)
+        return None
+
+
+def check(label, expected, today="18-10-2026", failing=()):
+    # failing: các bước lỗi trong lần chạy này (không ghi dấu vân tay)
+    metrics_before = sum(entry["bytes"] for entry in get_metrics().report()["http"].values())
+    with contextlib.redirect_stdout(io.StringIO()):
+        fingerprints = preflight.collect_fingerprints()
+    reasons = preflight.plan_stages(fingerprints, preflight.load_state(), today=today)
+    preflight.forget_stages(list(reasons), today=today)
+    for source in set(reasons) - set(failing):
+        preflight.save_stage(source, fingerprints[source], today=today)
+    nbytes = sum(entry["bytes"] for entry in get_metrics().report()["http"].values()) - metrics_before
+    assert set(reasons) == set(expected), f"{label}: chạy {sorted(reasons)}, mong đợi {sorted(expected)}"
+    print(f"{label:34} -> chạy {', '.join(sorted(reasons)) or '(không bước nào)':20} ({nbytes / 1024:.1f} KB)")
+
+
+def main():
+    preflight.FINGERPRINTS_PATH = os.path.join(tempfile.mkdtemp(), "fingerprints.json")
+    sources = Sources()
+    with replay.ReplayServer(fallback=sources) as server, replay.patch_http(redirect_base=server.base_url) as counter:
+        check("Lần đầu (chưa có trạng thái)", preflight.STAGES)
+        check("Không có gì đổi", [])
+        sources.woocommerce.products[7]["date_modified_gmt"] = "2026-10-18T09:00:00"
+        check("Sửa 1 sản phẩm WooCommerce", ["mkcom"])
+        sources.lastmods[3] = "2026-10-18T09:30:00+00:00"
+        check("Sửa 1 sản phẩm VTMK", ["vtmk"])
+        sources.latest_post += 1
+        check("Bài mới trong thread 5giay", preflight.STAGES)
+        check("Không có gì đổi", [])
+        sources.latest_post += 1
+        check("Bài mới 5giay, bước VTMK lỗi", preflight.STAGES, failing=["vtmk"])
+        check("Chạy lại bước VTMK bị lỗi", ["vtmk"])
+        check("Không có gì đổi", [])
+        check("Sang ngày mới", preflight.STAGES, today="19-10-2026")
+    assert not server.misses, server.misses
+    print(f"Tổng cộng {counter['requests']} request cho 10 lần kiểm tra (3 request/lần)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Giả lập nhiều lần chạy ghi lịch sử giá: số dòng lưu tăng theo số lần đổi giá, không theo số lần chạy,
+# và các truy vấn thường dùng trả về trong vài ms
+# Chạy: python bench/bench_price_history.py --runs 365 --products 1000 --change-rate 0.02
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import price_history
+
+SOURCES = ["5giay", "vtmk", "mkcom"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=365, help="số lần chạy (mỗi ngày một lần)")
+    parser.add_argument("--products", type=int, default=1000, help="số sản phẩm mỗi nguồn")
+    parser.add_argument("--change-rate", type=float, default=0.02, help="tỉ lệ sản phẩm đổi giá mỗi lần chạy")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "price_history.sqlite")
+    rng = random.Random(1)
+    names = [f"Barebone Dell Optiplex {3000 + i} SFF" for i in range(args.products)]
+    prices = {(source, name): rng.randrange(10, 90) * 100_000 for source in SOURCES for name in names}
+    start_day = datetime(2026, 1, 1, 7, 0, 0)
+
+    record_time = 0.0
+    for run in range(args.runs):
+        run_at = start_day + timedelta(days=run)
+        for key in rng.sample(list(prices), int(len(prices) * args.change_rate)):
+            prices[key] += rng.choice([-1, 1]) * 100_000
+        for source in SOURCES:
+            items = [(name, prices[(source, name)]) for name in names]
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                price_history.record_prices(source, items, run_at=run_at, path=path)
+            record_time += time.perf_counter() - start
+
+    conn = price_history.connect(path)
+    intervals = conn.execute("SELECT COUNT(*) FROM price_intervals").fetchone()[0]
+    conn.close()
+    appended = args.runs * len(prices)
+    print(f"{args.runs} lần chạy x {len(prices)} dòng = {appended} dòng nếu ghi nguyên văn")
+    print(f"Lưu {intervals} khoảng giá ({intervals / appended:.1%}), file {os.path.getsize(path) / 1024:.0f} KB, "
+          f"ghi trung bình {record_time * 1000 / (args.runs * len(SOURCES)):.1f} ms/nguồn/lần chạy")
+
+    last_day = start_day + timedelta(days=args.runs - 1)
+    start = time.perf_counter()
+    history = price_history.price_history(names[42], days=30, now=last_day, path=path)
+    t_history = time.perf_counter() - start
+    start = time.perf_counter()
+    changed = price_history.changed_on(last_day, path=path)
+    t_changed = time.perf_counter() - start
+    print(f"Giá 30 ngày của 1 sản phẩm: {len(history)} khoảng, {t_history * 1000:.2f} ms")
+    print(f"Sản phẩm đổi giá trong ngày: {len(changed)} dòng, {t_changed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
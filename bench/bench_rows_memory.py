@@ -0,0 +1,112 @@
+# Bộ nhớ của đường đi dữ liệu WooCommerce API -> DataFrame của MKCOM (crawl() đồng bộ toàn bộ, API giả lập
+# theo kích thước catalog): bản cũ (tải hết các trang rồi mới dựng list dict) so với bản hiện tại (từng trang
+# thành record ngay khi tải xong + ColumnBuilder), và kiểm tra DataFrame của hai cách giống hệt nhau.
+# Bản cũ mặc định là commit ngay trước commit "[user-025]" (tìm theo tiêu đề nên không phụ thuộc hash)
+# Chạy: python bench/bench_rows_memory.py --products 1000 5000 15000 [--against <git ref>]
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import types
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("HTTP_CACHE_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BAREBONE_STATE_DIR", tempfile.mkdtemp())
+# Luôn đồng bộ toàn bộ: đường đi của lần chạy đầu / định kỳ, tải cả catalog
+os.environ["MK_WC_SYNC_MODE"] = "full"
+
+import pandas as pd
+
+import barebone5giaymkcom as mkcom
+import post_ids
+from fixtures import wc_product
+from wc_stub import WooCommerceStub
+
+RECORDS_COMMIT_GREP = r"^\[user-025\]"
+
+
+def records_base_ref():
+    """Commit cha của commit chuyển sang record + ColumnBuilder"""
+    commit = subprocess.check_output(["git", "log", "-1", "--format=%H", f"--grep={RECORDS_COMMIT_GREP}"],
+                                     cwd=ROOT, text=True).strip()
+    return f"{commit}~1" if commit else None
+
+
+def load_module_at(ref, filename):
+    source = subprocess.check_output(["git", "show", f"{ref}:{filename}"], cwd=ROOT, text=True)
+    module = types.ModuleType(f"{filename[:-3]}_{ref}")
+    module.__file__ = os.path.join(ROOT, filename)
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+class FakeResponse:
+    def __init__(self, headers, body):
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def fake_fetch_page(stub):
+    # Thay fetch_wc_page (request HTTP): mỗi trang là một body JSON mới như API thật trả về
+    def fetch(page, params):
+        _, headers, body = stub(f"/products?{urlencode(dict(params, page=page))}", {})
+        return FakeResponse(headers, body)
+    return fetch
+
+
+def crawl_rows(module, stub):
+    module.fetch_wc_page = fake_fetch_page(stub)
+    return module.crawl()
+
+
+def measure(crawl, to_frame):
+    """(bộ nhớ giữ giữa bước crawl và bước so sánh, đỉnh của cả crawl + dựng DataFrame, DataFrame)"""
+    post_ids._index = None  # mỗi lượt một index post ID mới, hai cách tốn như nhau
+    gc.collect()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = crawl()
+        held, _ = tracemalloc.get_traced_memory()
+        df = to_frame(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, peak, df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, nargs="+", default=[1000, 5000, 15000])
+    parser.add_argument("--against", default=None,
+                        help="git ref của barebone5giaymkcom.py dùng list dict (mặc định: commit trước khi đổi sang record)")
+    args = parser.parse_args()
+
+    against = args.against or records_base_ref()
+    if against is None:
+        parser.error("không tìm thấy commit chuyển sang record, hãy truyền --against")
+    old = load_module_at(against, "barebone5giaymkcom.py")
+    print(f"{'Sản phẩm':>9} {'Dòng':>7}  {'Giữ: cũ':>10} {'mới':>9}  {'Đỉnh: cũ':>10} {'mới':>9}  {'Đỉnh/dòng: cũ':>14} {'mới':>6}")
+    for products in args.products:
+        # Dữ liệu nguồn của API giả lập được tạo trước khi đo
+        stub = WooCommerceStub([wc_product(i) for i in range(products)])
+        held_old, peak_old, df_old = measure(lambda: crawl_rows(old, stub), pd.DataFrame)
+        held_new, peak_new, df_new = measure(lambda: crawl_rows(mkcom, stub), lambda rows: rows.to_frame())
+        pd.testing.assert_frame_equal(df_old, df_new)
+        rows = len(df_new)
+        print(f"{products:9} {rows:7}  {held_old / 2**20:8.1f}MB {held_new / 2**20:7.1f}MB  "
+              f"{peak_old / 2**20:8.1f}MB {peak_new / 2**20:7.1f}MB  "
+              f"{peak_old / rows:12.0f} B {peak_new / rows:4.0f} B")
+
+
+if __name__ == "__main__":
+    main()
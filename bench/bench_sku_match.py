@@ -0,0 +1,99 @@
+# Đo tốc độ khớp giá 5giay theo khoá chuẩn khi phía 5giay có hàng nghìn tên (lịch sử nhiều thread)
+# So sánh với cách quét toàn bộ các cặp và với khớp nguyên văn cũ
+# Chạy: python bench/bench_sku_match.py --entries 5000 --rows 2000
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sku_match import PriceIndex, _compatible, canonical_keys
+
+SERIES = [("Dell", "Optiplex", ""), ("HP", "Elitedesk", "G"), ("Lenovo", "ThinkCentre", "M")]
+FORMS = ["SFF", "MT", "Tiny", "DT"]
+# Cách viết dính đời máy vào model phải cho cùng khoá với cách viết tách
+GLUED_NAMES = [
+    ("Barebone HP Elitedesk 800G2 SFF", "Barebone HP 800 G2 SFF"),
+    ("Barebone Lenovo M720g1 Tiny", "Barebone Lenovo ThinkCentre M720 G1 Tiny"),
+    ("Barebone Lenovo M910qG2 Tiny", "Barebone Lenovo M910q G2 Tiny"),
+]
+
+
+def fivegiay_names(count, rng):
+    names = {}
+    while len(names) < count:
+        brand, series, prefix = rng.choice(SERIES)
+        number = rng.randrange(100, 9999)
+        form = rng.choice(FORMS)
+        if prefix == "G":
+            name = f"Barebone {brand} {series} {number}G{rng.randrange(1, 9)} {form}"
+        else:
+            name = f"Barebone {brand} {series} {prefix}{number} {form}"
+        # Key viết thường giống build_5giay_price_dict
+        names[name.lower()] = rng.randrange(5, 200) * 100_000
+    return names
+
+
+def shop_name(name, rng):
+    # Cách viết khác của shop: bỏ tên dòng máy, tách "800G2" thành "800 G2", đổi hoa thường
+    variant = name
+    for _, series, _ in SERIES:
+        if rng.random() < 0.5:
+            variant = variant.replace(f"{series.lower()} ", "")
+    if rng.random() < 0.5:
+        variant = variant.replace("g", " g")
+    return variant.title() if rng.random() < 0.5 else variant
+
+
+def all_pairs_lookup(name, entries):
+    # Cách ngây thơ: so khoá của dòng shop với khoá của mọi tên 5giay
+    for key in canonical_keys(name):
+        for other, price in entries:
+            if any(_compatible(key, candidate) for candidate in canonical_keys(other)):
+                return price
+    return "-"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=5000, help="số tên phía 5giay")
+    parser.add_argument("--rows", type=int, default=2000, help="số dòng phía shop")
+    args = parser.parse_args()
+
+    for glued, spaced in GLUED_NAMES:
+        assert canonical_keys(glued.lower()) == canonical_keys(spaced.lower()), f"{glued!r} khác khoá {spaced!r}"
+        assert PriceIndex({spaced.lower(): 1}).lookup(glued) == 1, f"{glued!r} không khớp giá {spaced!r}"
+
+    rng = random.Random(1)
+    price_dict = fivegiay_names(args.entries, rng)
+    rows = [shop_name(name, rng) for name in rng.sample(list(price_dict), min(args.rows, len(price_dict)))]
+
+    exact = sum(1 for name in rows if name.lower().strip() in price_dict)
+
+    start = time.perf_counter()
+    index = PriceIndex(price_dict)
+    t_build = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = [index.lookup(name) for name in rows]
+    t_lookup = time.perf_counter() - start
+
+    sample = rows[:200]
+    entries = list(price_dict.items())
+    start = time.perf_counter()
+    naive = [all_pairs_lookup(name, entries) for name in sample]
+    t_naive = (time.perf_counter() - start) * len(rows) / len(sample)
+
+    matched = sum(1 for price in indexed if price != "-")
+    print(f"5giay: {len(price_dict)} tên, shop: {len(rows)} dòng")
+    print(f"Khớp nguyên văn (cũ): {exact}/{len(rows)}")
+    print(f"Khớp theo khoá chuẩn: {matched}/{len(rows)} ({index.summary()})")
+    print(f"Chỉ mục: dựng {t_build * 1000:.1f}ms, tra {t_lookup * 1000:.1f}ms")
+    print(f"Quét mọi cặp (ước tính từ {len(sample)} dòng): {t_naive * 1000:.0f}ms "
+          f"-> chỉ mục nhanh hơn {t_naive / t_lookup:.0f}x")
+    assert all(a == "-" or a == b for a, b in zip(indexed, naive)), "Kết quả chỉ mục khác quét mọi cặp!"
+
+
+if __name__ == "__main__":
+    main()
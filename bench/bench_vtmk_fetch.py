@@ -0,0 +1,48 @@
+# So sánh thời gian lấy trang sản phẩm VTMK: tuần tự (kiểu cũ) và song song (asyncio)
+# Chạy: python bench/bench_vtmk_fetch.py --pages 60 --latency 0.2
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import barebone5giayvtmk as vtmk
+import http_client
+from fixtures import vtmk_product_page
+from stub_server import StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.2, help="độ trễ giả lập mỗi request (giây)")
+    parser.add_argument("--per-host", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0, help="giới hạn request/giây mỗi host (0: không giới hạn)")
+    args = parser.parse_args()
+    http_client.get_limiter().rate = args.rate
+
+    routes = {f"/product/sp-{i}/": (200, {}, vtmk_product_page(i)) for i in range(args.pages)}
+    with StubServer(routes, latency=args.latency) as stub:
+        links = [(f"{stub.base_url}/product/sp-{i}/", 1) for i in range(args.pages)]
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            seq = list(vtmk.get_all_barebone_info_sequential(links))
+        t_seq = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            par = list(vtmk.get_all_barebone_info_async(links, per_host=args.per_host))
+        t_par = time.perf_counter() - start
+
+    assert seq == par, "Kết quả song song khác tuần tự!"
+    print(f"Số trang: {args.pages}, độ trễ: {args.latency}s, giới hạn: {args.rate or 'không'} request/s/host")
+    print(f"Tuần tự : {t_seq:.2f}s ({len(seq)} dòng)")
+    print(f"Song song: {t_par:.2f}s ({len(par)} dòng, {args.per_host}/host) -> nhanh hơn {t_seq / t_par:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
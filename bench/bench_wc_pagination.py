@@ -0,0 +1,69 @@
+# So sánh vòng lặp phân trang tuần tự cũ của MKCOM với bản song song + _fields
+# Chạy: python bench/bench_wc_pagination.py --products 1200 --latency 0.3
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Độ trễ đã giả lập ở stub, bỏ giới hạn request/giây của http_client
+os.environ["HTTP_RATE_PER_HOST"] = "0"
+
+import barebone5giaymkcom as mkcom
+from fixtures import wc_product
+from stub_server import StubServer
+from wc_stub import WooCommerceStub
+
+
+def serial_loop(api_url, delay):
+    # Vòng lặp cũ: từng trang một, lấy toàn bộ trường, nghỉ giữa các trang
+    products = []
+    page = 1
+    while True:
+        params = {'per_page': 100, 'page': page, 'search': 'barebone'}
+        data = requests.get(f"{api_url}/products", params=params).json()
+        if not data:
+            break
+        products.extend((page, p) for p in data)
+        page += 1
+        time.sleep(delay)
+    return products
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1200)
+    parser.add_argument("--latency", type=float, default=0.3, help="độ trễ giả lập mỗi request (giây)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sleep", type=float, default=0.0, help="thời gian nghỉ giữa các trang của vòng lặp cũ (bản gốc là 1s)")
+    args = parser.parse_args()
+
+    stub_handler = WooCommerceStub([wc_product(i) for i in range(args.products)])
+    with StubServer(handler=stub_handler, latency=args.latency) as stub:
+        mkcom.WC_API_URL = stub.base_url
+
+        start = time.perf_counter()
+        serial = serial_loop(stub.base_url, args.sleep)
+        t_serial = time.perf_counter() - start
+        bytes_serial, stub_handler.bytes_sent = stub_handler.bytes_sent, 0
+
+        start = time.perf_counter()
+        parallel = list(mkcom.fetch_wc_products({'search': 'barebone'}, max_workers=args.workers))
+        t_parallel = time.perf_counter() - start
+        bytes_parallel = stub_handler.bytes_sent
+
+    assert [p["id"] for _, p in serial] == [p["id"] for _, p in parallel]
+    rows_serial = [r for page, p in serial for r in mkcom.product_to_rows(p, page)]
+    rows_parallel = [r for page, p in parallel for r in mkcom.product_to_rows(p, page)]
+    assert rows_serial == rows_parallel, "Số dòng barebone khác nhau giữa hai cách lấy!"
+
+    print(f"Sản phẩm: {args.products}, độ trễ: {args.latency}s")
+    print(f"Tuần tự  : {t_serial:.2f}s, {bytes_serial / 1024:.0f} KB")
+    print(f"Song song: {t_parallel:.2f}s, {bytes_parallel / 1024:.0f} KB "
+          f"({args.workers} luồng) -> nhanh hơn {t_serial / t_parallel:.1f}x, ít hơn {bytes_serial / bytes_parallel:.1f}x dữ liệu")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+
+# Sinh dữ liệu HTML giả lập cấu trúc các trang thật (dùng cho benchmark chạy offline)
+
+MODELS = [
+    ("Dell", "Optiplex 3020", "SFF"), ("Dell", "Optiplex 7050", "MT"), ("Dell", "Optiplex 7040", "MT"),
+    ("HP", "800 G2", "SFF"), ("HP", "600 G1", "DT"), ("HP", "Z240", "MT"),
+    ("Lenovo", "M720", "Tiny"), ("Lenovo", "P520", "WORK"), ("Dell", "Precision T3620", "MT"),
+]
+
+
+def vtmk_product_page(i, rows=4):
+    brand, model, form = MODELS[i % len(MODELS)]
+    table_rows = "".join(
+        f'<tr{" hidden" if r == rows - 1 else ""}><td>Barebone {brand} {model} {form} (bảo hành 12 tháng)</td>'
+        f'<td><strong>{(1500 + 37 * i + 100 * r):,}.000đ</strong></td></tr>'
+        for r in range(rows)
+    )
+    filler = "<p>Mô tả sản phẩm chi tiết.</p>" * 200
+    return (
+        f'<html><head><title>Barebone {model}</title>'
+        f'<link rel="shortlink" href="https://vitinhminhkhoi.vn/?p={1000 + i}" /></head>'
+        f'<body class="product-template-default single single-product postid-{1000 + i}">'
+        f'<div class="menu">{filler}</div>'
+        f'<h2 class="product-name">Máy bộ {brand} {model} {form} #{i}</h2>'
+        f'<table class="notcauhinh"><tr><th>Cấu hình</th><th>Giá</th></tr>{table_rows}</table>'
+        f'<div class="footer">{filler}</div></body></html>'
+    )
+
+
+def vtmk_category_page(links, page, last_page, base_url=""):
+    items = "".join(
+        f'<li class="product type-product post-{post_id} status-publish"><a href="{link}">SP</a></li>'
+        for link, post_id in links
+    )
+    next_btn = f'<a class="next page-numbers" href="{base_url}page/{page + 1}/">→</a>' if page < last_page else ""
+    return f'<html><body><ul class="products">{items}</ul>{next_btn}</body></html>'
+
+
+def wc_product(i):
+    brand, model, form = MODELS[i % len(MODELS)]
+    hidden_class = ' class="admin-only"'
+    rows = "".join(
+        f'<tr{hidden_class if r == 2 else ""}><td>Barebone {brand} {model} {form} (i{3 + r})</td>'
+        f'<td><strong>{(1500 + 37 * i + 100 * r):,}.000đ</strong></td></tr>'
+        for r in range(3)
+    )
+    # Các trường thừa mô phỏng kích thước response đầy đủ của WooCommerce
+    return {
+        "id": 5000 + i,
+        "name": f"Barebone {brand} {model} {form} #{i}",
+        "slug": f"barebone-{i}",
+        "permalink": f"https://minhkhoicomputer.com/product/barebone-{i}/",
+        "date_created_gmt": f"2025-01-01T00:00:{i % 60:02d}",
+        "date_modified_gmt": f"2026-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}",
+        "status": ["publish", "pending", "private", "draft"][i % 4],
+        "modified_by": "admin",
+        "description": f'<p>Cấu hình</p><table class="cauhinh"><tr><th>Tên</th><th>Giá</th></tr>{rows}</table>',
+        "short_description": "<p>Mô tả ngắn</p>" * 20,
+        "price": str(1500000 + i),
+        "regular_price": str(1600000 + i),
+        "images": [{"id": j, "src": f"https://minhkhoicomputer.com/wp-content/uploads/{i}-{j}.jpg", "alt": ""} for j in range(6)],
+        "meta_data": [{"id": j, "key": f"_meta_{j}", "value": "x" * 40} for j in range(30)],
+        "categories": [{"id": 1, "name": "Barebone", "slug": "barebone"}],
+        "attributes": [{"id": 1, "name": "CPU", "options": ["i3", "i5", "i7"]}],
+    }
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fivegiay_thread_lines():
+    with open(os.path.join(FIXTURE_DIR, "5giay_thread.txt"), encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def fivegiay_post(post_id, lines, edit_time=None):
+    # Mỗi bài viết XenForo là một <li id="post-N"> chứa blockquote.messageText,
+    # bài đã sửa có thêm dòng "Sửa lần cuối" với thời điểm sửa
+    body = "<br />\n".join(lines)
+    edit_date = ""
+    if edit_time is not None:
+        edit_date = (f'<div class="editDate">Sửa lần cuối: <abbr class="DateTime" data-time="{edit_time}">'
+                     f'vài phút trước</abbr></div>')
+    return (
+        f'<li id="post-{post_id}" class="message" data-author="vitinhbaonhu">'
+        f'<div class="messageContent"><article>'
+        f'<blockquote class="messageText SelectQuoteContainer ugc baseHtml">Liên hệ 0909xxxxxx<br />\n{body}</blockquote>'
+        f'</article></div>{edit_date}</li>'
+    )
+
+
+def fivegiay_thread_html(posts, page=1, last_page=1, thread_url="", edit_times=None):
+    """Trang thread từ danh sách bài (post_id, các dòng); edit_times: {post_id: unix time}"""
+    edit_times = edit_times or {}
+    items = "".join(fivegiay_post(post_id, lines, edit_times.get(post_id)) for post_id, lines in posts)
+    page_nav = ""
+    if last_page > 1:
+        links = "".join(f'<a href="{thread_url}page-{n}">{n}</a>' for n in range(2, last_page + 1))
+        page_nav = f'<div class="PageNav" data-page="{page}" data-range="2" data-last="{last_page}">{links}</div>'
+    return f'<html><body>{page_nav}<ol class="messageList" id="messageList">{items}</ol>{page_nav}</body></html>'
+
+
+def fivegiay_thread_page(lines, per_post=10, first_post_id=1000, page=1, last_page=1, thread_url=""):
+    posts = [(first_post_id + i // per_post, lines[i:i + per_post]) for i in range(0, len(lines), per_post)]
+    return fivegiay_thread_html(posts, page, last_page, thread_url)
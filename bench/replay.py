@@ -0,0 +1,295 @@
+# Ghi lại (record) và phát lại (replay) mọi HTTP response + lệnh Google Sheets của các bước crawl/upload
+# để chạy toàn bộ pipeline không cần mạng. Cassette là một thư mục:
+#   http.json   : {url: {status, headers, body}} (body lưu file riêng trong bodies/)
+#   sheets.json : danh sách lệnh Sheets đã gọi (tóm tắt)
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit, urlunsplit
+
+import aiohttp
+import gspread
+import requests
+
+from stub_server import StubServer
+
+# Tham số bí mật không được ghi vào cassette (và không dùng làm khoá tra cứu)
+SECRET_PARAMS = {"consumer_key", "consumer_secret"}
+# Sheets/Drive/OAuth không đi qua stub: record bằng SheetsRecorder, replay bằng FakeClient
+GOOGLE_HOSTS = ("googleapis.com", "google.com")
+# Header không còn đúng sau khi requests/aiohttp đã giải nén body
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+
+def cassette_key(url):
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def is_google(url):
+    return urlsplit(url).netloc.endswith(GOOGLE_HOSTS)
+
+
+class Cassette:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.http = {}
+        self.sheets = []
+        try:
+            with open(os.path.join(path, "http.json"), encoding="utf-8") as f:
+                self.http = json.load(f)
+            with open(os.path.join(path, "sheets.json"), encoding="utf-8") as f:
+                self.sheets = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _body_path(self, name):
+        return os.path.join(self.path, "bodies", name)
+
+    def add(self, url, status, headers, body):
+        key = cassette_key(url)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".txt"
+        headers = {k: v for k, v in headers.items() if k.lower() not in DROP_HEADERS}
+        with self.lock:
+            os.makedirs(os.path.dirname(self._body_path(name)), exist_ok=True)
+            with open(self._body_path(name), "w", encoding="utf-8") as f:
+                f.write(body)
+            self.http[key] = {"status": status, "headers": headers, "body": name}
+
+    def get(self, url):
+        entry = self.http.get(cassette_key(url))
+        if entry is None:
+            return None
+        with open(self._body_path(entry["body"]), encoding="utf-8") as f:
+            return entry["status"], entry["headers"], f.read()
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "http.json"), "w", encoding="utf-8") as f:
+            json.dump(self.http, f, ensure_ascii=False, indent=1)
+        with open(os.path.join(self.path, "sheets.json"), "w", encoding="utf-8") as f:
+            json.dump(self.sheets, f, ensure_ascii=False, indent=1)
+
+
+@contextlib.contextmanager
+def patch_http(redirect_base=None, cassette=None):
+    """Vá requests.Session.send và aiohttp.ClientSession._request:
+    redirect_base: chuyển mọi request (trừ Google) tới stub server, url gốc nằm trong path;
+    cassette: ghi lại response của mọi request (trừ Google) theo url gốc"""
+    original_send = requests.Session.send
+    original_request = aiohttp.ClientSession._request
+    counter = {"requests": 0}
+
+    def send(self, request, **kwargs):
+        url = request.url
+        if is_google(url):
+            return original_send(self, request, **kwargs)
+        counter["requests"] += 1
+        if redirect_base:
+            request.url = f"{redirect_base}/{quote(url, safe='')}"
+        response = original_send(self, request, **kwargs)
+        response.url = url
+        if cassette is not None:
+            cassette.add(url, response.status_code, response.headers, response.text)
+        return response
+
+    async def _request(self, method, str_or_url, **kwargs):
+        url = str(str_or_url)
+        if is_google(url):
+            return await original_request(self, method, str_or_url, **kwargs)
+        counter["requests"] += 1
+        target = f"{redirect_base}/{quote(url, safe='')}" if redirect_base else str_or_url
+        response = await original_request(self, method, target, **kwargs)
+        if cassette is not None:
+            # text() đọc và giữ body trong response nên bên gọi vẫn đọc lại được
+            cassette.add(url, response.status, response.headers, await response.text())
+        return response
+
+    requests.Session.send = send
+    aiohttp.ClientSession._request = _request
+    try:
+        yield counter
+    finally:
+        requests.Session.send = original_send
+        aiohttp.ClientSession._request = original_request
+
+
+class ReplayServer(StubServer):
+    """Stub server trả response theo url gốc trong path: lấy từ cassette, không có thì hỏi fallback(url, headers)"""
+
+    def __init__(self, cassette=None, fallback=None, latency=0.0):
+        self.cassette = cassette
+        self.fallback = fallback
+        self.misses = []
+        super().__init__(handler=self._handle, latency=latency)
+
+    def _handle(self, path, headers):
+        url = unquote(path[1:])
+        result = self.cassette.get(url) if self.cassette else None
+        if result is None and self.fallback:
+            result = self.fallback(url, headers)
+        if result is None:
+            self.misses.append(url)
+        return result
+
+
+def summarize_batch(body):
+    requests_ = body.get("requests", [])
+    cells = sum(
+        len(row.get("values", []))
+        for r in requests_ if "updateCells" in r
+        for row in r["updateCells"].get("rows", [])
+    )
+    return {"method": "batch_update", "requests": [next(iter(r)) for r in requests_], "cells": cells}
+
+
+class SheetsRecorder:
+    """Vá các hàm gspread mà sheets_session/SheetWriter dùng để ghi lại (tóm tắt) từng lệnh Sheets"""
+
+    PATCHES = [
+        (gspread.Spreadsheet, "batch_update", lambda args, kwargs, result: summarize_batch(args[0])),
+        (gspread.Spreadsheet, "add_worksheet", lambda args, kwargs, result: {"method": "add_worksheet", "title": kwargs.get("title")}),
+        (gspread.Spreadsheet, "worksheets", lambda args, kwargs, result: {"method": "worksheets"}),
+        (gspread.Worksheet, "get_all_records", lambda args, kwargs, result: {"method": "get_all_records", "rows": len(result)}),
+        (gspread.Worksheet, "get_values", lambda args, kwargs, result: {"method": "get_values", "rows": len(result)}),
+    ]
+
+    def __init__(self, log):
+        self.log = log
+        self.originals = []
+
+    def __enter__(self):
+        for cls, name, summary in self.PATCHES:
+            original = getattr(cls, name)
+            self.originals.append((cls, name, original))
+
+            def wrapper(obj, *args, _original=original, _summary=summary, **kwargs):
+                result = _original(obj, *args, **kwargs)
+                self.log.append(_summary(args, kwargs, result))
+                return result
+
+            setattr(cls, name, wrapper)
+        return self
+
+    def __exit__(self, *exc):
+        for cls, name, original in self.originals:
+            setattr(cls, name, original)
+
+
+def _cell_value(cell):
+    value = cell.get("userEnteredValue", {})
+    for kind in ("numberValue", "stringValue", "boolValue", "formulaValue"):
+        if kind in value:
+            if kind == "numberValue" and float(value[kind]).is_integer():
+                return int(value[kind])
+            return value[kind]
+    return ""
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id, title, rows, cols):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = int(rows)
+        self.col_count = int(cols)
+        self.cells = {}
+
+    def get_all_values(self):
+        if not self.cells:
+            return []
+        height = max(r for r, _ in self.cells) + 1
+        width = max(c for _, c in self.cells) + 1
+        return [[self.cells.get((r, c), "") for c in range(width)] for r in range(height)]
+
+    def get_values(self, value_render_option=None):
+        values = self.get_all_values()
+        self.spreadsheet.calls.append({"method": "get_values", "rows": len(values)})
+        return values
+
+    def get_all_records(self):
+        values = self.get_all_values()
+        records = [dict(zip(values[0], row)) for row in values[1:]] if values else []
+        self.spreadsheet.calls.append({"method": "get_all_records", "rows": len(records)})
+        return records
+
+
+class FakeSpreadsheet:
+    """Google Sheets giả trong bộ nhớ: hiểu các request mà SheetWriter/cleanup gửi"""
+
+    def __init__(self, url):
+        self.url = url
+        self.id = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+        self.sheets = {}
+        self.calls = []
+        self._next_id = 1
+
+    def worksheets(self):
+        self.calls.append({"method": "worksheets"})
+        return list(self.sheets.values())
+
+    def add_worksheet(self, title, rows, cols):
+        self.calls.append({"method": "add_worksheet", "title": title})
+        worksheet = FakeWorksheet(self, self._next_id, title, rows, cols)
+        self.sheets[worksheet.id] = worksheet
+        self._next_id += 1
+        return worksheet
+
+    def batch_update(self, body):
+        self.calls.append(summarize_batch(body))
+        for request in body.get("requests", []):
+            if "updateCells" in request:
+                update = request["updateCells"]
+                if "range" in update:
+                    self.sheets[update["range"]["sheetId"]].cells.clear()
+                    continue
+                start = update["start"]
+                worksheet = self.sheets[start["sheetId"]]
+                for r, row in enumerate(update.get("rows", []), start=start["rowIndex"]):
+                    for c, cell in enumerate(row.get("values", []), start=start["columnIndex"]):
+                        value = _cell_value(cell)
+                        if value == "":
+                            worksheet.cells.pop((r, c), None)
+                        else:
+                            worksheet.cells[(r, c)] = value
+            elif "updateSheetProperties" in request:
+                props = request["updateSheetProperties"]["properties"]
+                grid = props.get("gridProperties", {})
+                worksheet = self.sheets[props["sheetId"]]
+                worksheet.row_count = grid.get("rowCount", worksheet.row_count)
+                worksheet.col_count = grid.get("columnCount", worksheet.col_count)
+            elif "deleteSheet" in request:
+                self.sheets.pop(request["deleteSheet"]["sheetId"], None)
+        return {"replies": []}
+
+    def snapshot(self):
+        return {ws.title: ws.get_all_values() for ws in self.sheets.values()}
+
+
+class FakeClient:
+    def __init__(self):
+        self.spreadsheets = {}
+
+    def open_by_url(self, url):
+        if url not in self.spreadsheets:
+            self.spreadsheets[url] = FakeSpreadsheet(url)
+        return self.spreadsheets[url]
+
+    @property
+    def calls(self):
+        return [call for sh in self.spreadsheets.values() for call in sh.calls]
+
+
+def install_fake_sheets():
+    """Cho sheets_session dùng FakeClient thay vì xác thực với Google"""
+    import sheets_session
+    client = FakeClient()
+    with sheets_session._lock:
+        sheets_session._client = client
+        sheets_session._spreadsheets.clear()
+        sheets_session._worksheets.clear()
+    return client
@@ -0,0 +1,65 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """HTTP server cục bộ trả về các trang dựng sẵn, có độ trễ giả lập cho mỗi request"""
+
+    def __init__(self, routes=None, latency=0.0, handler=None):
+        # routes: {path: (status, headers, body)}; handler(path, headers) -> (status, headers, body) | None
+        self.routes = routes if routes is not None else {}
+        self.latency = latency
+        self.handler = handler
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.request_count += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                result = None
+                if stub.handler:
+                    result = stub.handler(self.path, self.headers)
+                if result is None:
+                    result = stub.routes.get(self.path.split('?')[0], (404, {}, b"not found"))
+                status, headers, body = result
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                headers = dict(headers)
+                headers.setdefault("Content-Type", "text/html; charset=utf-8")
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
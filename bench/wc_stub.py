@@ -0,0 +1,37 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+
+class WooCommerceStub:
+    """Handler cho StubServer mô phỏng GET /products của WooCommerce REST API"""
+
+    def __init__(self, products):
+        self.products = products
+        self.bytes_sent = 0
+
+    def __call__(self, path, headers):
+        parts = urlsplit(path)
+        if not parts.path.endswith("/products"):
+            return None
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        items = self.products
+        if query.get("search"):
+            items = [p for p in items if query["search"].lower() in p["name"].lower()]
+        if query.get("modified_after"):
+            items = [p for p in items if p["date_modified_gmt"] > query["modified_after"]]
+        if query.get("orderby") == "modified":
+            items = sorted(items, key=lambda p: p["date_modified_gmt"], reverse=query.get("order") != "asc")
+        per_page = int(query.get("per_page", 10))
+        page = int(query.get("page", 1))
+        chunk = items[(page - 1) * per_page: page * per_page]
+        if query.get("_fields"):
+            fields = query["_fields"].split(",")
+            chunk = [{k: p[k] for k in fields if k in p} for p in chunk]
+        body = json.dumps(chunk).encode("utf-8")
+        self.bytes_sent += len(body)
+        total_pages = max(1, -(-len(items) // per_page))
+        return (200, {
+            "Content-Type": "application/json",
+            "X-WP-Total": str(len(items)),
+            "X-WP-TotalPages": str(total_pages),
+        }, body)
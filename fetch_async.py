@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from tenacity import retry
+
+from http_client import DEFAULT_HEADERS, TIMEOUT, get_limiter, retry_policy
+from metrics import get_metrics
+
+# Số request tối đa chạy song song tới cùng một host
+PER_HOST_LIMIT = int(os.environ.get("FETCH_PER_HOST_LIMIT", "4"))
+
+
+@retry(**retry_policy((aiohttp.ClientError, asyncio.TimeoutError), lambda result: result[0]))
+async def _get(session, url, headers, timeout):
+    # Một request (chờ theo giới hạn request/giây của host), trả về (status, headers, text)
+    await get_limiter().wait_async(url)
+    start = time.perf_counter()
+    try:
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            body = await resp.read()
+            get_metrics().observe_http(url, resp.status, time.perf_counter() - start, len(body))
+            text = await resp.text() if resp.status == 200 else ""
+            return resp.status, resp.headers, text
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        get_metrics().observe_http(url, None, time.perf_counter() - start)
+        raise
+
+
+async def _fetch_one(session, semaphores, url, timeout, cache=None):
+    async with semaphores[urlsplit(url).netloc]:
+        try:
+            headers = cache.conditional_headers(url) if cache else {}
+            status, response_headers, text = await _get(session, url, headers, timeout)
+            if status == 304 and cache:
+                body = cache.mark_not_modified(url)
+                if body is not None:
+                    return body
+                # Cache mất file, tải lại không điều kiện
+                status, response_headers, text = await _get(session, url, {}, timeout)
+            if status != 200:
+                print(f"Lỗi khi truy cập {url}: HTTP {status}")
+                return None
+            if cache:
+                cache.store(url, response_headers, text)
+            return text
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Lỗi khi truy cập {url}: {str(e)}")
+            return None
+
+
+async def _open_session(per_host, headers):
+    # ClientSession phải được tạo khi event loop đang chạy
+    connector = aiohttp.TCPConnector(limit_per_host=per_host)
+    return aiohttp.ClientSession(headers=headers or DEFAULT_HEADERS, connector=connector)
+
+
+def iter_pages(urls, per_host=None, headers=None, timeout=TIMEOUT, cache=None, window=None):
+    """Tải song song danh sách url, sinh từng HTML (None nếu lỗi) theo đúng thứ tự đầu vào ngay khi trang đó
+    tải xong. Chỉ tối đa window trang đang tải hoặc chờ tới lượt: bộ nhớ không tăng theo số trang.
+    Nếu truyền cache (http_cache.HttpCache) thì gửi request có điều kiện và dùng lại body khi gặp 304."""
+    per_host = per_host or PER_HOST_LIMIT
+    window = window or per_host * 2
+    start = time.perf_counter()
+    # Mỗi host một semaphore riêng để giới hạn số kết nối đồng thời
+    semaphores = defaultdict(lambda: asyncio.Semaphore(per_host))
+    loop = asyncio.new_event_loop()
+    session = None
+    pending = deque()
+    ok = 0
+    try:
+        session = loop.run_until_complete(_open_session(per_host, headers))
+        remaining = iter(urls)
+
+        def fill():
+            for url in itertools.islice(remaining, window - len(pending)):
+                pending.append(loop.create_task(_fetch_one(session, semaphores, url, timeout, cache)))
+
+        fill()
+        while pending:
+            # Trong lúc chờ trang đầu hàng đợi, các trang sau trong cửa sổ vẫn tải tiếp
+            page = loop.run_until_complete(pending.popleft())
+            fill()
+            ok += page is not None
+            yield page
+        print(f"Đã tải {ok}/{len(urls)} trang trong {time.perf_counter() - start:.2f}s "
+              f"(song song, tối đa {per_host}/host)")
+    finally:
+        # Bên gọi dừng giữa chừng hoặc bị lỗi: huỷ các trang còn đang tải rồi đóng kết nối
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        if session is not None:
+            loop.run_until_complete(session.close())
+        loop.close()
+
+
+def fetch_all(urls, per_host=None, headers=None, timeout=TIMEOUT, cache=None):
+    """Như iter_pages nhưng trả về list HTML của mọi url"""
+    return list(iter_pages(urls, per_host=per_host, headers=headers, timeout=timeout, cache=cache))
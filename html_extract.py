@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+from urllib.parse import urlsplit
+
+# bs4 chỉ được import khi thật sự parse (xem parse_html): các bước không đọc HTML không phải trả chi phí import
+# Dùng lxml khi đã cài (nhanh hơn html.parser nhiều lần), đặt HTML_PARSER để chọn parser khác
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+PARSER = os.environ.get("HTML_PARSER", DEFAULT_PARSER)
+
+CONFIG_TABLE_CLASSES = ['notcauhinh', 'cauhinh']
+
+# Chỉ dựng các thẻ cần đọc thay vì cả cây DOM của trang (tham số parse_only của parse_html).
+# Post ID (shortlink, class của <body>) đọc bằng regex trên HTML thô: post_ids.post_id_from_html
+PRODUCT_PAGE_TAGS = ["h2", "table"]
+SHORTLINK_TAGS = "link"
+BLOCKQUOTE_TAGS = "blockquote"
+# Trang có nhắc tới class của bảng cấu hình (để biết có nên parse lại cả trang khi không thấy bảng)
+CONFIG_TABLE_RE = re.compile(r'class="[^"]*\b(?:notcauhinh|cauhinh)\b')
+
+# Thanh phân trang XenForo: <div class="PageNav" data-last="N">, hoặc các link .../page-N
+PAGE_NAV_LAST_RE = re.compile(r'class="PageNav"[^>]*data-last="(\d+)"')
+# Bài viết: <li id="post-N"> (XenForo 1) hoặc <article data-content="post-N"> (XenForo 2)
+POST_START_RE = re.compile(r'<(?:li|article)\b[^>]*\b(?:id|data-content)="post-(\d+)"')
+# Dòng "Sửa lần cuối" của bài và các thuộc tính thời gian trong đó
+EDIT_DATE_RE = re.compile(r'class="(?:editDate|message-lastEdit)"(.{0,400}?)</div>', re.DOTALL)
+DATE_ATTR_RE = re.compile(r'(?:data-time|datetime|title)="([^"]+)"')
+
+
+def parse_html(html, parse_only=None, parser=None):
+    """parse_only: tên thẻ (hoặc danh sách tên thẻ) cần dựng, None là cả trang"""
+    from bs4 import BeautifulSoup, SoupStrainer
+    strainer = SoupStrainer(parse_only) if parse_only is not None else None
+    return BeautifulSoup(html, parser or PARSER, parse_only=strainer)
+
+
+def parse_full(html):
+    # Cách parse cũ: cả trang bằng html.parser
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "html.parser")
+
+
+def parse_product_page(html):
+    """Soup của trang sản phẩm VTMK chỉ gồm tiêu đề và bảng cấu hình. Mỗi trang chỉ parse một lần, trừ khi
+    HTML có bảng cấu hình mà parser nhanh không dựng được: khi đó parse lại cả trang như cũ"""
+    soup = parse_html(html, PRODUCT_PAGE_TAGS)
+    if soup.find('table', class_=CONFIG_TABLE_CLASSES) or not CONFIG_TABLE_RE.search(html):
+        return soup
+    return parse_full(html)
+
+
+def parse_shortlink_page(html):
+    # Chỉ cần <link rel=shortlink>; trang không có thì parse cả trang để đọc class của <body>
+    soup = parse_html(html, SHORTLINK_TAGS)
+    if soup.find("link", rel="shortlink"):
+        return soup
+    return parse_full(html)
+
+
+def find_blockquotes(html):
+    """Các bài viết (blockquote) của một trang thread 5giay"""
+    blocks = parse_html(html, BLOCKQUOTE_TAGS).find_all('blockquote')
+    if blocks:
+        return blocks
+    return parse_full(html).find_all('blockquote')
+
+
+def split_posts(html):
+    """Chia HTML trang thread thành các bài viết (post_id, html của bài) bằng regex, không dựng DOM"""
+    starts = list(POST_START_RE.finditer(html))
+    for i, m in enumerate(starts):
+        end = starts[i + 1].start() if i + 1 < len(starts) else len(html)
+        yield m.group(1), html[m.start():end]
+
+
+def post_version(post_html):
+    """Phiên bản của bài: thời điểm sửa cuối (nếu có) và mã băm phần nội dung.
+    Mã băm bắt được cả các lần sửa trong khoảng thời gian XenForo không ghi dòng sửa cuối"""
+    m = EDIT_DATE_RE.search(post_html)
+    edited = ",".join(DATE_ATTR_RE.findall(m.group(1))) if m else ""
+    start = post_html.find("<blockquote")
+    end = post_html.rfind("</blockquote>")
+    digest = hashlib.sha1(post_html[start:end].encode("utf-8")).hexdigest()
+    return f"{edited}|{digest}"
+
+
+def thread_page_count(html, thread_url):
+    """Số trang của một thread XenForo, đọc bằng regex trên HTML thô (không cần dựng cây DOM)"""
+    m = PAGE_NAV_LAST_RE.search(html)
+    if m:
+        return int(m.group(1))
+    # Không có data-last: lấy số lớn nhất trong các link page-N của chính thread này
+    path = re.escape(urlsplit(thread_url).path)
+    pages = [int(n) for n in re.findall(path + r'page-(\d+)', html)]
+    return max(pages, default=1)
+
+
+def find_config_tables(html):
+    """Các bảng cấu hình trong description của sản phẩm WooCommerce"""
+    # Description gần như chỉ có bảng nên lọc bằng SoupStrainer không lợi, chỉ đổi parser
+    tables = parse_html(html).find_all('table', class_=CONFIG_TABLE_CLASSES)
+    if tables:
+        return tables
+    return parse_full(html).find_all('table', class_=CONFIG_TABLE_CLASSES)
+
+
+def release(element):
+    """Huỷ ngay cả cây DOM chứa element. Cây bs4 có tham chiếu vòng (cha <-> con) nên nếu không huỷ,
+    nó chỉ được giải phóng khi gc chạy, sau khi nhiều trang khác đã được parse"""
+    if element is None:
+        return
+    while element.parent is not None:
+        element = element.parent
+    element.decompose()
@@ -0,0 +1,172 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+import http_client
+
+# Thư mục cache giữ lại giữa các lần chạy (workflow dùng actions/cache cho thư mục .cache)
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", os.path.join(".cache", "http"))
+MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_MB", "100")) * 1024 * 1024
+
+
+class CachedResponse:
+    def __init__(self, status_code, text, not_modified=False):
+        self.status_code = status_code
+        self.text = text
+        # True nếu server trả 304 và nội dung lấy từ cache
+        self.not_modified = not_modified
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=None)
+
+
+class HttpCache:
+    """Cache HTTP trên đĩa dùng ETag/Last-Modified, giới hạn dung lượng và loại bỏ theo LRU"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+        # Các url được server xác nhận chưa đổi (304) trong lần chạy này
+        self.not_modified = set()
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def conditional_headers(self, url):
+        entry = self.index.get(url)
+        headers = {}
+        if not entry or not os.path.exists(self._path(url, ".html")):
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load_body(self, url):
+        try:
+            with open(self._path(url, ".html"), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def mark_not_modified(self, url):
+        # Server trả 304: dùng lại body trong cache và cập nhật thời điểm truy cập
+        body = self.load_body(url)
+        if body is None:
+            return None
+        with self.lock:
+            self.not_modified.add(url)
+            self.index[url]["atime"] = time.time()
+        return body
+
+    def store(self, url, response_headers, text):
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if not etag and not last_modified:
+            # Không có validator thì không thể hỏi lại có điều kiện, không cần lưu
+            with self.lock:
+                self.index.pop(url, None)
+                self.not_modified.discard(url)
+            return
+        data = text.encode("utf-8")
+        with open(self._path(url, ".html"), "wb") as f:
+            f.write(data)
+        with self.lock:
+            self.not_modified.discard(url)
+            self.index[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": len(data),
+                "atime": time.time(),
+            }
+            # Nội dung đã đổi nên kết quả parse cũ không còn đúng
+            if os.path.exists(self._path(url, ".parsed.json")):
+                os.remove(self._path(url, ".parsed.json"))
+        self._evict()
+
+    def load_parsed(self, url):
+        # Chỉ trả về kết quả parse cũ khi trang được xác nhận chưa đổi
+        if url not in self.not_modified:
+            return None
+        try:
+            with open(self._path(url, ".parsed.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_parsed(self, url, parsed):
+        if url not in self.index:
+            return
+        data = json.dumps(parsed, ensure_ascii=False).encode("utf-8")
+        with open(self._path(url, ".parsed.json"), "wb") as f:
+            f.write(data)
+        with self.lock:
+            self.index[url]["parsed_size"] = len(data)
+
+    def _evict(self):
+        with self.lock:
+            total = sum(e.get("size", 0) + e.get("parsed_size", 0) for e in self.index.values())
+            if total <= self.max_bytes:
+                return
+            # Xoá các url lâu không dùng nhất cho tới khi dưới giới hạn
+            for url, entry in sorted(self.index.items(), key=lambda item: item[1].get("atime", 0)):
+                if total <= self.max_bytes:
+                    break
+                for suffix in (".html", ".parsed.json"):
+                    if os.path.exists(self._path(url, suffix)):
+                        os.remove(self._path(url, suffix))
+                total -= entry.get("size", 0) + entry.get("parsed_size", 0)
+                del self.index[url]
+                self.not_modified.discard(url)
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+
+    def get(self, url, headers=None, timeout=None):
+        request_headers = dict(headers or {})
+        request_headers.update(self.conditional_headers(url))
+        resp = http_client.get(url, headers=request_headers, timeout=timeout)
+        if resp.status_code == 304:
+            body = self.mark_not_modified(url)
+            if body is not None:
+                return CachedResponse(200, body, not_modified=True)
+            # Cache bị mất file, tải lại không điều kiện
+            resp = http_client.get(url, headers=headers, timeout=timeout)
+        if resp.status_code == 200:
+            self.store(url, resp.headers, resp.text)
+        return CachedResponse(resp.status_code, resp.text)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    # Các bước crawl chạy song song có thể gọi lần đầu cùng lúc
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+            # Ghi index một lần khi kết thúc chương trình
+            atexit.register(_cache.save)
+        return _cache
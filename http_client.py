@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import retry, retry_if_exception_type, retry_if_result, stop_after_attempt, wait_exponential
+
+from metrics import get_metrics
+
+# Client HTTP dùng chung cho cả ba script: một Session giữ kết nối (keep-alive, không bắt tay TLS lại
+# mỗi trang), nhận gzip, timeout và User-Agent thống nhất, thử lại khi lỗi tạm thời,
+# và giới hạn số request/giây cho mỗi host bằng token bucket thay cho time.sleep cố định
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+DEFAULT_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept-Encoding": "gzip, deflate",
+}
+TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "10"))
+# Số request/giây cho mỗi host (0: không giới hạn) và số request được gửi dồn một lúc. Mặc định giữ nhịp
+# của bản cũ (time.sleep(1) giữa các request) với shop và diễn đàn bên ngoài; tăng qua biến môi trường
+# nếu site cho phép
+RATE_PER_HOST = float(os.environ.get("HTTP_RATE_PER_HOST", "1"))
+BURST = int(os.environ.get("HTTP_BURST", "1"))
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+RETRY_ATTEMPTS = int(os.environ.get("HTTP_RETRY_ATTEMPTS", "3"))
+# Quá tải/lỗi server thì thử lại; 4xx còn lại là lỗi thật, trả về cho bên gọi
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket an toàn đa luồng: reserve() giữ chỗ một token và trả về số giây phải chờ"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Token có thể âm: các request xếp hàng lần lượt cách nhau 1/rate giây
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    def __init__(self, rate=RATE_PER_HOST, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket.reserve()
+
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            get_metrics().add_time("http.rate_wait", delay)
+            time.sleep(delay)
+
+    async def wait_async(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            get_metrics().add_time("http.rate_wait", delay)
+            await asyncio.sleep(delay)
+
+
+def retry_policy(exception_types, status_of):
+    """Tham số tenacity dùng chung cho requests và aiohttp: thử lại khi gặp exception_types (lỗi mạng,
+    timeout) hoặc khi status_of(kết quả) thuộc RETRY_STATUS; hết lượt thì trả kết quả/lỗi của lần cuối"""
+    return dict(
+        retry=retry_if_exception_type(exception_types) | retry_if_result(lambda result: status_of(result) in RETRY_STATUS),
+        stop=stop_after_attempt(RETRY_ATTEMPTS),
+        wait=wait_exponential(multiplier=1, min=1, max=10),
+        before_sleep=lambda state: get_metrics().incr("http.retries"),
+        retry_error_callback=lambda state: state.outcome.result(),
+    )
+
+
+_session = None
+_limiter = None
+_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.headers.update(DEFAULT_HEADERS)
+        return _session
+
+
+def get_limiter():
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
+
+
+@retry(**retry_policy((requests.exceptions.ConnectionError, requests.exceptions.Timeout), lambda resp: resp.status_code))
+def get(url, params=None, headers=None, timeout=None, allow_redirects=True):
+    """GET qua Session dùng chung, chờ theo giới hạn của host, ghi số liệu vào metrics"""
+    get_limiter().wait(url)
+    start = time.perf_counter()
+    try:
+        resp = get_session().get(url, params=params, headers=headers, timeout=timeout or TIMEOUT,
+                                 allow_redirects=allow_redirects)
+    except requests.exceptions.RequestException:
+        get_metrics().observe_http(url, None, time.perf_counter() - start)
+        raise
+    get_metrics().observe_http(url, resp.status_code, time.perf_counter() - start, len(resp.content))
+    return resp
@@ -0,0 +1,143 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# Đo thời gian/đếm theo từng bước của một lần chạy; cuối lần chạy ghi báo cáo JSON
+# (giữ REPORT_KEEP báo cáo gần nhất để so sánh giữa các lần cron) và in bảng tóm tắt
+REPORT_DIR = os.path.join(os.environ.get("BAREBONE_STATE_DIR", ".cache"), "reports")
+REPORT_KEEP = int(os.environ.get("METRICS_REPORT_KEEP", "50"))
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank trên danh sách đã sắp xếp
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.timers = {}
+        self.counters = Counter()
+        self.http = defaultdict(lambda: {"requests": 0, "bytes": 0, "errors": 0, "status": Counter(), "latencies": []})
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            entry = self.timers.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def observe_http(self, url, status, seconds, nbytes=0):
+        # status None: lỗi kết nối/timeout
+        host = urlsplit(url).netloc
+        with self.lock:
+            entry = self.http[host]
+            entry["requests"] += 1
+            entry["bytes"] += nbytes
+            entry["latencies"].append(seconds)
+            entry["status"][str(status)] += 1
+            if status is None or status >= 400:
+                entry["errors"] += 1
+
+    def report(self):
+        with self.lock:
+            http = {}
+            for host, entry in self.http.items():
+                latencies = sorted(entry["latencies"])
+                http[host] = {
+                    "requests": entry["requests"],
+                    "bytes": entry["bytes"],
+                    "errors": entry["errors"],
+                    "status": dict(entry["status"]),
+                    "latency_p50": percentile(latencies, 50),
+                    "latency_p90": percentile(latencies, 90),
+                    "latency_p99": percentile(latencies, 99),
+                    "latency_max": latencies[-1] if latencies else 0.0,
+                }
+            return {
+                "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+                "duration": time.time() - self.started_at,
+                "timers": {name: dict(entry) for name, entry in self.timers.items()},
+                "counters": dict(self.counters),
+                "http": http,
+            }
+
+    def write_report(self, name="run", report_dir=REPORT_DIR):
+        report = self.report()
+        os.makedirs(report_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started_at).strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(report_dir, f"{name}-{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        old_reports = sorted(f for f in os.listdir(report_dir) if f.endswith(".json"))
+        for old in old_reports[:-REPORT_KEEP]:
+            os.remove(os.path.join(report_dir, old))
+        return path
+
+    def summary(self):
+        report = self.report()
+        lines = [f"{'Bước':32} {'Lần':>5} {'Tổng (s)':>9} {'Max (s)':>8}"]
+        for name, entry in report["timers"].items():
+            lines.append(f"{name:32} {entry['count']:5} {entry['total']:9.2f} {entry['max']:8.2f}")
+        if report["http"]:
+            lines.append(f"{'Host':32} {'Req':>5} {'KB':>9} {'p50':>6} {'p90':>6} {'p99':>6} {'Lỗi':>4}")
+            for host, entry in report["http"].items():
+                lines.append(
+                    f"{host:32} {entry['requests']:5} {entry['bytes'] / 1024:9.0f} "
+                    f"{entry['latency_p50']:6.2f} {entry['latency_p90']:6.2f} {entry['latency_p99']:6.2f} {entry['errors']:4}")
+        if report["counters"]:
+            lines.append(", ".join(f"{name}={value}" for name, value in sorted(report["counters"].items())))
+        lines.append(f"Tổng thời gian chạy: {report['duration']:.2f}s")
+        return "\n".join(lines)
+
+    def finish(self, name="run"):
+        """Ghi báo cáo JSON và in bảng tóm tắt, gọi một lần ở cuối lần chạy"""
+        path = self.write_report(name)
+        print(self.summary())
+        print(f"Báo cáo chi tiết: {path}")
+        return path
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def timed(name):
+    """Decorator đo thời gian mỗi lần gọi hàm vào timer `name`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
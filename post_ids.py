@@ -0,0 +1,124 @@
+import atexit
+import json
+import os
+import re
+import threading
+from urllib.parse import urldefrag
+
+# Lưu url sản phẩm -> post ID giữa các lần chạy để không phải tải lại trang chỉ để đọc shortlink
+POST_ID_PATH = os.path.join(os.environ.get("BAREBONE_STATE_DIR", ".cache"), "post_ids.json")
+
+POST_CLASS_RE = re.compile(r'^post-(\d+)$')
+POSTID_CLASS_RE = re.compile(r'^postid-(\d+)$')
+SHORTLINK_RE = re.compile(r'p=(\d+)')
+# Cùng thông tin trên HTML thô: <link rel="shortlink" href="...?p=N"> và class của <body>
+SHORTLINK_TAG_RE = re.compile(r'<link\b[^>]*\brel=["\']?shortlink\b[^>]*>', re.IGNORECASE)
+BODY_TAG_RE = re.compile(r'<body\b[^>]*>', re.IGNORECASE)
+HREF_ATTR_RE = re.compile(r'\bhref=["\']?([^"\'\s>]+)', re.IGNORECASE)
+CLASS_ATTR_RE = re.compile(r'\bclass=["\']([^"\']*)["\']', re.IGNORECASE)
+
+
+def normalize_url(url):
+    # Link trong DataFrame có thêm text fragment (#:~:text=...), bỏ đi khi tra cứu
+    return urldefrag(url)[0]
+
+
+def post_id_from_classes(classes):
+    # Thẻ sản phẩm trong trang danh mục WooCommerce có class dạng "post-1234"
+    for cls in classes or []:
+        m = POST_CLASS_RE.match(cls)
+        if m:
+            return m.group(1)
+    return ""
+
+
+def post_id_from_soup(soup):
+    # Trang sản phẩm: ưu tiên <link rel=shortlink>, sau đó class "postid-1234" của <body>
+    shortlink_tag = soup.find("link", rel="shortlink")
+    if shortlink_tag and "href" in shortlink_tag.attrs:
+        m = SHORTLINK_RE.search(shortlink_tag["href"])
+        if m:
+            return m.group(1)
+    body = soup.find("body")
+    if body:
+        for cls in body.get("class", []):
+            m = POSTID_CLASS_RE.match(cls)
+            if m:
+                return m.group(1)
+    return ""
+
+
+def post_id_from_html(html):
+    """Như post_id_from_soup nhưng đọc bằng regex trên HTML thô: soup của trang chỉ dựng vài thẻ, không phải
+    parse lại cả trang chỉ để lấy class của <body> khi trang không có shortlink"""
+    tag = SHORTLINK_TAG_RE.search(html)
+    href = HREF_ATTR_RE.search(tag.group(0)) if tag else None
+    m = SHORTLINK_RE.search(href.group(1)) if href else None
+    if m:
+        return m.group(1)
+    body = BODY_TAG_RE.search(html)
+    classes = CLASS_ATTR_RE.search(body.group(0)) if body else None
+    for cls in classes.group(1).split() if classes else []:
+        m = POSTID_CLASS_RE.match(cls)
+        if m:
+            return m.group(1)
+    return ""
+
+
+class PostIdIndex:
+    def __init__(self, path=POST_ID_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        # Các url đã thử tra cứu mà không có ID trong lần chạy này
+        self.misses = set()
+        self.lookups = 0
+        self.fetches = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.ids = json.load(f)
+        except (OSError, ValueError):
+            self.ids = {}
+
+    def add(self, url, post_id):
+        if url and post_id:
+            with self.lock:
+                self.ids[normalize_url(url)] = str(post_id)
+
+    def get(self, url):
+        return self.ids.get(normalize_url(url), "")
+
+    def resolve(self, url, fetch_post_id):
+        """Trả về post ID của url; chỉ gọi fetch_post_id (tải trang) khi chưa biết ID"""
+        self.lookups += 1
+        key = normalize_url(url)
+        post_id = self.ids.get(key)
+        if post_id or key in self.misses:
+            return post_id or ""
+        self.fetches += 1
+        post_id = fetch_post_id(key)
+        if post_id:
+            self.add(key, post_id)
+        else:
+            self.misses.add(key)
+        return post_id
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.ids, f)
+            os.replace(tmp_path, self.path)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_post_id_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PostIdIndex()
+            atexit.register(_index.save)
+        return _index
@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+import requests
+
+import barebone5giay
+import barebone5giaymkcom
+import http_client
+from metrics import get_metrics
+
+# Kiểm tra nhanh trước khi chạy: mỗi nguồn có một "dấu vân tay" rẻ (1 request nhỏ), chỉ chạy các bước
+# có nguồn thay đổi so với lần chạy thành công trước. Lần chạy đầu tiên trong ngày luôn chạy hết
+# vì sheet được đặt tên theo ngày
+FINGERPRINTS_PATH = os.path.join(os.environ.get("BAREBONE_STATE_DIR", ".cache"), "fingerprints.json")
+VTMK_SITEMAP_URL = os.environ.get("VTMK_SITEMAP_URL", "https://vitinhminhkhoi.vn/product-sitemap.xml")
+STAGES = ["5giay", "vtmk", "mkcom"]
+_state_lock = threading.Lock()
+
+LATEST_POST_RE = re.compile(r'post-(\d+)')
+SITEMAP_LASTMOD_RE = re.compile(r'<lastmod>\s*([^<\s]+)\s*</lastmod>')
+SITEMAP_LOC_RE = re.compile(r'<loc>')
+
+
+def fingerprint_5giay(thread_url):
+    # XenForo chuyển /latest tới bài mới nhất: .../page-N#post-ID
+    resp = http_client.get(f"{thread_url}latest", allow_redirects=False)
+    m = LATEST_POST_RE.search(resp.headers.get("Location", ""))
+    return f"post-{m.group(1)}" if m else None
+
+
+def fingerprint_wc(api_url, consumer_key, consumer_secret):
+    # Sản phẩm barebone sửa gần nhất + tổng số sản phẩm (bắt được cả sản phẩm bị xoá)
+    resp = http_client.get(f"{api_url}/products", params={
+        'consumer_key': consumer_key,
+        'consumer_secret': consumer_secret,
+        'search': 'barebone',
+        'orderby': 'modified',
+        'order': 'desc',
+        'per_page': 1,
+        '_fields': 'id,date_modified_gmt',
+    })
+    resp.raise_for_status()
+    data = resp.json()
+    latest = data[0].get("date_modified_gmt") if data else ""
+    return f"{resp.headers.get('X-WP-Total', '?')}|{latest}"
+
+
+def fingerprint_sitemap(sitemap_url):
+    # lastmod mới nhất + số url trong sitemap sản phẩm (thêm/bớt sản phẩm cũng đổi)
+    resp = http_client.get(sitemap_url)
+    if resp.status_code != 200:
+        return None
+    lastmods = SITEMAP_LASTMOD_RE.findall(resp.text)
+    if not lastmods:
+        return None
+    return f"{len(SITEMAP_LOC_RE.findall(resp.text))}|{max(lastmods)}"
+
+
+def collect_fingerprints():
+    """Dấu vân tay hiện tại của từng nguồn; None nếu không lấy được (khi đó bước đó vẫn chạy)"""
+    checks = {
+        "5giay": lambda: fingerprint_5giay(barebone5giay.THREAD_URL),
+        "vtmk": lambda: fingerprint_sitemap(VTMK_SITEMAP_URL),
+        "mkcom": lambda: fingerprint_wc(barebone5giaymkcom.WC_API_URL, barebone5giaymkcom.WC_CONSUMER_KEY,
+                                        barebone5giaymkcom.WC_CONSUMER_SECRET),
+    }
+    fingerprints = {}
+    with get_metrics().timer("preflight"):
+        for source, check in checks.items():
+            try:
+                fingerprints[source] = check()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Không lấy được dấu vân tay {source}: {e}")
+                fingerprints[source] = None
+    return fingerprints
+
+
+def load_state(path=None):
+    try:
+        with open(path or FINGERPRINTS_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_stage(source, fingerprint, path=None, today=None):
+    """Ghi dấu vân tay của một bước sau khi bước đó chạy xong"""
+    path = path or FINGERPRINTS_PATH
+    today = today or datetime.now().strftime("%d-%m-%Y")
+    with _state_lock:
+        state = load_state(path)
+        if state.get("date") != today:
+            state = {"date": today, "sources": {}}
+        state["sources"][source] = fingerprint
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+
+def forget_stages(sources, path=None, today=None):
+    """Xoá dấu vân tay đã lưu của các bước sắp chạy. Bước bị chạy lại vì giá 5giay đổi có nguồn không đổi:
+    nếu bước đó lỗi mà dấu vân tay cũ còn, lần sau sẽ bị bỏ qua dù sheet vẫn so với giá 5giay cũ"""
+    path = path or FINGERPRINTS_PATH
+    today = today or datetime.now().strftime("%d-%m-%Y")
+    with _state_lock:
+        state = load_state(path)
+        if state.get("date") != today or not any(source in state["sources"] for source in sources):
+            return
+        for source in sources:
+            state["sources"].pop(source, None)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+
+def plan_stages(fingerprints, state, force=False, today=None):
+    """Các bước cần chạy: {stage: lý do}. Bước so sánh VTMK/MKCOM chạy lại khi giá 5giay đổi"""
+    today = today or datetime.now().strftime("%d-%m-%Y")
+    previous = state.get("sources", {}) if state.get("date") == today else {}
+    reasons = {}
+    for source in STAGES:
+        if force:
+            reasons[source] = "--force"
+        elif state.get("date") != today:
+            reasons[source] = "lần chạy đầu tiên trong ngày"
+        elif fingerprints.get(source) is None:
+            reasons[source] = "không kiểm tra được"
+        elif fingerprints[source] != previous.get(source):
+            reasons[source] = "nguồn đã thay đổi"
+    if "5giay" in reasons:
+        for source in ("vtmk", "mkcom"):
+            reasons.setdefault(source, "giá 5giay đã thay đổi")
+    return reasons
+
+
+def preflight(force=False):
+    fingerprints = collect_fingerprints()
+    reasons = plan_stages(fingerprints, load_state(), force)
+    # Bước chỉ được ghi nhận lại khi upload xong (save_stage)
+    forget_stages(list(reasons))
+    for source in STAGES:
+        print(f"  {source:6} {fingerprints.get(source) or '?':40} -> "
+              f"{'chạy (' + reasons[source] + ')' if source in reasons else 'bỏ qua (không đổi)'}")
+    return fingerprints, reasons
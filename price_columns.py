@@ -0,0 +1,74 @@
+import urllib.parse
+
+from metrics import get_metrics
+from post_ids import get_post_id_index
+
+# Các cột của bảng so giá dùng chung cho VTMK và MKCOM (chênh lệch, mũi tên, link, post ID).
+# pandas/numpy chỉ được import trong hàm, lúc bước so sánh thật sự chạy
+
+
+def make_text_fragment_links(base_urls, product_names):
+    # Mỗi tên chỉ quote một lần rồi nối chuỗi theo cột
+    encoded = product_names.map({name: urllib.parse.quote(name) for name in product_names.unique()})
+    return base_urls + "#:~:text=" + encoded
+
+
+def to_int_or_na(price):
+    import pandas as pd
+    # Giống int(price) của bản cũ: giá không chuyển được sang số thì không tính chênh lệch
+    try:
+        return int(price)
+    except (TypeError, ValueError):
+        return pd.NA
+
+
+def compute_price_diff(shop_prices, prices_5giay):
+    """Cột chênh lệch: số (giá shop - giá 5giay), "-" nếu bằng nhau, "" nếu thiếu một bên"""
+    import numpy as np
+    import pandas as pd
+    shop = pd.to_numeric(shop_prices, errors="coerce")
+    if shop.dtype.kind == "f":
+        # Cột giá có ô trống thì pandas để float, chênh lệch cũng là float như bản cũ
+        diff = shop.to_numpy() - prices_5giay.to_numpy(dtype="float64", na_value=np.nan)
+        has_diff = ~np.isnan(diff)
+    else:
+        diff = shop.astype("Int64").to_numpy() - prices_5giay.to_numpy()
+        has_diff = ~pd.isna(diff)
+        diff = np.where(has_diff, diff, 1).astype("int64")
+    return np.select(
+        [has_diff & (diff == 0), has_diff],
+        [np.full(len(diff), "-", dtype=object), diff.astype(object)],
+        default="",
+    )
+
+
+def add_arrow_to_price(df, price_col):
+    """Cột giá shop (price_col) kèm mũi tên so với 5giay (🔺 shop rẻ hơn, 🔻 shop đắt hơn)"""
+    import numpy as np
+    price = df[price_col].to_numpy(dtype=object)
+    diff = df["Chênh lệch"].to_numpy(dtype=object)
+    # "" (thiếu giá) và "-" (bằng giá) giữ nguyên giá
+    numeric = np.array([not isinstance(d, str) for d in diff], dtype=bool)
+    diff = np.where(numeric, diff, 0).astype("float64")
+    has_arrow = numeric & (diff != 0)
+    formatted = np.full(len(df), "", dtype=object)
+    formatted[has_arrow] = [f"{p:,}" for p in price[has_arrow]]
+    return np.select(
+        [has_arrow & (diff < 0), has_arrow],
+        ["🔺 " + formatted, "🔻 " + formatted],  # Mũi tên lên / xuống
+        default=price,
+    )
+
+
+def add_post_id_column(df, fetch_post_id, timer_name):
+    # Giả sử cột "Link" chứa link sản phẩm
+    # ID lấy từ chỉ mục đã ghi khi crawl, chỉ gọi fetch_post_id(url) (tải trang để đọc shortlink) khi chưa biết ID
+    index = get_post_id_index()
+    fetches_before = index.fetches
+    with get_metrics().timer(timer_name):
+        ids = [index.resolve(url, fetch_post_id) for url in df["Link"]]
+    print(f"Lấy post ID cho {len(ids)} dòng, phải tải {index.fetches - fetches_before} trang")
+    # Thêm cột "ID" sau cột "Chênh lệch"
+    insert_idx = df.columns.get_loc("Chênh lệch") + 1
+    df.insert(insert_idx, "ID", ids)
+    return df
@@ -0,0 +1,157 @@
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from sku_match import canonical_sku
+
+# Lịch sử giá lưu cục bộ (sheet cũ bị xoá mỗi ngày). Mỗi sản phẩm chỉ lưu các khoảng giá
+# không đổi [valid_from, valid_to]: giá giữ nguyên thì chỉ kéo dài valid_to, giá đổi mới thêm dòng
+HISTORY_PATH = os.path.join(os.environ.get("BAREBONE_STATE_DIR", ".cache"), "price_history.sqlite")
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (source, sku)
+);
+CREATE INDEX IF NOT EXISTS idx_products_sku ON products (sku);
+CREATE TABLE IF NOT EXISTS price_intervals (
+    product_id INTEGER NOT NULL REFERENCES products (id),
+    price INTEGER,
+    valid_from TEXT NOT NULL,
+    valid_to TEXT NOT NULL,
+    PRIMARY KEY (product_id, valid_from)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_intervals_from ON price_intervals (valid_from);
+"""
+
+
+def connect(path=None):
+    path = path or HISTORY_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _to_price(price):
+    try:
+        return int(price)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_prices(source, items, run_at=None, path=None):
+    """Ghi giá của một lần chạy: items là các cặp (tên, giá).
+    Trả về số sản phẩm có giá mới (gồm cả sản phẩm lần đầu xuất hiện)"""
+    run_at = (run_at or datetime.now()).strftime(TIME_FORMAT)
+    # Nhiều dòng cùng khoá chuẩn trong một lần chạy thì lấy giá thấp nhất
+    latest = {}
+    for name, price in items:
+        if not name:
+            continue
+        sku = canonical_sku(name)
+        price = _to_price(price)
+        if sku not in latest or (price is not None and (latest[sku][1] is None or price < latest[sku][1])):
+            latest[sku] = (name, price)
+
+    try:
+        conn = connect(path)
+    except sqlite3.Error as e:
+        print(f"Lỗi khi mở lịch sử giá: {e}")
+        return 0
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO products (source, sku, name) VALUES (?, ?, ?)",
+                [(source, sku, name) for sku, (name, _) in latest.items()],
+            )
+            ids = dict(conn.execute("SELECT sku, id FROM products WHERE source = ?", (source,)))
+            # Khoảng giá mới nhất của từng sản phẩm (SQLite trả price của dòng có MAX(valid_from))
+            current = {
+                product_id: (price, valid_from)
+                for product_id, valid_from, price in conn.execute(
+                    "SELECT i.product_id, MAX(i.valid_from), i.price FROM price_intervals i "
+                    "JOIN products p ON p.id = i.product_id WHERE p.source = ? GROUP BY i.product_id",
+                    (source,),
+                )
+            }
+            extend, insert = [], []
+            for sku, (_, price) in latest.items():
+                product_id = ids[sku]
+                if product_id in current and current[product_id][0] == price:
+                    extend.append((run_at, product_id, current[product_id][1]))
+                else:
+                    insert.append((product_id, price, run_at, run_at))
+            conn.executemany(
+                "UPDATE price_intervals SET valid_to = ? WHERE product_id = ? AND valid_from = ?", extend)
+            conn.executemany(
+                "INSERT OR REPLACE INTO price_intervals (product_id, price, valid_from, valid_to) VALUES (?, ?, ?, ?)", insert)
+    except sqlite3.Error as e:
+        # Lỗi ghi lịch sử không được làm hỏng lần chạy
+        print(f"Lỗi khi ghi lịch sử giá {source}: {e}")
+        return 0
+    finally:
+        conn.close()
+    print(f"Lịch sử giá {source}: {len(latest)} sản phẩm, {len(insert)} giá mới")
+    return len(insert)
+
+
+def price_history(name, source=None, days=30, now=None, path=None):
+    """Các khoảng giá của sản phẩm trong `days` ngày gần nhất: (source, name, price, valid_from, valid_to)"""
+    since = ((now or datetime.now()) - timedelta(days=days)).strftime(TIME_FORMAT)
+    query = ("SELECT p.source, p.name, i.price, i.valid_from, i.valid_to FROM products p "
+             "JOIN price_intervals i ON i.product_id = p.id WHERE p.sku = ? AND i.valid_to >= ?")
+    params = [canonical_sku(name), since]
+    if source:
+        query += " AND p.source = ?"
+        params.append(source)
+    conn = connect(path)
+    try:
+        return conn.execute(query + " ORDER BY p.source, i.valid_from", params).fetchall()
+    finally:
+        conn.close()
+
+
+def changed_on(day=None, path=None):
+    """Các sản phẩm đổi giá trong ngày: (source, name, giá cũ, giá mới, thời điểm đổi)"""
+    day = day or datetime.now()
+    start = day.strftime("%Y-%m-%d")
+    end = (day + timedelta(days=1)).strftime("%Y-%m-%d")
+    conn = connect(path)
+    try:
+        return conn.execute(
+            "SELECT p.source, p.name, prev.price, cur.price, cur.valid_from FROM price_intervals cur "
+            "JOIN products p ON p.id = cur.product_id "
+            "JOIN price_intervals prev ON prev.product_id = cur.product_id AND prev.valid_from = ("
+            "  SELECT MAX(valid_from) FROM price_intervals "
+            "  WHERE product_id = cur.product_id AND valid_from < cur.valid_from) "
+            "WHERE cur.valid_from >= ? AND cur.valid_from < ? ORDER BY p.source, p.name",
+            (start, end),
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tra cứu lịch sử giá barebone")
+    parser.add_argument("name", nargs="?", help="tên sản phẩm (khớp theo khoá chuẩn)")
+    parser.add_argument("--source", choices=["5giay", "vtmk", "mkcom"])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--changed", action="store_true", help="liệt kê sản phẩm đổi giá hôm nay")
+    args = parser.parse_args()
+
+    if args.changed or not args.name:
+        for source, name, old_price, new_price, changed_at in changed_on():
+            print(f"[{source}] {name}: {old_price} -> {new_price} ({changed_at})")
+    else:
+        for source, name, price, valid_from, valid_to in price_history(args.name, args.source, args.days):
+            print(f"[{source}] {name}: {price} từ {valid_from} đến {valid_to}")
+
+
+if __name__ == "__main__":
+    main()
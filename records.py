@@ -0,0 +1,56 @@
+from collections import namedtuple
+
+# Một dòng sản phẩm là một tuple có tên: không có __dict__ riêng và không lặp lại các key tiếng Việt dài
+# ở mỗi dòng như dict. *_COLUMNS là tên cột trên sheet/DataFrame, đúng thứ tự các field
+FiveGiayProduct = namedtuple(
+    "FiveGiayProduct", "original_name name brand model form_factor fans psu price vc_plus price_vc cpu")
+FIVEGIAY_COLUMNS = ["Tên SP Gốc", "Tên SP đã sửa", "Hãng", "Model/Series", "Form Factor", "Số tản CPU", "PSU",
+                    "Giá bán (VNĐ)", "+ VC", "Giá bán VC", "CPU đi kèm"]
+
+VtmkProduct = namedtuple("VtmkProduct", "post_title name price link page")
+VTMK_COLUMNS = ["Tên Post", "Tên sản phẩm", "Giá bán (VNĐ)", "Link", "Trang"]
+
+MkcomProduct = namedtuple("MkcomProduct", "post_title name price link page status modified_by hidden")
+MKCOM_COLUMNS = ["Tên Post", "Tên sản phẩm", "Giá bán (VNĐ)", "Link", "Trang", "Tình trạng", "Người sửa", "Sản phẩm ẩn"]
+
+
+def load_records(record_type, items):
+    """Dòng đọc lại từ cache JSON (mỗi dòng là một list) thành record; None nếu cache theo định dạng cũ
+    (dict theo tên cột) hoặc khác số field, khi đó coi như chưa có cache"""
+    if items is None:
+        return None
+    size = len(record_type._fields)
+    if any(not isinstance(item, list) or len(item) != size for item in items):
+        return None
+    return [record_type._make(item) for item in items]
+
+
+class ColumnBuilder:
+    """Gom record vào từng cột ngay khi crawler sinh ra, DataFrame được dựng một lần từ các cột
+    (không qua list dict trung gian)"""
+
+    def __init__(self, record_type, columns):
+        self.record_type = record_type
+        self.columns = columns
+        self.data = [[] for _ in record_type._fields]
+        # False: nguồn lỗi nên dữ liệu lấy từ bản lưu của lần trước, preflight không ghi nhận bước này
+        self.complete = True
+
+    def append(self, record):
+        for column, value in zip(self.data, record):
+            column.append(value)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+        return self
+
+    def __len__(self):
+        return len(self.data[0])
+
+    def __iter__(self):
+        return map(self.record_type, *self.data)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(dict(zip(self.columns, self.data)), columns=self.columns)
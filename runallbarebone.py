@@ -1,34 +1,148 @@
-import subprocess
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import argparse
 from datetime import datetime
 import os
+import re
 
-print("Running barebone5giay.py...")
-subprocess.run(["python", "barebone5giay.py"], check=True)
+import barebone5giay
+import barebone5giayvtmk
+import barebone5giaymkcom
+import preflight
+import sheets_session
+from scheduler import Pipeline
+from metrics import get_metrics, timed
 
-print("Running barebone5giayvtmk.py...")
-subprocess.run(["python", "barebone5giayvtmk.py"], check=True)
+SHEET_URL = os.environ.get("SHEET_URL")
+SHEET_DATE_RE = re.compile(r'(\d{2}-\d{2}-\d{4})')
 
-print("Running barebone5giaymkcom.py...")
-subprocess.run(["python", "barebone5giaymkcom.py"], check=True)
 
-print("Crawlers finished. Cleaning up old sheets...")
+def stale_worksheets(worksheets, keep_days=1, today=None):
+    """Các worksheet cần xoá: tên có ngày dd-mm-YYYY cũ hơn keep_days ngày, hoặc không có ngày"""
+    today = (today or datetime.now()).date()
+    stale = []
+    for ws in worksheets:
+        m = SHEET_DATE_RE.search(ws.title)
+        if m:
+            try:
+                sheet_date = datetime.strptime(m.group(1), "%d-%m-%Y").date()
+            except ValueError:
+                sheet_date = None
+            if sheet_date and (today - sheet_date).days < keep_days:
+                continue
+        stale.append(ws)
+    return stale
 
-SHEET_URL = os.environ.get("SHEET_URL")
-today_str = datetime.now().strftime("%d-%m-%Y")
-
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive"
-]
-creds = ServiceAccountCredentials.from_json_keyfile_name('credentials.json', scope)
-client = gspread.authorize(creds)
-sh = client.open_by_url(SHEET_URL)
-
-for ws in sh.worksheets():
-    if today_str not in ws.title:
-        print(f"Deleting sheet: {ws.title}")
-        sh.del_worksheet(ws)
-
-print("Sheet cleanup finished.")
+
+@timed("cleanup")
+def cleanup_old_sheets(keep_days=None, dry_run=None):
+    # keep_days=1: chỉ giữ sheet của hôm nay (như trước); gom mọi lệnh xoá vào một batchUpdate
+    if keep_days is None:
+        keep_days = int(os.environ.get("SHEET_RETENTION_DAYS", "1"))
+    if dry_run is None:
+        dry_run = os.environ.get("SHEET_CLEANUP_DRY_RUN", "") not in ("", "0")
+    sh = sheets_session.open_spreadsheet(SHEET_URL)
+    worksheets = sheets_session.list_worksheets(SHEET_URL)
+    stale = stale_worksheets(worksheets, keep_days)
+    if stale and len(stale) == len(worksheets):
+        # Google Sheets không cho xoá hết mọi sheet trong file
+        print(f"Giữ lại sheet: {stale[-1].title} (không thể xoá toàn bộ sheet)")
+        stale = stale[:-1]
+
+    for ws in stale:
+        print(f"{'[dry-run] Would delete' if dry_run else 'Deleting'} sheet: {ws.title}")
+    if not stale or dry_run:
+        print(f"Sheet cleanup finished: {len(stale)} sheet cũ{' (dry-run, không xoá)' if dry_run else ''}.")
+        return stale
+
+    sheets_session.call_api("batch_update", sh.batch_update, {"requests": [{"deleteSheet": {"sheetId": ws.id}} for ws in stale]})
+    sheets_session.forget_worksheets([ws.title for ws in stale], SHEET_URL)
+    print(f"Sheet cleanup finished: đã xoá {len(stale)} sheet trong 1 batchUpdate.")
+    return stale
+
+
+def crawl_stage(module):
+    def stage(inputs):
+        products = module.crawl()
+        module.record(products)
+        return products
+    return stage
+
+
+def compare_stage(source, module):
+    def stage(inputs):
+        # 5giay không chạy lần này thì price_dict None: bước so sánh đọc giá từ sheet 5giay hôm nay
+        products_5giay = inputs.get("crawl_5giay")
+        price_dict = module.build_5giay_price_dict(products_5giay) if products_5giay is not None else None
+        return module.compare(inputs[f"crawl_{source}"], price_dict)
+    return stage
+
+
+def upload_stage(source, module, fingerprints):
+    def stage(inputs):
+        module.upload(inputs[f"compare_{source}" if source != "5giay" else "crawl_5giay"])
+        # Dấu vân tay của một nguồn chỉ được ghi khi nguồn đó đã lên sheet với dữ liệu đầy đủ
+        # (nguồn lỗi và phải dùng bản lưu cũ thì lần sau chạy lại)
+        if source in fingerprints and inputs[f"crawl_{source}"].complete:
+            preflight.save_stage(source, fingerprints[source])
+    return stage
+
+
+def build_pipeline(sources=None, fingerprints=None, keep_days=None, dry_run=None):
+    """Các bước của một lần chạy: crawl ba nguồn song song -> so sánh (cần giá 5giay) -> upload -> dọn sheet cũ.
+    sources: các nguồn cần chạy (mặc định cả ba); fingerprints: dấu vân tay preflight ghi lại sau khi upload"""
+    sources = preflight.STAGES if sources is None else sources
+    fingerprints = fingerprints or {}
+    modules = {"5giay": barebone5giay, "vtmk": barebone5giayvtmk, "mkcom": barebone5giaymkcom}
+    pipeline = Pipeline()
+    for source in sources:
+        pipeline.add(f"crawl_{source}", crawl_stage(modules[source]))
+    uploads = []
+    if "5giay" in sources:
+        uploads.append(pipeline.add("upload_5giay", upload_stage("5giay", barebone5giay, fingerprints), ["crawl_5giay"]))
+    for source in ("vtmk", "mkcom"):
+        if source not in sources:
+            continue
+        # Chỉ bước so sánh cần dữ liệu 5giay, crawl của shop không phải chờ
+        deps = [f"crawl_{source}"] + (["crawl_5giay"] if "5giay" in sources else [])
+        pipeline.add(f"compare_{source}", compare_stage(source, modules[source]), deps)
+        uploads.append(pipeline.add(f"upload_{source}", upload_stage(source, modules[source], fingerprints),
+                                    [f"crawl_{source}", f"compare_{source}"]))
+    pipeline.add("cleanup", lambda inputs: cleanup_old_sheets(keep_days=keep_days, dry_run=dry_run), uploads)
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keep-days", type=int, default=None,
+                        help="giữ lại sheet của N ngày gần nhất (mặc định SHEET_RETENTION_DAYS hoặc 1)")
+    parser.add_argument("--dry-run", action="store_true", default=None,
+                        help="chỉ liệt kê các sheet sẽ bị xoá")
+    parser.add_argument("--cleanup-only", action="store_true", help="chỉ dọn sheet cũ, không crawl")
+    parser.add_argument("--force", action="store_true", help="chạy mọi bước dù nguồn không thay đổi")
+    args = parser.parse_args()
+
+    if not args.cleanup_only:
+        print("Kiểm tra thay đổi của các nguồn...")
+        fingerprints, reasons = preflight.preflight(force=args.force)
+        if not reasons:
+            print("Không nguồn nào thay đổi từ lần chạy trước, bỏ qua.")
+            get_metrics().finish("run")
+            return
+
+        # Chạy các bước trong cùng một process: dữ liệu 5giay được chuyển thẳng
+        # cho hai bước so sánh, sheet chỉ còn là nơi ghi kết quả
+        pipeline = build_pipeline([s for s in preflight.STAGES if s in reasons], fingerprints,
+                                  keep_days=args.keep_days, dry_run=args.dry_run)
+        try:
+            pipeline.run()
+        finally:
+            print(pipeline.report())
+            # Báo cáo thời gian/số request/số lệnh Sheets của cả lần chạy
+            get_metrics().finish("run")
+        return
+
+    cleanup_old_sheets(keep_days=args.keep_days, dry_run=args.dry_run)
+    get_metrics().finish("run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Bộ lập lịch nhỏ cho các bước của pipeline: mỗi bước khai báo các bước phụ thuộc,
+# bước nào đủ đầu vào thì chạy ngay (song song với các bước độc lập khác)
+MAX_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "4"))
+
+
+class Stage:
+    def __init__(self, name, func, deps):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.start = None
+        self.end = None
+        self.status = "pending"  # pending | running | done | failed | skipped
+        self.result = None
+        self.error = None
+
+    @property
+    def duration(self):
+        return (self.end - self.start) if self.end is not None else 0.0
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def add(self, name, func, deps=()):
+        """func nhận dict {tên bước phụ thuộc: kết quả}; deps chỉ gồm các bước đã add"""
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Bước {name} phụ thuộc bước chưa khai báo: {dep}")
+        self.stages[name] = Stage(name, func, deps)
+        return name
+
+    def _run_stage(self, stage):
+        stage.start = time.perf_counter()
+        try:
+            stage.result = stage.func({dep: self.stages[dep].result for dep in stage.deps})
+            stage.status = "done"
+        except Exception as e:
+            stage.error = e
+            stage.status = "failed"
+            print(f"Bước {stage.name} lỗi: {e}")
+            traceback.print_exc()
+        finally:
+            stage.end = time.perf_counter()
+
+    def run(self, max_workers=None):
+        """Chạy mọi bước theo thứ tự phụ thuộc. Bước lỗi thì các bước phụ thuộc nó bị bỏ qua,
+        các nhánh khác vẫn chạy tiếp; hết pipeline thì ném lại lỗi đầu tiên"""
+        self.started_at = time.perf_counter()
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers or MAX_WORKERS) as executor:
+            while True:
+                # Các bước được add theo thứ tự phụ thuộc nên một lượt duyệt là đủ
+                for stage in self.stages.values():
+                    if stage.status != "pending":
+                        continue
+                    dep_status = [self.stages[dep].status for dep in stage.deps]
+                    if any(status in ("failed", "skipped") for status in dep_status):
+                        stage.status = "skipped"
+                    elif all(status == "done" for status in dep_status):
+                        stage.status = "running"
+                        running[executor.submit(self._run_stage, stage)] = stage
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    running.pop(future)
+        self.finished_at = time.perf_counter()
+        errors = [stage.error for stage in self.stages.values() if stage.error is not None]
+        if errors:
+            raise errors[0]
+        return {name: stage.result for name, stage in self.stages.items()}
+
+    def critical_path(self):
+        """Chuỗi bước quyết định tổng thời gian: từ bước kết thúc muộn nhất lần ngược
+        qua bước phụ thuộc kết thúc muộn nhất"""
+        finished = [stage for stage in self.stages.values() if stage.end is not None]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda stage: stage.end)]
+        while True:
+            deps = [self.stages[dep] for dep in path[-1].deps if self.stages[dep].end is not None]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda stage: stage.end))
+        return path[::-1]
+
+    def report(self):
+        wall = (self.finished_at or time.perf_counter()) - self.started_at
+        lines = [f"{'Bước':16} {'Bắt đầu':>8} {'Kết thúc':>9} {'Thời gian':>10}  Trạng thái"]
+        for stage in sorted(self.stages.values(), key=lambda stage: stage.start if stage.start is not None else float("inf")):
+            if stage.start is None:
+                lines.append(f"{stage.name:16} {'':>8} {'':>9} {'':>10}  {stage.status}")
+                continue
+            lines.append(f"{stage.name:16} {stage.start - self.started_at:7.2f}s {stage.end - self.started_at:8.2f}s "
+                         f"{stage.duration:9.2f}s  {stage.status}")
+        path = self.critical_path()
+        busy = sum(stage.duration for stage in self.stages.values())
+        lines.append(f"Đường găng: {' -> '.join(stage.name for stage in path)} "
+                     f"({sum(stage.duration for stage in path):.2f}s)")
+        lines.append(f"Tổng thời gian: {wall:.2f}s (nếu chạy tuần tự: {busy:.2f}s)")
+        return "\n".join(lines)
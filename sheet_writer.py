@@ -0,0 +1,326 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+import sheets_session
+from metrics import get_metrics
+
+NUMBER_RE = re.compile(r'^-?\d+(\.\d+)?$')
+
+# Lưới giá trị đã ghi lần trước của mỗi worksheet, để lần sau chỉ gửi các ô thay đổi. File này có thể cũ
+# hơn sheet thật (cache CI chỉ được lưu khi cả job thành công, sheet có thể bị sửa tay) nên lưới chỉ được
+# dùng sau khi đã đối chiếu với giá trị đọc từ sheet
+GRID_CACHE_PATH = os.path.join(os.environ.get("BAREBONE_STATE_DIR", ".cache"), "sheet_grids.json")
+GRID_CACHE_DAYS = 7
+# Các bước upload chạy song song cùng đọc-sửa-ghi một file cache
+_grid_cache_lock = threading.Lock()
+
+
+def to_cell_data(value, value_input_option="RAW"):
+    """Chuyển một giá trị Python thành CellData cho request updateCells"""
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and math.isnan(value):
+            return {}
+        return {"userEnteredValue": {"numberValue": value}}
+    value = str(value)
+    if value_input_option == "USER_ENTERED":
+        # Mô phỏng cách Sheets hiểu dữ liệu người dùng nhập: công thức và số
+        if value.startswith("="):
+            return {"userEnteredValue": {"formulaValue": value}}
+        if NUMBER_RE.match(value):
+            return {"userEnteredValue": {"numberValue": float(value)}}
+    return {"userEnteredValue": {"stringValue": value}}
+
+
+def cell_value(cell):
+    """Giá trị Sheets trả về (values.get, render FORMULA) cho một CellData đã ghi"""
+    value = cell.get("userEnteredValue", {})
+    for kind in ("numberValue", "stringValue", "boolValue", "formulaValue"):
+        if kind in value:
+            if kind == "numberValue" and float(value[kind]).is_integer():
+                return int(value[kind])
+            return value[kind]
+    return ""
+
+
+def grid_matches(grid, values, merges=()):
+    """Lưới CellData đã ghi có khớp giá trị đọc từ sheet không. Ô nằm trong vùng merge (trừ ô góc trên trái)
+    bị Sheets xoá giá trị nên bỏ qua; merges: các vùng [dòng đầu, dòng cuối + 1, cột đầu, cột cuối + 1]"""
+    width = len(grid[0]) if grid else 0
+    if len(values) > len(grid) or any(len(row) > width for row in values):
+        return False
+    hidden = {
+        (r, c)
+        for first_row, end_row, first_col, end_col in merges
+        for r in range(first_row, end_row)
+        for c in range(first_col, end_col)
+        if (r, c) != (first_row, first_col)
+    }
+    for r, grid_row in enumerate(grid):
+        row = values[r] if r < len(values) else []
+        for c, cell in enumerate(grid_row):
+            if (r, c) in hidden:
+                continue
+            if cell_value(cell) != (row[c] if c < len(row) else ""):
+                return False
+    return True
+
+
+def merge_ranges(values, start_row=2):
+    """Tìm các chuỗi ô liên tiếp có giá trị giống nhau (dài từ 2 ô) trong một cột,
+    trả về list (dòng đầu, dòng cuối) theo số dòng trên sheet"""
+    ranges = []
+    run_start = None
+    last = None
+    for i, value in enumerate(values, start=start_row):
+        if run_start is not None and value == last:
+            continue
+        if run_start is not None and i - 1 > run_start:
+            ranges.append((run_start, i - 1))
+        last = value
+        run_start = i
+    end = start_row + len(values) - 1
+    if run_start is not None and end > run_start:
+        ranges.append((run_start, end))
+    return ranges
+
+
+def changed_blocks(old_grid, new_grid):
+    """So hai lưới CellData cùng kích thước, trả về các khối (dòng đầu, cột đầu, dòng cuối, cột cuối)
+    (chỉ số từ 0, gồm cả dòng/cột cuối) bao các ô khác nhau. Mỗi dòng lấy đoạn từ ô đổi đầu tiên
+    tới ô đổi cuối cùng, các dòng liền nhau có cùng đoạn được gộp thành một khối"""
+    blocks = []
+    for r, (old_row, new_row) in enumerate(zip(old_grid, new_grid)):
+        changed = [c for c, (old, new) in enumerate(zip(old_row, new_row)) if old != new]
+        if not changed:
+            continue
+        first, last = changed[0], changed[-1]
+        if blocks and blocks[-1][2] == r - 1 and blocks[-1][1] == first and blocks[-1][3] == last:
+            blocks[-1] = (blocks[-1][0], first, r, last)
+        else:
+            blocks.append((r, first, r, last))
+    return blocks
+
+
+def load_grid_cache(path=GRID_CACHE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_grid_cache(cache, path=GRID_CACHE_PATH):
+    # Worksheet cũ bị xoá hằng ngày nên chỉ giữ các lưới ghi trong GRID_CACHE_DAYS ngày gần nhất
+    cutoff = time.time() - GRID_CACHE_DAYS * 86400
+    cache = {key: entry for key, entry in cache.items() if entry.get("saved_at", 0) >= cutoff}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _fingerprint(requests):
+    return hashlib.sha1(json.dumps(requests, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SheetWriter:
+    """Gom ghi giá trị, định dạng ô, độ rộng cột, freeze... của một worksheet
+    thành một lệnh spreadsheets.batchUpdate duy nhất"""
+
+    def __init__(self, spreadsheet, worksheet):
+        self.spreadsheet = spreadsheet
+        self.worksheet = worksheet
+        self.requests = []
+        # Định dạng, độ rộng cột, freeze, merge: bỏ qua nếu giống hệt lần ghi trước
+        self.layout_requests = []
+        self.api_calls = 0
+        self.cells_written = 0
+        self.grid_key = f"{spreadsheet.id}/{worksheet.id}"
+        self.pending_grid = None
+        self.full_rewrite = True
+        self.previous_layout = None
+        self.row_count = worksheet.row_count
+        self.col_count = worksheet.col_count
+
+    @classmethod
+    def open(cls, title, rows=300, cols=10, sheet_url=None):
+        # Lấy worksheet theo tên từ phiên dùng chung (metadata đã cache), tạo mới nếu chưa có
+        import gspread
+        spreadsheet = sheets_session.open_spreadsheet(sheet_url)
+        api_calls = 0
+        try:
+            worksheet = sheets_session.get_worksheet(title, sheet_url)
+        except gspread.exceptions.WorksheetNotFound:
+            worksheet = sheets_session.add_worksheet(title, rows, cols, sheet_url)
+            api_calls += 1
+        writer = cls(spreadsheet, worksheet)
+        writer.api_calls += api_calls
+        return writer
+
+    def clear(self):
+        # Giống worksheet.clear(): xoá giá trị, giữ nguyên định dạng
+        self.requests.append({
+            "updateCells": {
+                "range": {"sheetId": self.worksheet.id},
+                "fields": "userEnteredValue",
+            }
+        })
+
+    def _ensure_grid(self, rows, cols):
+        # updateCells không tự nới rộng sheet như values.update nên phải nới trước
+        if rows <= self.row_count and cols <= self.col_count:
+            return
+        self.row_count = max(rows, self.row_count)
+        self.col_count = max(cols, self.col_count)
+        self.requests.append({
+            "updateSheetProperties": {
+                "properties": {
+                    "sheetId": self.worksheet.id,
+                    "gridProperties": {"rowCount": self.row_count, "columnCount": self.col_count},
+                },
+                "fields": "gridProperties.rowCount,gridProperties.columnCount",
+            }
+        })
+
+    def set_values(self, rows, start_row=1, value_input_option="RAW"):
+        if not rows:
+            return
+        width = max(len(row) for row in rows)
+        self._ensure_grid(start_row - 1 + len(rows), width)
+        self._update_cells(
+            [[to_cell_data(v, value_input_option) for v in row] for row in rows], start_row - 1, 0)
+
+    def _update_cells(self, cell_rows, row_index, col_index):
+        self.cells_written += sum(len(row) for row in cell_rows)
+        self.requests.append({
+            "updateCells": {
+                "start": {"sheetId": self.worksheet.id, "rowIndex": row_index, "columnIndex": col_index},
+                "rows": [{"values": row} for row in cell_rows],
+                "fields": "userEnteredValue",
+            }
+        })
+
+    def _sheet_matches(self, grid, merges):
+        # Một lệnh đọc giá trị của cả worksheet để xác nhận lưới trong cache đúng là nội dung hiện tại
+        import gspread
+        values = sheets_session.call_api("get_values", self.worksheet.get_values,
+                                         value_render_option=gspread.utils.ValueRenderOption.formula)
+        self.api_calls += 1
+        return grid_matches(grid, values, merges)
+
+    def write_grid(self, rows, value_input_option="RAW"):
+        """Ghi toàn bộ nội dung sheet (thay cho clear + set_values): nếu lần ghi trước cùng kích thước
+        và sheet thật vẫn đúng như lần ghi đó thì chỉ gửi các ô thay đổi, còn lại xoá và ghi lại toàn bộ"""
+        grid = [[to_cell_data(v, value_input_option) for v in row] for row in rows]
+        width = max((len(row) for row in grid), default=0)
+        grid = [row + [{}] * (width - len(row)) for row in grid]
+        previous = load_grid_cache().get(self.grid_key)
+        self.pending_grid = grid
+        old_grid = previous and previous.get("values")
+        if old_grid and (len(old_grid) != len(grid) or len(old_grid[0]) != width):
+            old_grid = None
+        if old_grid and not self._sheet_matches(old_grid, previous.get("merges", [])):
+            print(f"Sheet {self.worksheet.title} khác lưới đã lưu (cache cũ hoặc sheet bị sửa tay), ghi lại toàn bộ")
+            get_metrics().incr("sheets.grid_cache_stale")
+            old_grid = None
+        if not old_grid:
+            self.full_rewrite = True
+            self.clear()
+            if grid:
+                self._ensure_grid(len(grid), width)
+                self._update_cells(grid, 0, 0)
+            return
+        self.full_rewrite = False
+        self.previous_layout = previous.get("layout")
+        for first_row, first_col, last_row, last_col in changed_blocks(old_grid, grid):
+            self._update_cells(
+                [row[first_col:last_col + 1] for row in grid[first_row:last_row + 1]], first_row, first_col)
+
+    def format(self, a1_range, cell_format):
+        from gspread_formatting import batch_update_requests as fmt
+        self.layout_requests.extend(fmt.format_cell_range(self.worksheet, a1_range, cell_format))
+
+    def set_column_width(self, column, width):
+        from gspread_formatting import batch_update_requests as fmt
+        self.layout_requests.extend(fmt.set_column_width(self.worksheet, column, width))
+
+    def freeze(self, rows=None, cols=None):
+        from gspread_formatting import batch_update_requests as fmt
+        self.layout_requests.extend(fmt.set_frozen(self.worksheet, rows=rows, cols=cols))
+
+    def merge(self, start_row, start_col, end_row, end_col, merge_type="MERGE_ALL"):
+        # Giống worksheet.merge_cells, chỉ số dòng/cột bắt đầu từ 1
+        self.layout_requests.append({
+            "mergeCells": {
+                "range": {
+                    "sheetId": self.worksheet.id,
+                    "startRowIndex": start_row - 1,
+                    "endRowIndex": end_row,
+                    "startColumnIndex": start_col - 1,
+                    "endColumnIndex": end_col,
+                },
+                "mergeType": merge_type,
+            }
+        })
+
+    def merge_column_runs(self, values, col, start_row=2):
+        # Gộp các ô giống nhau liên tiếp của một cột, tính từ dữ liệu sẵn có (không đọc lại sheet)
+        ranges = merge_ranges(values, start_row=start_row)
+        for first_row, last_row in ranges:
+            self.merge(first_row, col, last_row, col)
+        return len(ranges)
+
+    def _merges(self):
+        return [
+            [r["startRowIndex"], r["endRowIndex"], r["startColumnIndex"], r["endColumnIndex"]]
+            for r in (request["mergeCells"]["range"] for request in self.layout_requests if "mergeCells" in request)
+        ]
+
+    def _layout_to_send(self):
+        layout = self.layout_requests
+        if not layout:
+            return []
+        if not self.full_rewrite and self.previous_layout == _fingerprint(layout):
+            return []
+        if any("mergeCells" in request for request in layout):
+            # Bỏ các vùng merge cũ trước khi merge lại, tránh merge cũ che mất dữ liệu mới
+            layout = [{"unmergeCells": {"range": {"sheetId": self.worksheet.id}}}] + layout
+        return layout
+
+    def execute(self):
+        requests = self.requests + self._layout_to_send()
+        mode = "ghi lại toàn bộ" if self.full_rewrite else "chỉ ghi ô thay đổi"
+        if requests:
+            response = sheets_session.call_api("batch_update", self.spreadsheet.batch_update, {"requests": requests})
+            self.api_calls += 1
+        else:
+            response = None
+        if self.pending_grid is not None:
+            with _grid_cache_lock:
+                cache = load_grid_cache()
+                cache[self.grid_key] = {
+                    "title": self.worksheet.title,
+                    "values": self.pending_grid,
+                    "layout": _fingerprint(self.layout_requests),
+                    "merges": self._merges(),
+                    "saved_at": time.time(),
+                }
+                save_grid_cache(cache)
+        get_metrics().incr("sheets.cells_written", self.cells_written)
+        print(f"Đã gửi {len(requests)} thao tác, ghi {self.cells_written} ô ({mode}) "
+              f"({self.api_calls} lần gọi Sheets API cho worksheet {self.worksheet.title})")
+        self.requests = []
+        self.layout_requests = []
+        self.pending_grid = None
+        self.cells_written = 0
+        return response
@@ -0,0 +1,101 @@
+import os
+import threading
+
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+from metrics import get_metrics
+
+# Phiên Google Sheets dùng chung cho mọi bước: chỉ xác thực một lần, token được
+# dùng lại tới khi hết hạn (gspread tự làm mới), spreadsheet và danh sách worksheet
+# được cache thay vì open_by_url/worksheet() lại ở mỗi hàm.
+# gspread/oauth2client chỉ được import khi thật sự gọi Sheets (lần chạy bị bỏ qua không cần)
+SCOPE = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive"
+]
+CREDENTIALS_FILE = os.environ.get("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+
+# Lỗi tạm thời của Sheets API (quá quota, lỗi server) thì thử lại
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_lock = threading.RLock()
+_client = None
+_spreadsheets = {}
+_worksheets = {}
+
+
+def _is_transient(error):
+    import gspread
+    return isinstance(error, gspread.exceptions.APIError) and error.response.status_code in RETRY_STATUS
+
+
+@retry(
+    retry=retry_if_exception(_is_transient),
+    stop=stop_after_attempt(4),
+    wait=wait_exponential(multiplier=1, min=2, max=30),
+    before_sleep=lambda state: get_metrics().incr("sheets.retries"),
+    reraise=True,
+)
+def call_api(name, func, *args, **kwargs):
+    """Gọi một hàm gspread có đếm số lần gọi (sheets.<name>) và thử lại khi gặp lỗi tạm thời"""
+    get_metrics().incr(f"sheets.{name}")
+    with get_metrics().timer("sheets.api"):
+        return func(*args, **kwargs)
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+            creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILE, SCOPE)
+            _client = gspread.authorize(creds)
+        return _client
+
+
+def open_spreadsheet(sheet_url=None):
+    sheet_url = sheet_url or os.environ.get("SHEET_URL")
+    if not sheet_url:
+        raise Exception("Biến môi trường SHEET_URL chưa được thiết lập!")
+    with _lock:
+        if sheet_url not in _spreadsheets:
+            _spreadsheets[sheet_url] = call_api("open_by_url", get_client().open_by_url, sheet_url)
+        return _spreadsheets[sheet_url]
+
+
+def list_worksheets(sheet_url=None, refresh=False):
+    """Danh sách worksheet (đọc metadata một lần, các lần sau lấy từ cache)"""
+    sh = open_spreadsheet(sheet_url)
+    with _lock:
+        if refresh or sh.id not in _worksheets:
+            _worksheets[sh.id] = {ws.title: ws for ws in call_api("worksheets", sh.worksheets)}
+        return list(_worksheets[sh.id].values())
+
+
+def get_worksheet(title, sheet_url=None):
+    sh = open_spreadsheet(sheet_url)
+    list_worksheets(sheet_url)
+    with _lock:
+        worksheet = _worksheets[sh.id].get(title)
+    if worksheet is None:
+        import gspread
+        raise gspread.exceptions.WorksheetNotFound(title)
+    return worksheet
+
+
+def add_worksheet(title, rows, cols, sheet_url=None):
+    sh = open_spreadsheet(sheet_url)
+    list_worksheets(sheet_url)
+    worksheet = call_api("add_worksheet", sh.add_worksheet, title=title, rows=str(rows), cols=str(cols))
+    with _lock:
+        _worksheets[sh.id][title] = worksheet
+    return worksheet
+
+
+def forget_worksheets(titles, sheet_url=None):
+    # Gọi sau khi xoá worksheet để cache không trả về sheet đã bị xoá
+    sh = open_spreadsheet(sheet_url)
+    with _lock:
+        for title in titles:
+            _worksheets.get(sh.id, {}).pop(title, None)
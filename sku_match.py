@@ -0,0 +1,132 @@
+import re
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+# Khoá chuẩn của một barebone: cùng hãng/model/đời/form factor (+ CPU đi kèm) là cùng sản phẩm,
+# bất kể cách viết "Optiplex", "Prodesk", khoảng trắng "800G2"/"800 G2"...
+SkuKey = namedtuple("SkuKey", "brand model gen form extra")
+
+BRAND_WORDS = {
+    "dell": "dell", "optiplex": "dell", "precision": "dell",
+    "hp": "hp", "elitedesk": "hp", "prodesk": "hp", "pavilion": "hp",
+    "lenovo": "lenovo", "thinkcentre": "lenovo", "thinkstation": "lenovo",
+}
+FORM_WORDS = {
+    "sff": "sff", "mt": "mt", "tower": "mt", "dt": "dt",
+    "tiny": "tiny", "mini": "tiny", "micro": "tiny", "usff": "tiny",
+}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+PARENS_RE = re.compile(r'\([^)]*\)')
+GEN_RE = re.compile(r'^g\d{1,2}$')
+GLUED_GEN_RE = re.compile(r'^([a-z]?\d{3,4}[a-z]?)(g\d{1,2})$')  # 800g2 -> 800 g2, m910qg2 -> m910q g2
+DIGIT_RE = re.compile(r'\d')
+
+
+def _tokens(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text):
+        m = GLUED_GEN_RE.match(token)
+        if m:
+            tokens.extend(m.groups())
+        else:
+            tokens.append(token)
+    return tokens
+
+
+@lru_cache(maxsize=8192)
+def canonical_keys(name):
+    """Tách tên sản phẩm thành các SkuKey (mỗi model trong tên dạng "a/b" một khoá)"""
+    name = name.lower()
+    base, _, extra = name.partition('+')
+    base = PARENS_RE.sub(' ', base)
+    extra = ' '.join(TOKEN_RE.findall(extra))
+
+    brand = ""
+    for token in TOKEN_RE.findall(base):
+        if token in BRAND_WORDS:
+            brand = BRAND_WORDS[token]
+            break
+
+    keys = []
+    for part in base.split('/'):
+        model, gen, form = [], "", ""
+        for token in _tokens(part):
+            if token in FORM_WORDS:
+                form = FORM_WORDS[token]
+            elif GEN_RE.match(token):
+                gen = token
+            elif DIGIT_RE.search(token):
+                model.append(token)
+        if model:
+            keys.append(SkuKey(brand, ' '.join(model), gen, form, extra))
+
+    # "3046/7040 Mt": phần chưa có form factor lấy form của phần cuối
+    if keys and keys[-1].form:
+        keys = [k if k.form else k._replace(form=keys[-1].form) for k in keys]
+    return tuple(keys)
+
+
+def _compatible(query, candidate):
+    # Hãng/form factor thiếu ở một bên thì bỏ qua, các thành phần còn lại phải trùng
+    return (
+        query.model == candidate.model
+        and query.gen == candidate.gen
+        and query.extra == candidate.extra
+        and (not query.brand or not candidate.brand or query.brand == candidate.brand)
+        and (not query.form or not candidate.form or query.form == candidate.form)
+    )
+
+
+class PriceIndex:
+    """Tra giá 5giay theo tên: khớp nguyên văn trước, sau đó hash join theo SkuKey,
+    cuối cùng xét các ứng viên cùng model trong chỉ mục ngược"""
+
+    def __init__(self, price_dict):
+        self.exact = {}
+        self.by_key = {}
+        self.by_model = defaultdict(list)
+        self.stats = {"exact": 0, "key": 0, "candidate": 0, "miss": 0}
+        for name, price in price_dict.items():
+            self.exact[name.lower().strip()] = price
+            for key in canonical_keys(name):
+                # Trùng khoá thì giá sau ghi đè giống dict tên -> giá
+                if key not in self.by_key:
+                    self.by_model[key.model].append(key)
+                self.by_key[key] = price
+
+    def lookup(self, name):
+        exact_name = name.lower().strip()
+        if exact_name in self.exact:
+            self.stats["exact"] += 1
+            return self.exact[exact_name]
+        keys = canonical_keys(name)
+        for key in keys:
+            if key in self.by_key:
+                self.stats["key"] += 1
+                return self.by_key[key]
+        for key in keys:
+            prices = {
+                self.by_key[candidate]
+                for candidate in self.by_model.get(key.model, ())
+                if _compatible(key, candidate)
+            }
+            # Nhiều ứng viên khác giá (vd. thiếu form factor) thì không đoán
+            if len(prices) == 1:
+                self.stats["candidate"] += 1
+                return prices.pop()
+        self.stats["miss"] += 1
+        return "-"
+
+    def summary(self):
+        s = self.stats
+        return (f"Khớp giá 5giay: {s['exact']} nguyên văn, {s['key']} theo khoá chuẩn, "
+                f"{s['candidate']} theo ứng viên, {s['miss']} không tìm thấy")
+
+
+def canonical_sku(name):
+    """Chuỗi khoá chuẩn của tên sản phẩm (dùng làm khoá lưu trữ), vd. "dell 3020 sff";
+    tên không tách được model thì dùng tên viết thường"""
+    keys = canonical_keys(name)
+    if not keys:
+        return ' '.join(name.lower().split())
+    return '/'.join(' '.join(field for field in key if field) for key in keys)
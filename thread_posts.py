@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+import time
+
+from records import FiveGiayProduct, load_records
+
+# Sản phẩm đã parse của từng bài viết trong thread 5giay, theo post ID XenForo và phiên bản bài
+# (thời điểm sửa cuối + mã băm nội dung): lần chạy sau chỉ parse bài mới hoặc bài đã sửa
+THREAD_POSTS_PATH = os.path.join(os.environ.get("BAREBONE_STATE_DIR", ".cache"), "5giay_posts.json")
+# Bài không còn gặp lại sau số ngày này thì bỏ khỏi file (bài trên trang trả 304 vẫn tính là gặp lại)
+THREAD_POSTS_KEEP_DAYS = 30
+
+
+class ThreadPostCache:
+    def __init__(self, path=THREAD_POSTS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.reused = 0
+        self.parsed = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.posts = json.load(f)
+        except (OSError, ValueError):
+            self.posts = {}
+        # Trang thread -> các bài trên trang đó
+        self.pages = {}
+        for post_id, entry in self.posts.items():
+            if entry.get("page"):
+                self.pages.setdefault(entry["page"], set()).add(post_id)
+
+    def _set_page(self, post_id, entry, page):
+        if page and entry.get("page") != page:
+            if entry.get("page"):
+                self.pages.get(entry["page"], set()).discard(post_id)
+            entry["page"] = page
+            self.pages.setdefault(page, set()).add(post_id)
+
+    def get(self, post_id, version, page=None):
+        """Danh sách sản phẩm (FiveGiayProduct) đã parse của bài nếu bài chưa đổi, không thì None"""
+        with self.lock:
+            entry = self.posts.get(post_id)
+            if entry is None or entry["version"] != version:
+                return None
+            # Bài lưu theo định dạng cũ thì parse lại
+            products = load_records(FiveGiayProduct, entry["products"])
+            if products is None:
+                return None
+            entry["seen_at"] = time.time()
+            self._set_page(post_id, entry, page)
+            self.reused += 1
+            return products
+
+    def put(self, post_id, version, products, page=None):
+        with self.lock:
+            old = self.posts.get(post_id)
+            entry = self.posts[post_id] = {"version": version, "products": products, "seen_at": time.time()}
+            if old and old.get("page"):
+                entry["page"] = old["page"]
+            self._set_page(post_id, entry, page)
+            self.parsed += 1
+
+    def touch_page(self, page):
+        """Trang trả 304 không được parse lại: đánh dấu các bài trên trang vẫn còn để không bị xoá khi lưu"""
+        now = time.time()
+        with self.lock:
+            for post_id in self.pages.get(page, ()):
+                entry = self.posts.get(post_id)
+                if entry is not None:
+                    entry["seen_at"] = now
+
+    def save(self):
+        cutoff = time.time() - THREAD_POSTS_KEEP_DAYS * 86400
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.lock:
+            self.posts = {post_id: entry for post_id, entry in self.posts.items() if entry["seen_at"] >= cutoff}
+            for post_ids in self.pages.values():
+                post_ids.intersection_update(self.posts)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.posts, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_thread_post_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThreadPostCache()
+        return _cache